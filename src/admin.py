@@ -0,0 +1,274 @@
+# =============================================================================
+# ADMIN - RECONFIGURAÇÃO EM RUNTIME
+# =============================================================================
+# Permite reduzir o custo da telemetria durante um incidente, ou aumentar o
+# detalhe em um único pod, sem reiniciar o processo. Configurações alteráveis:
+#   - log_level                   -> nível do logger e do handler OpenTelemetry
+#   - trace_sampling_ratio        -> razão do head sampling
+#   - metrics_export_interval_ms  -> intervalo da exportação OTLP de métricas
+#   - app_errors / app_latency    -> injeção de falhas em /process
+#
+# PATCH /admin/config altera os valores enviados; POST /admin/config/reload
+# relê o ambiente (e o .env) e aplica o que mudou. POST /admin/profile roda
+# o profiler estatístico por alguns segundos (otel/profiler.py). Todos os valores são
+# validados antes de qualquer alteração e aplicados juntos sob um lock: ou a
+# mudança entra inteira, ou nada muda. Cada alteração incrementa
+# app_config_changes_total e gera um log.
+#
+# Com vários workers (launcher.py), cada um é um processo com a sua cópia
+# de config. Com ADMIN_SETTINGS_FILE, o worker que atende PATCH/reload grava
+# os valores no arquivo compartilhado e os demais os aplicam na próxima
+# verificação (ADMIN_SETTINGS_POLL_MS, source="broadcast"); workers
+# substituídos aplicam o arquivo ao iniciar. O profiler amostra apenas o
+# worker que atendeu a requisição, identificado pelo header X-Worker-Pid.
+#
+# Os endpoints exigem "Authorization: Bearer <ADMIN_TOKEN>" e ficam
+# desabilitados (404) quando ADMIN_TOKEN está vazio.
+
+import asyncio
+import fcntl
+import hmac
+import json
+import os
+import tempfile
+import threading
+from typing import Literal, Optional
+
+from dotenv import load_dotenv
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, status
+from fastapi.responses import PlainTextResponse, Response
+from pydantic import BaseModel, Field, ValidationError
+
+import config
+import otel.metrics
+import otel.profiler
+import otel.tracing
+from otel.logs import request_logger, set_log_level
+from otel.metrics import limit_cardinality, meter
+
+config_changes_counter = limit_cardinality(
+    meter.create_counter,
+    name="app_config_changes_total",
+    description="Configurações alteradas em runtime",
+    unit="1",
+)
+
+
+class RuntimeSettings(BaseModel):
+    log_level: Optional[Literal["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"]] = None
+    trace_sampling_ratio: Optional[float] = Field(default=None, ge=0, le=1)
+    metrics_export_interval_ms: Optional[int] = Field(default=None, gt=0)
+    app_errors: Optional[int] = Field(default=None, ge=0, le=100)
+    app_latency: Optional[int] = Field(default=None, ge=0)
+
+
+# Configuração -> variável correspondente em config.py (e no ambiente)
+CONFIG_NAMES = {
+    "log_level": "LOG_LEVEL",
+    "trace_sampling_ratio": "TRACE_SAMPLING_RATIO",
+    "metrics_export_interval_ms": "METRICS_EXPORT_INTERVAL_MS",
+    "app_errors": "APP_ERRORS",
+    "app_latency": "APP_LATENCY",
+}
+
+
+# Sampler e reader só existem depois de setup_telemetry() (e o reader só com
+# métricas habilitadas); sem eles o valor fica em config e é usado no setup
+def _set_sampling_ratio(ratio):
+    if otel.tracing.sampler is not None:
+        otel.tracing.sampler.set_ratio(ratio)
+
+
+def _set_export_interval(interval_ms):
+    if otel.metrics.otlp_reader is not None:
+        otel.metrics.otlp_reader.set_export_interval(interval_ms)
+
+
+# Efeitos colaterais além de atualizar config.py (APP_ERRORS e APP_LATENCY
+# já são lidos de config a cada requisição)
+_APPLY = {
+    "log_level": set_log_level,
+    "trace_sampling_ratio": _set_sampling_ratio,
+    "metrics_export_interval_ms": _set_export_interval,
+}
+
+_apply_lock = threading.Lock()
+
+
+def current_settings() -> dict:
+    return {name: getattr(config, config_name) for name, config_name in CONFIG_NAMES.items()}
+
+
+def apply_settings(settings: RuntimeSettings, source: str) -> dict:
+    """Aplica as configurações informadas e retorna {nome: {old, new}} do que mudou."""
+    requested = settings.model_dump(exclude_none=True)
+
+    with _apply_lock:
+        current = current_settings()
+        changes = {
+            name: {"old": current[name], "new": value}
+            for name, value in requested.items()
+            if value != current[name]
+        }
+        for name, change in changes.items():
+            setattr(config, CONFIG_NAMES[name], change["new"])
+            if name in _APPLY:
+                _APPLY[name](change["new"])
+
+    log = request_logger(operation="admin_config", source=source)
+    for name, change in changes.items():
+        config_changes_counter.add(1, {"app": config.APP_NAME, "setting": name, "source": source})
+        # WARNING para que a alteração fique registrada mesmo com nível alto
+        log.warning(
+            f"Configuração {name} alterada em runtime",
+            setting=name,
+            old_value=str(change["old"]),
+            new_value=str(change["new"]),
+        )
+    return changes
+
+
+def settings_from_environment() -> RuntimeSettings:
+    """Relê o .env (sobrescrevendo o ambiente) e monta as configurações presentes."""
+    load_dotenv(override=True)
+    values = {
+        name: os.environ[config_name]
+        for name, config_name in CONFIG_NAMES.items()
+        if config_name in os.environ
+    }
+    if "log_level" in values:
+        values["log_level"] = values["log_level"].upper()
+    return RuntimeSettings(**values)
+
+
+# =============================================================================
+# CONFIGURAÇÕES COMPARTILHADAS ENTRE WORKERS
+# =============================================================================
+def publish_settings(settings: RuntimeSettings) -> bool:
+    """
+    Acrescenta os valores informados ao ADMIN_SETTINGS_FILE, para os demais
+    workers. Retorna False se não há arquivo compartilhado.
+    """
+    path = config.ADMIN_SETTINGS_FILE
+    requested = settings.model_dump(exclude_none=True)
+    if not path or not requested:
+        return bool(path)
+
+    directory = os.path.dirname(os.path.abspath(path))
+    # Lock em um arquivo separado: o arquivo de configurações é substituído
+    # a cada escrita (rename), e dois workers alterando valores diferentes
+    # não podem sobrescrever um ao outro
+    with open(f"{path}.lock", "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        shared = _read_shared_settings(path) or {}
+        shared.update(requested)
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".settings-")
+        with os.fdopen(fd, "w") as file:
+            json.dump(shared, file)
+        os.replace(temp_path, path)
+    return True
+
+
+def _read_shared_settings(path: str) -> Optional[dict]:
+    try:
+        with open(path) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+async def watch_shared_settings() -> None:
+    """Aplica as alterações do ADMIN_SETTINGS_FILE feitas por outros workers."""
+    path = config.ADMIN_SETTINGS_FILE
+    last_version = None
+    while True:
+        try:
+            stat = os.stat(path)
+            version = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            version = None
+        if version is not None and version != last_version:
+            last_version = version
+            shared = _read_shared_settings(path)
+            if shared:
+                try:
+                    apply_settings(RuntimeSettings(**shared), source="broadcast")
+                except ValidationError as exc:
+                    request_logger(operation="admin_config", source="broadcast").error(
+                        "Configurações compartilhadas inválidas", exc_info=exc, settings_file=path
+                    )
+        await asyncio.sleep(config.ADMIN_SETTINGS_POLL_MS / 1000)
+
+
+def start_settings_watcher() -> Optional[asyncio.Task]:
+    """Inicia watch_shared_settings (chamado no lifespan), se houver arquivo compartilhado."""
+    if not config.ADMIN_SETTINGS_FILE:
+        return None
+    return asyncio.get_running_loop().create_task(watch_shared_settings())
+
+
+def require_admin_token(authorization: str = Header(default="")):
+    if not config.ADMIN_TOKEN:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer" or not hmac.compare_digest(token.encode(), config.ADMIN_TOKEN.encode()):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+
+router = APIRouter(prefix="/admin", dependencies=[Depends(require_admin_token)])
+
+
+@router.get("/config")
+def get_config():
+    return current_settings()
+
+
+def _config_response(settings: RuntimeSettings, changes: dict) -> dict:
+    broadcast = publish_settings(settings)
+    return {"changed": changes, "settings": current_settings(), "pid": os.getpid(), "broadcast": broadcast}
+
+
+@router.patch("/config")
+def update_config(settings: RuntimeSettings):
+    changes = apply_settings(settings, source="api")
+    return _config_response(settings, changes)
+
+
+@router.post("/config/reload")
+def reload_config():
+    try:
+        settings = settings_from_environment()
+    except ValidationError as exc:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=exc.errors(include_url=False))
+    changes = apply_settings(settings, source="reload")
+    return _config_response(settings, changes)
+
+
+@router.post("/profile")
+async def profile(
+    seconds: float = Query(default=5, gt=0, le=config.PROFILE_MAX_SECONDS),
+    hz: int = Query(default=100, ge=1, le=1000),
+    format: Literal["collapsed", "flamegraph"] = "collapsed",
+):
+    """
+    Amostra as pilhas de todas as threads por `seconds` segundos e devolve
+    collapsed stacks (texto) ou um flamegraph (SVG), com o trace_id da
+    requisição em execução no event loop em cada amostra.
+    """
+    try:
+        stacks = await otel.profiler.profile(seconds, hz)
+    except otel.profiler.ProfilerBusyError as exc:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(exc))
+
+    request_logger(operation="admin_profile").info(
+        "Profiling concluído", seconds=seconds, hz=hz, samples=sum(stacks.values())
+    )
+    # Só este worker foi amostrado (ver o início do arquivo)
+    headers = {"X-Worker-Pid": str(os.getpid())}
+    if format == "flamegraph":
+        return Response(otel.profiler.render_flamegraph(stacks), media_type="image/svg+xml", headers=headers)
+    return PlainTextResponse(otel.profiler.collapsed(stacks), headers=headers)
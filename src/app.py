@@ -1,11 +1,15 @@
+import asyncio
+import logging
 import time
-import random
-import requests
-from fastapi import FastAPI, Response, status, Request
-from typing import List
-from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
-from otel.metrics import requests_counter, active_requests_gauge, response_time_histogram
-from otel.tracing import tracer, propagator
+from contextlib import asynccontextmanager
+from fastapi import APIRouter, FastAPI, Response, status, Request
+from typing import List, Tuple
+from otel.metrics import requests_counter
+from otel.tracing import tracer, propagator, set_payload_attributes
+from otel.scrape import scrape_cache
+from otel.runtime import start_event_loop_monitor
+from otel.telemetry import setup_telemetry, shutdown_telemetry
+from otel import phases
 import sys
 from opentelemetry.trace import Status, StatusCode
 from opentelemetry.semconv.attributes.http_attributes import (
@@ -15,12 +19,41 @@ from opentelemetry.semconv.attributes.http_attributes import (
 )
 import config
 
-from otel.logs import logger
-from opentelemetry.trace import get_current_span
-
-app = FastAPI()
-
-@app.get("/")
+from otel.logs import logger, request_logger
+import downstream
+import admin
+from faults import FaultInjectionMiddleware, fault_random
+import batch
+import fastjson
+from coalesce import coalescer
+from middleware import RECEIVED_SCOPE_KEY, InFlightMiddleware, TimingMiddleware
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Providers, exportadores e threads de telemetria (otel/telemetry.py)
+    setup_telemetry()
+    # Monitor de lag do event loop e ocupação do threadpool
+    loop_monitor = start_event_loop_monitor()
+    # Alterações de /admin/config feitas por outros workers (ADMIN_SETTINGS_FILE)
+    settings_watcher = admin.start_settings_watcher()
+    yield
+    loop_monitor.cancel()
+    if settings_watcher is not None:
+        settings_watcher.cancel()
+    # Fecha o pool de conexões do cliente HTTP compartilhado
+    await downstream.close_client()
+    # Exporta o que está nas filas e encerra as threads de exportação
+    shutdown_telemetry()
+
+
+router = APIRouter()
+# /process com validação do pydantic ou pelo caminho rápido (fastjson.py);
+# create_app() inclui um dos dois conforme FAST_JSON_ENABLED
+process_router = APIRouter()
+fast_router = APIRouter()
+
+@router.get("/")
 def read_root():
     # Log estruturado para endpoint raiz
     logger.info(
@@ -32,263 +65,227 @@ def read_root():
         }
     )
     
-    active_requests_gauge.set(1, {"app": config.APP_NAME})
     requests_counter.add(1, {"app": config.APP_NAME, "endpoint": "/"})
-    start_time = time.time()
-    elapsed_time = time.time() - start_time
-    response_time_histogram.record(elapsed_time, {"app": config.APP_NAME, "endpoint": "/"})
     return {"message": f"Esse é o serviço {config.APP_NAME}"}
 
-@app.get("/metrics")
-def metrics():
+@router.get("/metrics")
+async def metrics(request: Request):
     # Log estruturado para endpoint de métricas
-    logger.debug(
-        "Endpoint de métricas acessado",
-        extra={
-            "service_name": config.APP_NAME,
-            "endpoint": "/metrics",
-            "operation": "metrics_export"
-        }
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(
+            "Endpoint de métricas acessado",
+            extra={
+                "service_name": config.APP_NAME,
+                "endpoint": "/metrics",
+                "operation": "metrics_export"
+            }
+        )
+    # Snapshot em cache, com negociação OpenMetrics/Prometheus e gzip
+    return await scrape_cache.render(
+        request.headers.get("accept"),
+        request.headers.get("accept-encoding"),
     )
-    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
 
-@app.post("/process")
-def process_request(payload: List[str], response: Response, request: Request):
+@process_router.post("/process")
+async def process_request(payload: List[str], response: Response, request: Request):
     """
     Endpoint que processa um payload, simula falhas e latência variável,
     e propaga a requisição para outros serviços.
     """
+    response.status_code, result = await _handle_process(payload, request)
+    return result
 
-    # Obter informações do span atual para correlação
-    current_span = get_current_span()
-    span_context = current_span.get_span_context()
-    
-    # Criar contexto base para logs
-    log_context = {
-        "service_name": config.APP_NAME,
-        "operation": "process_request"
-    }
-    
-    # Adicionar informações de trace se disponíveis
-    if span_context.is_valid:
-        log_context.update({
-            "trace_id": format(span_context.trace_id, "032x"),
-            "span_id": format(span_context.span_id, "016x")
-        })
 
-    # Log de início do processamento com detalhes da configuração
-    logger.info(
-        "Iniciando processamento de requisição",
-        extra={
-            **log_context,
-            "payload": payload.copy(),
-            "payload_size": len(payload),
-            "app_config": {
-                "error_rate": config.APP_ERRORS,
-                "max_latency": config.APP_LATENCY,
-                "destinations": config.APP_URL_DESTINO.split(',') if config.APP_URL_DESTINO else []
-            }
-        }
-    )
-
-    context = propagator.extract(request.headers)
+@fast_router.post("/process")
+async def process_request_fast(request: Request):
+    """
+    Mesmo endpoint de process_request, sem o pydantic: o corpo é decodificado
+    e validado e a resposta serializada por fastjson (FAST_JSON_ENABLED).
+    """
+    try:
+        payload = fastjson.parse_payload(await request.body())
+    except fastjson.PayloadError as exc:
+        return fastjson.error_response(exc)
+    return fastjson.json_response(*await _handle_process(payload, request))
 
-    with tracer.start_as_current_span("process-request", context=context) as main_span:
 
-        original_payload = payload.copy()
-        original_payload.append(config.APP_NAME)
+async def _handle_process(payload: List[str], request: Request) -> Tuple[int, object]:
+    context = propagator.extract(request.headers)
 
+    with tracer.start_as_current_span("process-request", context=context) as main_span, \
+            phases.track_request(main_span, "/process", request.scope.get(RECEIVED_SCOPE_KEY)):
         main_span.set_attribute(HTTP_ROUTE, "/process")
-        main_span.set_attribute(HTTP_REQUEST_METHOD, HttpRequestMethodValues.POST)
+        main_span.set_attribute(HTTP_REQUEST_METHOD, HttpRequestMethodValues.POST.value)
         main_span.set_attribute("app.name", config.APP_NAME)
-        main_span.set_attribute("payload.original", str(payload))
-        main_span.set_attribute("payload.modified", str(original_payload))
 
+        requests_counter.add(1, {"app": config.APP_NAME, "endpoint": "/process"})
 
-        main_span.add_event("Início do processamento", 
-                {"payload_tamanho": f"{sys.getsizeof(payload)} bytes"}
-        )
-        
-        # Log do início do span principal
-        logger.debug(
-            "Span principal iniciado",
-            extra={
-                **log_context,
-                "span_name": "process-request",
-                "payload_bytes": sys.getsizeof(payload)
-            }
-        )
+        # Requisições idênticas em andamento compartilham uma única execução
+        # e propagação downstream (coalesce.py)
+        if coalescer.enabled:
+            return await coalescer.run(
+                "/process",
+                coalescer.key("/process", payload, request.headers),
+                lambda execution_span: _process_payload(payload, execution_span),
+                main_span,
+            )
+        return await _process_payload(payload, main_span)
 
-        start_time = time.time()
 
-        active_requests_gauge.set(10, {"app": config.APP_NAME})
+async def _process_payload(payload: List[str], main_span) -> Tuple[int, object]:
+    """
+    Processamento de /process dentro do span principal: simula latência e
+    falhas e propaga para os destinos. Devolve o status e o corpo da resposta.
+    """
+    # Logger com o contexto da requisição (serviço, trace_id, span_id)
+    # montado uma única vez para todos os logs abaixo
+    log = request_logger(operation="process_request")
 
-        requests_counter.add(1, {"app": config.APP_NAME, "endpoint": "/process"})
+    # Log de início do processamento com detalhes da configuração
+    log.info(
+        "Iniciando processamento de requisição",
+        payload=payload,
+        app_config=lambda: {
+            "error_rate": config.APP_ERRORS,
+            "max_latency": config.APP_LATENCY,
+            "destinations": config.APP_URL_DESTINO.split(',') if config.APP_URL_DESTINO else []
+        }
+    )
 
-        original_payload = payload.copy()
-        original_payload.append(config.APP_NAME)
+    set_payload_attributes(main_span, "payload.original", payload)
 
-        # Simulação de latência variável
-        if config.APP_LATENCY > 0:
-            simulated_latency = random.randint(0, config.APP_LATENCY)  # Define um atraso aleatório entre 0 e APP_LATENCY
-            
-            logger.debug(
-                "Simulando latência",
-                extra={
-                    **log_context,
-                    "simulated_latency_ms": simulated_latency,
-                    "max_latency_ms": config.APP_LATENCY
-                }
-            )
-            
-            time.sleep(simulated_latency / 1000)  # Converte ms para segundos
+    main_span.add_event("Início do processamento", 
+            {"payload_tamanho": f"{sys.getsizeof(payload)} bytes"}
+    )
+    
+    # Log do início do span principal
+    log.debug(
+        "Span principal iniciado",
+        span_name="process-request",
+        payload_bytes=lambda: sys.getsizeof(payload)
+    )
 
-        # Simulação de erro com base na porcentagem definida
-        if random.randint(1, 100) <= config.APP_ERRORS:
-            response.status_code = status.HTTP_500_INTERNAL_SERVER_ERROR
+    # O payload pertence a esta requisição (acabou de ser decodificado do
+    # corpo): APP_NAME é acrescentado na própria lista, sem cópia
+    original_payload = payload
+    original_payload.append(config.APP_NAME)
+    set_payload_attributes(main_span, "payload.modified", original_payload)
 
-            error_msg = f"Erro simulado em {config.APP_NAME}"
-            
-            # Log estruturado do erro
-            logger.error(
-                "Erro simulado durante processamento",
-                extra={
-                    **log_context,
-                    "error_message": error_msg,
-                    "error_type": "simulated_error",
-                    "error_percentage": config.APP_ERRORS,
-                    "payload": payload.copy()
-                }
-            )
+    start_time = time.perf_counter()
 
-            logger.critical(
-                "Erro fatal simulado durante processamento",
-                extra={
-                    **log_context,
-                    "error_message": error_msg,
-                    "error_type": "simulated_error",
-                    "error_percentage": config.APP_ERRORS,
-                    "payload": payload.copy()
-                }
-            )
+    # Simulação de latência variável
+    if config.APP_LATENCY > 0:
+        simulated_latency = fault_random.randint(0, config.APP_LATENCY)  # Define um atraso aleatório entre 0 e APP_LATENCY
+        
+        log.debug(
+            "Simulando latência",
+            simulated_latency_ms=simulated_latency,
+            max_latency_ms=config.APP_LATENCY
+        )
+        
+        with phases.waiting("sleep"):
+            await asyncio.sleep(simulated_latency / 1000)  # Converte ms para segundos
 
-            main_span.record_exception(Exception(error_msg))
-            main_span.set_status(Status(StatusCode.ERROR))
-            main_span.set_attribute("http.status_code", status.HTTP_500_INTERNAL_SERVER_ERROR)
+    # Simulação de erro com base na porcentagem definida
+    if fault_random.randint(1, 100) <= config.APP_ERRORS:
+        error_msg = f"Erro simulado em {config.APP_NAME}"
+        
+        # Log estruturado do erro
+        error_log = log.bind(
+            error_message=error_msg,
+            error_type="simulated_error",
+            error_percentage=config.APP_ERRORS
+        )
+        error_log.error("Erro simulado durante processamento", payload=payload)
+        error_log.critical("Erro fatal simulado durante processamento", payload=payload)
+
+        main_span.record_exception(Exception(error_msg))
+        main_span.set_status(Status(StatusCode.ERROR))
+        main_span.set_attribute("http.status_code", status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        return status.HTTP_500_INTERNAL_SERVER_ERROR, {"error": error_msg}
 
-            return {"error": error_msg}
+    # Se houver serviços de destino, propaga a requisição
+    if config.APP_URL_DESTINO:
+        urls = config.APP_URL_DESTINO.split(',')
+        
+        log.info(
+            "Iniciando propagação para serviços downstream",
+            destination_urls=urls,
+            destinations_count=len(urls),
+            fanout_mode=config.APP_FANOUT_MODE,
+            payload_to_send=original_payload
+        )
 
-        # Se houver serviços de destino, propaga a requisição
-        if config.APP_URL_DESTINO:
-            urls = config.APP_URL_DESTINO.split(',')
+        with phases.waiting("downstream"):
+            original_payload, failure = await downstream.propagate(urls, original_payload, log)
+
+        if failure is not None and failure.error is not None:
+            # Log estruturado do erro de requisição externa
+            log.error(
+                "Falha na requisição externa",
+                exc_info=failure.error,
+                error_type="request_exception",
+                error_message=str(failure.error),
+                destination_url=failure.url,
+                payload=original_payload
+            )
             
-            logger.info(
-                "Iniciando propagação para serviços downstream",
-                extra={
-                    **log_context,
-                    "destination_urls": urls,
-                    "destinations_count": len(urls),
-                    "payload_to_send": original_payload
-                }
+            main_span.record_exception(failure.error)
+            main_span.set_status(Status(StatusCode.ERROR))
+            return status.HTTP_400_BAD_REQUEST, {"error": f"Falha na requisição para {failure.url}: {str(failure.error)}"}
+
+        if failure is not None:
+            # Log de erro de status HTTP
+            log.error(
+                "Erro de status na requisição externa",
+                destination_url=failure.url,
+                response_status=failure.status_code,
+                error_type="bad_gateway"
             )
             
-            for url in urls:
-
-                with tracer.start_as_current_span("send-request") as child_span:
-
-                    try:
-                        # Log do início da requisição externa
-                        logger.debug(
-                            "Enviando requisição para serviço downstream",
-                            extra={
-                                **log_context,
-                                "destination_url": url,
-                                "request_method": "POST",
-                                "request_path": "/process"
-                            }
-                        )
-
-                        headers = {}
-                        propagator.inject(headers)
-
-                        child_span.set_attribute("net.peer.name", url)
-                        child_span.set_attribute("destination.url", url)
-
-                        child_span.add_event("Requisição externa bem-sucedida", {"url": url})
-
-                        resp = requests.post(
-                            f"{url}/process",
-                            json=original_payload,
-                            headers=headers,
-                            timeout=5
-                        )
-
-                        child_span.set_attribute("http.status_code", resp.status_code)
-
-                        if resp.status_code == 200:
-                            original_payload = resp.json()
-                            
-                            # Log de sucesso na requisição externa
-                            logger.info(
-                                "Requisição externa bem-sucedida",
-                                extra={
-                                    **log_context,
-                                    "destination_url": url,
-                                    "response_status": resp.status_code,
-                                    "payload_sent": original_payload
-                                }
-                            )
-                        else:
-                            response.status_code = status.HTTP_502_BAD_GATEWAY
-                            
-                            # Log de erro de status HTTP
-                            logger.error(
-                                "Erro de status na requisição externa",
-                                extra={
-                                    **log_context,
-                                    "destination_url": url,
-                                    "response_status": resp.status_code,
-                                    "error_type": "bad_gateway"
-                                }
-                            )
-                            
-                            return {"error": f"Erro ao enviar para {url}: {resp.status_code}"}
-
-                    except requests.RequestException as e:
-                        response.status_code = status.HTTP_400_BAD_REQUEST
-                        
-                        # Log estruturado do erro de requisição externa
-                        logger.error(
-                            "Falha na requisição externa",
-                            extra={
-                                **log_context,
-                                "error_type": "request_exception",
-                                "error_message": str(e),
-                                "destination_url": url,
-                                "payload": original_payload
-                            },
-                            exc_info=True
-                        )
-                        
-                        main_span.record_exception(Exception(e))
-                        main_span.set_status(Status(StatusCode.ERROR))
-                        return {"error": f"Falha na requisição para {url}: {str(e)}"}
-
-        main_span.set_status(Status(StatusCode.OK))
-        
-        # Log de sucesso no processamento completo
-        elapsed_time = time.time() - start_time
-        logger.info(
-            "Processamento concluido com sucesso",
-            extra={
-                **log_context,
-                "result_payload": original_payload,
-                "processing_duration": elapsed_time,
-                "latency_simulation": config.APP_LATENCY,
-                "destinations_count": len(config.APP_URL_DESTINO.split(',')) if config.APP_URL_DESTINO else 0
-            }
-        )
+            return status.HTTP_502_BAD_GATEWAY, {"error": f"Erro ao enviar para {failure.url}: {failure.status_code}"}
+
+    main_span.set_status(Status(StatusCode.OK))
+    
+    # Log de sucesso no processamento completo
+    elapsed_time = time.perf_counter() - start_time
+    log.info(
+        "Processamento concluido com sucesso",
+        result_payload=original_payload,
+        processing_duration=elapsed_time,
+        latency_simulation=config.APP_LATENCY,
+        destinations_count=len(config.APP_URL_DESTINO.split(',')) if config.APP_URL_DESTINO else 0
+    )
+
+    return status.HTTP_200_OK, original_payload
 
-    response_time_histogram.record(elapsed_time, {"app": config.APP_NAME, "endpoint": "/process"})
 
-    return original_payload
\ No newline at end of file
+def create_app() -> FastAPI:
+    """
+    Monta a aplicação. A telemetria só é configurada no startup (lifespan),
+    então importar este módulo não cria providers nem threads.
+    """
+    app = FastAPI(lifespan=lifespan)
+
+    # Falhas injetadas por rota (FAULT_RULES); a mais interna, para que a
+    # latência injetada conte como requisição em andamento e no tempo de resposta
+    app.add_middleware(FaultInjectionMiddleware)
+    # Requisições em andamento por rota e controle de admissão (ADMISSION_LIMITS)
+    app.add_middleware(InFlightMiddleware)
+    # Tempo de resposta de todas as rotas; adicionado por último para ser o mais
+    # externo e medir também as requisições rejeitadas pela admissão
+    app.add_middleware(TimingMiddleware)
+
+    # Reconfiguração em runtime (/admin/config), protegida por ADMIN_TOKEN
+    app.include_router(admin.router)
+    app.include_router(router)
+    app.include_router(fast_router if config.FAST_JSON_ENABLED else process_router)
+    # Muitos payloads por requisição, com resultados em NDJSON (/process/batch)
+    app.include_router(batch.router)
+    return app
+
+
+# Instância usada por "uvicorn app:app"; "uvicorn --factory app:create_app"
+# cria uma nova a cada execução
+app = create_app()
@@ -0,0 +1,343 @@
+# =============================================================================
+# PROCESSAMENTO EM LOTE - /process/batch
+# =============================================================================
+# Em /process cada payload paga um round-trip HTTP por hop e um conjunto
+# completo de spans e logs. /process/batch recebe muitos payloads em uma
+# única requisição:
+#   - application/x-ndjson (ou jsonl): um item por linha
+#   - application/json: um array JSON de itens
+# Cada item é um array de strings (o mesmo corpo de /process) ou um objeto
+# {"payload": [...], "traceparent": "..."}, em que o traceparent identifica
+# o trace de origem do item.
+#
+# O corpo é lido de forma incremental: os itens são processados em lotes de
+# até BATCH_MAX_ITEMS conforme chegam (um lote incompleto é fechado depois de
+# BATCH_MAX_WAIT_MS, verificado a cada pedaço do corpo) e os resultados são
+# devolvidos em NDJSON assim que cada lote termina, uma linha por item:
+#   {"index": 0, "status": 200, "payload": [...]}
+#   {"index": 1, "status": 500, "error": "..."}
+#
+# Por lote, e não por item: um span "process-batch" (filho do traceparent da
+# requisição, com um link para o trace de origem de cada item), um log, uma
+# simulação de latência e uma chamada a cada serviço de APP_URL_DESTINO
+# (downstream.propagate_batch). A simulação de erro continua por item.
+
+import asyncio
+import codecs
+import json
+import re
+import time
+from typing import List, Optional
+
+from fastapi import APIRouter, Request, status
+from opentelemetry import trace
+from opentelemetry.trace import Status, StatusCode
+from opentelemetry.semconv.attributes.http_attributes import (
+    HTTP_ROUTE,
+    HTTP_REQUEST_METHOD,
+    HttpRequestMethodValues
+)
+from starlette.responses import StreamingResponse
+
+import config
+import downstream
+from faults import fault_random
+from otel.logs import request_logger
+from otel.metrics import requests_counter
+from otel.tracing import tracer, propagator
+
+router = APIRouter()
+
+_DECODER = json.JSONDecoder()
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+
+# =============================================================================
+# LEITURA INCREMENTAL DO CORPO
+# =============================================================================
+class BatchParseError(ValueError):
+    """
+    Corpo malformado. `items` traz os itens do mesmo pedaço lidos antes do
+    erro, que ainda devem ser processados; os de pedaços anteriores já foram
+    devolvidos por feed().
+    """
+
+    def __init__(self, message: str, items: Optional[list] = None):
+        super().__init__(message)
+        self.items = items or []
+
+
+class ItemStreamParser:
+    """
+    Extrai itens JSON de um corpo que chega em pedaços. Com ndjson=True cada
+    linha é um item; senão o corpo é um array JSON e cada item é devolvido
+    assim que está completo, sem esperar o "]" final.
+    """
+
+    def __init__(self, ndjson: bool, max_item_bytes: int):
+        self._ndjson = ndjson
+        self._max_item_bytes = max_item_bytes
+        # Um caractere UTF-8 pode ficar dividido entre dois pedaços
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self._buffer = ""
+        # Array: "start" -> "first" -> ("separator" <-> "value") -> "end"
+        self._state = "start"
+
+    def feed(self, chunk: bytes) -> list:
+        self._buffer += self._decoder.decode(chunk)
+        items = self._lines() if self._ndjson else self._array()
+        # O limite é em bytes: só codifica quando os caracteres (até 4 bytes
+        # cada em UTF-8) podem passar dele
+        if len(self._buffer) * 4 > self._max_item_bytes and len(self._buffer.encode()) > self._max_item_bytes:
+            raise BatchParseError(f"item maior que {self._max_item_bytes} bytes", items)
+        return items
+
+    def close(self) -> list:
+        """Processa o que sobrou no buffer quando o corpo termina."""
+        self._buffer += self._decoder.decode(b"", final=True)
+        if self._ndjson:
+            self._buffer += "\n"
+            return self._lines()
+        items = self._array()
+        if self._state != "end":
+            raise BatchParseError("array JSON incompleto", items)
+        return items
+
+    def _lines(self) -> list:
+        *lines, self._buffer = self._buffer.split("\n")
+        items = []
+        for line in lines:
+            if not line.strip():
+                continue
+            try:
+                items.append(json.loads(line))
+            except json.JSONDecodeError as exc:
+                raise BatchParseError(f"linha NDJSON inválida: {exc}", items) from exc
+        return items
+
+    def _array(self) -> list:
+        # Percorre o buffer por posição e descarta o que foi consumido uma
+        # única vez no fim: recortar o buffer a cada item tornaria um corpo
+        # grande recebido em um só pedaço O(n²)
+        items = []
+        buffer = self._buffer
+        position = 0
+        try:
+            while True:
+                position = _WHITESPACE.match(buffer, position).end()
+                if position == len(buffer):
+                    return items
+                char = buffer[position]
+                if self._state == "end":
+                    raise BatchParseError("conteúdo após o fim do array", items)
+                if self._state == "start":
+                    if char != "[":
+                        raise BatchParseError("o corpo deve ser um array JSON", items)
+                    self._state = "first"
+                elif self._state == "separator" or (self._state == "first" and char == "]"):
+                    if char not in ",]":
+                        raise BatchParseError("esperado ',' ou ']' entre os itens", items)
+                    self._state = "value" if char == "," else "end"
+                else:
+                    try:
+                        item, position = _DECODER.raw_decode(buffer, position)
+                    except json.JSONDecodeError:
+                        # Item ainda incompleto: espera o próximo pedaço
+                        return items
+                    items.append(item)
+                    self._state = "separator"
+                    continue
+                position += 1
+        finally:
+            self._buffer = buffer[position:]
+
+
+class BatchItem:
+    __slots__ = ("index", "payload", "traceparent", "error")
+
+    def __init__(self, index: int, raw):
+        self.index = index
+        self.payload: Optional[List[str]] = None
+        self.traceparent: Optional[str] = None
+        self.error: Optional[str] = None
+
+        if isinstance(raw, dict):
+            self.traceparent = raw.get("traceparent") if isinstance(raw.get("traceparent"), str) else None
+            raw = raw.get("payload")
+        if isinstance(raw, list) and all(isinstance(value, str) for value in raw):
+            self.payload = raw
+        else:
+            self.error = "o item deve ser uma lista de strings ou um objeto com \"payload\""
+
+
+def _item_link(item: BatchItem) -> Optional[trace.Link]:
+    """Link do span do lote para o trace de origem do item, se informado."""
+    if item.traceparent is None:
+        return None
+    span_context = trace.get_current_span(
+        propagator.extract({"traceparent": item.traceparent})
+    ).get_span_context()
+    if not span_context.is_valid:
+        return None
+    return trace.Link(span_context, {"batch.item_index": item.index})
+
+
+# =============================================================================
+# PROCESSAMENTO DE UM LOTE
+# =============================================================================
+def _result_line(index: int, status_code: int, payload=None, error=None) -> str:
+    result = {"index": index, "status": status_code}
+    if error is None:
+        result["payload"] = payload
+    else:
+        result["error"] = error
+    return json.dumps(result, separators=(",", ":")) + "\n"
+
+
+async def run_batch(items: List[BatchItem], context) -> bytes:
+    """Processa um lote e devolve as linhas NDJSON dos resultados."""
+    links = [link for link in map(_item_link, items) if link is not None]
+
+    with tracer.start_as_current_span("process-batch", context=context, links=links) as batch_span:
+        log = request_logger(operation="process_batch")
+
+        batch_span.set_attribute(HTTP_ROUTE, "/process/batch")
+        batch_span.set_attribute(HTTP_REQUEST_METHOD, HttpRequestMethodValues.POST.value)
+        batch_span.set_attribute("app.name", config.APP_NAME)
+        batch_span.set_attribute("batch.size", len(items))
+        batch_span.set_attribute("batch.first_index", items[0].index)
+
+        start_time = time.perf_counter()
+        requests_counter.add(len(items), {"app": config.APP_NAME, "endpoint": "/process/batch"})
+
+        # Simulação de latência variável, uma vez por lote
+        if config.APP_LATENCY > 0:
+            await asyncio.sleep(fault_random.randint(0, config.APP_LATENCY) / 1000)
+
+        lines = {}
+        failed = 0
+        forward = []
+        for item in items:
+            if item.error is not None:
+                failed += 1
+                lines[item.index] = _result_line(item.index, status.HTTP_422_UNPROCESSABLE_ENTITY, error=item.error)
+            # Simulação de erro com base na porcentagem definida, por item
+            elif fault_random.randint(1, 100) <= config.APP_ERRORS:
+                failed += 1
+                lines[item.index] = _result_line(
+                    item.index, status.HTTP_500_INTERNAL_SERVER_ERROR, error=f"Erro simulado em {config.APP_NAME}"
+                )
+            else:
+                item.payload = [*item.payload, config.APP_NAME]
+                forward.append(item)
+
+        # Se houver serviços de destino, propaga os itens restantes em um único lote
+        if forward and config.APP_URL_DESTINO:
+            results = await downstream.propagate_batch(
+                config.APP_URL_DESTINO.split(','),
+                [{"payload": item.payload, "traceparent": item.traceparent} for item in forward],
+                log,
+            )
+            for item, (payload, failure) in zip(forward, results):
+                failed += failure is not None
+                if failure is None:
+                    lines[item.index] = _result_line(item.index, status.HTTP_200_OK, payload=payload)
+                elif failure.error is not None:
+                    lines[item.index] = _result_line(
+                        item.index, status.HTTP_400_BAD_REQUEST,
+                        error=f"Falha na requisição para {failure.url}: {str(failure.error)}",
+                    )
+                else:
+                    lines[item.index] = _result_line(
+                        item.index, status.HTTP_502_BAD_GATEWAY,
+                        error=f"Erro ao enviar para {failure.url}: {failure.status_code}",
+                    )
+        else:
+            for item in forward:
+                lines[item.index] = _result_line(item.index, status.HTTP_200_OK, payload=item.payload)
+
+        batch_span.set_attribute("batch.failed_items", failed)
+        if failed:
+            batch_span.set_status(Status(StatusCode.ERROR, f"{failed} de {len(items)} itens com falha"))
+        else:
+            batch_span.set_status(Status(StatusCode.OK))
+
+        # Um único log por lote
+        (log.warning if failed else log.info)(
+            "Lote processado",
+            batch_size=len(items),
+            failed_items=failed,
+            processing_duration=time.perf_counter() - start_time
+        )
+
+    return "".join(lines[item.index] for item in items).encode()
+
+
+# =============================================================================
+# ENDPOINT
+# =============================================================================
+class NDJSONStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse sem a task que escuta desconexões: com ASGI < 2.4 ela
+    consome as mensagens de receive() e roubaria o corpo que o gerador ainda
+    está lendo. Uma desconexão do cliente interrompe a leitura do corpo.
+    """
+
+    media_type = downstream.NDJSON_MEDIA_TYPE
+
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+
+
+async def _stream_results(request: Request, context, ndjson: bool):
+    parser = ItemStreamParser(ndjson, config.BATCH_MAX_ITEM_BYTES)
+    max_wait = config.BATCH_MAX_WAIT_MS / 1000
+    pending: List[BatchItem] = []
+    pending_since = 0.0
+    next_index = 0
+    parse_error = None
+
+    def add(raw_items):
+        nonlocal next_index, pending_since
+        if raw_items and not pending:
+            pending_since = time.monotonic()
+        for raw in raw_items:
+            pending.append(BatchItem(next_index, raw))
+            next_index += 1
+
+    try:
+        async for chunk in request.stream():
+            add(parser.feed(chunk))
+            while len(pending) >= config.BATCH_MAX_ITEMS:
+                batch = pending[:config.BATCH_MAX_ITEMS]
+                del pending[:config.BATCH_MAX_ITEMS]
+                pending_since = time.monotonic()
+                yield await run_batch(batch, context)
+            if pending and time.monotonic() - pending_since >= max_wait:
+                batch = pending[:]
+                pending.clear()
+                yield await run_batch(batch, context)
+        add(parser.close())
+    except BatchParseError as exc:
+        # Itens válidos do pedaço anteriores à linha malformada ainda recebem resultado
+        add(exc.items)
+        parse_error = str(exc)
+
+    for start in range(0, len(pending), config.BATCH_MAX_ITEMS):
+        yield await run_batch(pending[start:start + config.BATCH_MAX_ITEMS], context)
+
+    # O status da resposta já foi enviado: o erro de leitura vira a última linha
+    if parse_error is not None:
+        yield _result_line(next_index, status.HTTP_400_BAD_REQUEST, error=parse_error).encode()
+
+
+@router.post("/process/batch")
+async def process_batch(request: Request):
+    """
+    Processa muitos payloads em uma requisição (NDJSON ou array JSON),
+    devolvendo os resultados em NDJSON conforme cada lote termina.
+    """
+    content_type = request.headers.get("content-type", "")
+    ndjson = "ndjson" in content_type or "jsonl" in content_type
+    context = propagator.extract(request.headers)
+    return NDJSONStreamingResponse(_stream_results(request, context, ndjson))
@@ -0,0 +1,281 @@
+# =============================================================================
+# BENCHMARK PONTA A PONTA - CADEIA DE SERVIÇOS
+# =============================================================================
+# Sobe N instâncias da aplicação encadeadas por APP_URL_DESTINO
+# (app-0 -> app-1 -> ... -> app-N-1) e o receptor OTLP local
+# (bench/otlp_sink.py), gera carga em /process da primeira instância e
+# reporta vazão, latência (p50/p99/p999) e CPU por requisição somando todas
+# as instâncias, além do que o receptor recebeu de cada sinal (itens e itens
+# por requisição de exportação).
+#
+# Cada instância roda em um processo uvicorn próprio: a configuração
+# (config.py) e os providers de telemetria são globais do módulo, então não
+# é possível ter duas configurações diferentes no mesmo processo.
+#
+# Modos de carga:
+#   --concurrency C  -> C clientes em laço fechado (próxima requisição só
+#                       depois da resposta)
+#   --rate R         -> R requisições/s em laço aberto; a latência é medida a
+#                       partir do horário agendado, então filas no servidor
+#                       aparecem nos percentis (sem "coordinated omission")
+#
+# Cada sinal pode ser ligado/desligado (--traces/--no-traces etc.), e
+# --matrix roda todas as combinações relevantes em sequência para comparar o
+# custo da telemetria entre versões. --sink-latency-ms e --sink-error-rate
+# simulam um collector lento ou instável.
+#
+# Uso (a partir de src/):
+#   python -m bench.chain --services 3 --concurrency 16 --duration 10
+#   python -m bench.chain --services 3 --rate 200 --no-traces --no-logs
+#   python -m bench.chain --matrix --json
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+import psutil
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SIGNALS = ("traces", "metrics", "logs")
+
+# Combinações usadas por --matrix: nenhum sinal, cada sinal sozinho e todos
+MATRIX = [
+    {"traces": False, "metrics": False, "logs": False},
+    {"traces": True, "metrics": False, "logs": False},
+    {"traces": False, "metrics": True, "logs": False},
+    {"traces": False, "metrics": False, "logs": True},
+    {"traces": True, "metrics": True, "logs": True},
+]
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _spawn(command: list, env: dict) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, "-m", *command],
+        cwd=SRC_DIR,
+        env={**os.environ, **env},
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+def _wait_ready(url: str, process: subprocess.Popen, timeout: float = 30) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{url} terminou antes de ficar pronto (código {process.returncode})")
+        try:
+            httpx.get(url, timeout=1)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    raise RuntimeError(f"{url} não ficou pronto em {timeout}s")
+
+
+# =============================================================================
+# CADEIA DE SERVIÇOS
+# =============================================================================
+class ServiceChain:
+    """Processos do receptor OTLP e das N instâncias encadeadas."""
+
+    def __init__(self, services: int, signals: dict, extra_env: dict, sink_args: list):
+        self.services = services
+        self.signals = signals
+        self.extra_env = extra_env
+        self.sink_args = sink_args
+        self.processes = []
+        self.apps = []
+        self.entry_url = None
+        self.sink_url = None
+
+    def __enter__(self):
+        sink_port = _free_port()
+        sink = _spawn(["bench.otlp_sink", "--port", str(sink_port), *self.sink_args], {})
+        self.processes.append(sink)
+        self.sink_url = f"http://127.0.0.1:{sink_port}/stats"
+        _wait_ready(self.sink_url, sink)
+
+        ports = [_free_port() for _ in range(self.services)]
+        # A última instância sobe primeiro: as anteriores apontam para ela
+        for index in reversed(range(self.services)):
+            env = {
+                **self.extra_env,
+                "APP_NAME": f"app-{index}",
+                "APP_URL_DESTINO": f"http://127.0.0.1:{ports[index + 1]}" if index + 1 < self.services else "",
+                "OTLP_ENDPOINT": f"http://127.0.0.1:{sink_port}",
+                **{f"TELEMETRY_{signal.upper()}_ENABLED": str(enabled).lower()
+                   for signal, enabled in self.signals.items()},
+            }
+            process = _spawn(
+                ["uvicorn", "app:app", "--host", "127.0.0.1", "--port", str(ports[index]),
+                 "--log-level", "warning", "--no-access-log"],
+                env,
+            )
+            self.processes.append(process)
+            self.apps.append(psutil.Process(process.pid))
+            _wait_ready(f"http://127.0.0.1:{ports[index]}/", process)
+
+        self.entry_url = f"http://127.0.0.1:{ports[0]}/process"
+        return self
+
+    def reset_sink(self) -> None:
+        httpx.post(f"{self.sink_url}/reset")
+
+    def sink_stats(self) -> dict:
+        return httpx.get(self.sink_url).json()
+
+    def cpu_seconds(self) -> float:
+        total = 0.0
+        for app in self.apps:
+            cpu = app.cpu_times()
+            total += cpu.user + cpu.system
+        return total
+
+    def __exit__(self, *exc):
+        for process in self.processes:
+            process.terminate()
+        for process in self.processes:
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
+# =============================================================================
+# GERADOR DE CARGA
+# =============================================================================
+async def _send(client: httpx.AsyncClient, url: str, payload: list, latencies: list, errors: list, started: float):
+    try:
+        response = await client.post(url, json=payload)
+        if response.status_code != 200:
+            errors.append(response.status_code)
+    except httpx.HTTPError as exc:
+        errors.append(type(exc).__name__)
+    latencies.append(time.perf_counter() - started)
+
+
+async def run_closed_loop(url: str, payload: list, concurrency: int, duration: float, latencies: list, errors: list):
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=30) as client:
+        deadline = time.perf_counter() + duration
+
+        async def worker():
+            while time.perf_counter() < deadline:
+                await _send(client, url, payload, latencies, errors, time.perf_counter())
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+
+async def run_open_loop(url: str, payload: list, rate: float, duration: float, latencies: list, errors: list):
+    limits = httpx.Limits(max_connections=1000, max_keepalive_connections=100)
+    async with httpx.AsyncClient(limits=limits, timeout=30) as client:
+        start = time.perf_counter()
+        total = int(rate * duration)
+        tasks = []
+        for index in range(total):
+            scheduled = start + index / rate
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(_send(client, url, payload, latencies, errors, scheduled)))
+        await asyncio.gather(*tasks)
+
+
+def _percentile(ordered: list, quantile: float) -> float:
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, int(quantile * len(ordered)))
+    return ordered[index]
+
+
+def run_benchmark(args, signals: dict) -> dict:
+    payload = [f"item-{index}" for index in range(args.payload_size)]
+    sink_args = ["--latency-ms", str(args.sink_latency_ms), "--error-rate", str(args.sink_error_rate)]
+    with ServiceChain(args.services, signals, dict(env.split("=", 1) for env in args.env), sink_args) as chain:
+        # Aquecimento: conexões, caches e imports preguiçosos
+        warmup_latencies, warmup_errors = [], []
+        asyncio.run(run_closed_loop(chain.entry_url, payload, args.concurrency, args.warmup, warmup_latencies, warmup_errors))
+
+        latencies, errors = [], []
+        chain.reset_sink()
+        cpu_before = chain.cpu_seconds()
+        wall_start = time.perf_counter()
+        if args.rate:
+            asyncio.run(run_open_loop(chain.entry_url, payload, args.rate, args.duration, latencies, errors))
+        else:
+            asyncio.run(run_closed_loop(chain.entry_url, payload, args.concurrency, args.duration, latencies, errors))
+        elapsed = time.perf_counter() - wall_start
+        cpu_used = chain.cpu_seconds() - cpu_before
+        sink = chain.sink_stats()
+
+    latencies.sort()
+    completed = len(latencies)
+    return {
+        "signals": signals,
+        "services": args.services,
+        "mode": f"rate={args.rate}/s" if args.rate else f"concurrency={args.concurrency}",
+        "requests": completed,
+        "errors": len(errors),
+        "throughput_rps": completed / elapsed if elapsed else 0.0,
+        "p50_ms": _percentile(latencies, 0.50) * 1000,
+        "p99_ms": _percentile(latencies, 0.99) * 1000,
+        "p999_ms": _percentile(latencies, 0.999) * 1000,
+        "cpu_ms_per_request": cpu_used * 1000 / completed if completed else 0.0,
+        "exported": {
+            signal: {key: stats[key] for key in ("items", "items_per_request", "errors_injected")}
+            for signal, stats in sink["signals"].items()
+        },
+    }
+
+
+def _format(result: dict) -> str:
+    enabled = ",".join(signal for signal in SIGNALS if result["signals"][signal]) or "nenhum"
+    return (
+        f"sinais={enabled:<20} {result['mode']:<16} req={result['requests']:<7} err={result['errors']:<5} "
+        f"rps={result['throughput_rps']:8.1f}  p50={result['p50_ms']:7.2f}ms  "
+        f"p99={result['p99_ms']:7.2f}ms  p999={result['p999_ms']:7.2f}ms  "
+        f"cpu/req={result['cpu_ms_per_request']:6.2f}ms  exportado: "
+        + " ".join(
+            f"{signal}={stats['items']}({stats['items_per_request']:.0f}/req)"
+            for signal, stats in result["exported"].items()
+        )
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ponta a ponta de uma cadeia de serviços")
+    parser.add_argument("--services", type=int, default=3)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--rate", type=float, default=0, help="requisições/s (laço aberto); 0 usa --concurrency")
+    parser.add_argument("--duration", type=float, default=10, help="segundos de medição")
+    parser.add_argument("--warmup", type=float, default=2, help="segundos de aquecimento")
+    parser.add_argument("--payload-size", type=int, default=10)
+    parser.add_argument("--env", action="append", default=[], help="variável extra para as instâncias (CHAVE=valor)")
+    parser.add_argument("--sink-latency-ms", type=float, default=0, help="atraso do receptor OTLP")
+    parser.add_argument("--sink-error-rate", type=float, default=0, help="porcentagem de erros do receptor OTLP")
+    parser.add_argument("--matrix", action="store_true", help="roda todas as combinações de sinais")
+    parser.add_argument("--json", action="store_true", help="saída em JSON (uma linha por execução)")
+    for signal in SIGNALS:
+        parser.add_argument(f"--{signal}", action=argparse.BooleanOptionalAction, default=True)
+    args = parser.parse_args()
+
+    combinations = MATRIX if args.matrix else [{signal: getattr(args, signal) for signal in SIGNALS}]
+    for signals in combinations:
+        result = run_benchmark(args, signals)
+        print(json.dumps(result) if args.json else _format(result), flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+# =============================================================================
+# MICRO-BENCHMARK - CONTEXTO DE LOG POR REQUISIÇÃO
+# =============================================================================
+# Compara o custo dos logs de uma requisição /process no padrão antigo
+# ({**log_context, ...} + payload.copy() em toda chamada) com o RequestLogger
+# de otel/logs.py (contexto fixo, campos avaliados após a checagem de nível e
+# payload resumido).
+#
+# Uso (a partir de src/):
+#   python -m bench.log_context --payload-size 100 --iterations 20000
+#
+# --handler discard descarta os registros, medindo apenas o custo de
+# montar o contexto e os campos extras. --handler otel (padrão) passa os registros pelo
+# LoggingHandler do OpenTelemetry e os codifica em OTLP/protobuf (sem envio),
+# incluindo o custo de serializar os atributos.
+
+import argparse
+import logging
+import time
+import tracemalloc
+
+from opentelemetry.exporter.otlp.proto.common._log_encoder import encode_logs
+from opentelemetry.sdk._logs import LoggerProvider, LoggingHandler, LogRecordProcessor
+
+import config
+from otel.logs import RequestLogger
+
+
+class _DiscardHandler(logging.Handler):
+    def emit(self, record):
+        pass
+
+
+class _EncodingProcessor(LogRecordProcessor):
+    """Codifica cada registro em OTLP/protobuf e descarta o resultado."""
+
+    def emit(self, log_data):
+        encode_logs([log_data]).SerializeToString()
+
+    def shutdown(self):
+        pass
+
+    def force_flush(self, timeout_millis=30000):
+        return True
+
+
+def _make_logger(handler):
+    if handler == "otel":
+        provider = LoggerProvider(shutdown_on_exit=False)
+        provider.add_log_record_processor(_EncodingProcessor())
+        bench_handler = LoggingHandler(logger_provider=provider)
+    else:
+        bench_handler = _DiscardHandler()
+
+    bench_logger = logging.getLogger("bench.log_context")
+    bench_logger.handlers[:] = [bench_handler]
+    bench_logger.setLevel(logging.INFO)
+    bench_logger.propagate = False
+    return bench_logger
+
+
+URLS = ["http://app-b:8000", "http://app-c:8000"]
+
+
+def legacy_request(bench_logger, payload):
+    """Reproduz as chamadas de log de /process antes do RequestLogger."""
+    log_context = {
+        "service_name": config.APP_NAME,
+        "operation": "process_request",
+        "trace_id": format(0x1234, "032x"),
+        "span_id": format(0x5678, "016x"),
+    }
+    bench_logger.info("inicio", extra={
+        **log_context,
+        "payload": payload.copy(),
+        "payload_size": len(payload),
+        "app_config": {"error_rate": 0, "max_latency": 0, "destinations": list(URLS)},
+    })
+    bench_logger.debug("span", extra={**log_context, "span_name": "process-request", "payload_bytes": 0})
+    bench_logger.debug("latencia", extra={**log_context, "simulated_latency_ms": 0, "max_latency_ms": 0})
+    bench_logger.info("propagacao", extra={
+        **log_context, "destination_urls": URLS, "destinations_count": 2, "payload_to_send": payload,
+    })
+    for url in URLS:
+        bench_logger.debug("envio", extra={
+            **log_context, "destination_url": url, "request_method": "POST", "request_path": "/process",
+        })
+        bench_logger.info("sucesso", extra={
+            **log_context, "destination_url": url, "response_status": 200, "payload_sent": payload,
+        })
+    bench_logger.info("fim", extra={
+        **log_context, "result_payload": payload, "processing_duration": 0.0,
+        "latency_simulation": 0, "destinations_count": 2,
+    })
+
+
+def lazy_request(bench_logger, payload):
+    """As mesmas chamadas usando RequestLogger."""
+    log = RequestLogger(bench_logger, {
+        "service_name": config.APP_NAME,
+        "operation": "process_request",
+        "trace_id": format(0x1234, "032x"),
+        "span_id": format(0x5678, "016x"),
+    })
+    log.info(
+        "inicio",
+        payload=payload,
+        app_config=lambda: {"error_rate": 0, "max_latency": 0, "destinations": list(URLS)},
+    )
+    log.debug("span", span_name="process-request", payload_bytes=0)
+    log.debug("latencia", simulated_latency_ms=0, max_latency_ms=0)
+    log.info("propagacao", destination_urls=URLS, destinations_count=2, payload_to_send=payload)
+    for url in URLS:
+        log.debug("envio", destination_url=url, request_method="POST", request_path="/process")
+        log.info("sucesso", destination_url=url, response_status=200, payload_sent=payload)
+    log.info("fim", result_payload=payload, processing_duration=0.0, latency_simulation=0, destinations_count=2)
+
+
+def measure(fn, bench_logger, payload, iterations):
+    # Aquecimento
+    for _ in range(min(iterations, 1000)):
+        fn(bench_logger, payload)
+
+    start = time.perf_counter_ns()
+    for _ in range(iterations):
+        fn(bench_logger, payload)
+    elapsed_ns = time.perf_counter_ns() - start
+
+    # Pico de memória alocada durante uma requisição
+    tracemalloc.start()
+    peaks = []
+    for _ in range(min(iterations, 200)):
+        tracemalloc.reset_peak()
+        base, _ = tracemalloc.get_traced_memory()
+        fn(bench_logger, payload)
+        _, peak = tracemalloc.get_traced_memory()
+        peaks.append(peak - base)
+    tracemalloc.stop()
+
+    return elapsed_ns / iterations, sum(peaks) / len(peaks)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--payload-size", type=int, default=100)
+    parser.add_argument("--iterations", type=int, default=20000)
+    parser.add_argument("--handler", choices=("otel", "discard"), default="otel")
+    args = parser.parse_args()
+
+    bench_logger = _make_logger(args.handler)
+    payload = [f"item-{i}" for i in range(args.payload_size)]
+
+    print(
+        f"payload: {args.payload_size} itens | handler: {args.handler} "
+        f"| LOG_PAYLOAD_MODE={config.LOG_PAYLOAD_MODE}"
+    )
+    print(f"{'modo':<10}{'ns/req':>12}{'bytes/req (pico)':>20}")
+    for name, fn in (("antes", legacy_request), ("depois", lazy_request)):
+        ns, peak = measure(fn, bench_logger, payload, args.iterations)
+        print(f"{name:<10}{ns:>12.0f}{peak:>20.0f}")
+
+
+if __name__ == "__main__":
+    main()
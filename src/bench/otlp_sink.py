@@ -0,0 +1,245 @@
+# =============================================================================
+# RECEPTOR OTLP/HTTP LOCAL (SINK)
+# =============================================================================
+# Substitui o collector em testes locais e benchmarks. Aceita POST em
+# /v1/traces, /v1/metrics e /v1/logs (protobuf, com ou sem gzip), decodifica
+# as requisições e conta spans, pontos de métrica, registros de log, bytes e
+# requisições de exportação por sinal. Com isso dá para medir a vazão dos
+# exportadores, a eficiência dos lotes (itens por requisição) e o efeito de
+# um collector lento ou instável (backpressure) sem sair da máquina.
+#
+# Injeção de falhas:
+#   --latency-ms    atraso aplicado a cada requisição antes de responder
+#   --error-rate    porcentagem de requisições respondidas com --error-status
+#   --error-status  status das falhas (padrão 503, que os exportadores OTLP
+#                   tratam como erro temporário e repetem com backoff)
+#
+# GET /stats retorna os totais e as taxas por segundo desde o início;
+# POST /stats/reset zera os contadores.
+#
+# Uso (a partir de src/):
+#   python -m bench.otlp_sink --port 4318 --latency-ms 50 --error-rate 10
+#
+# Também pode rodar no mesmo processo do teste (start_in_thread).
+
+import argparse
+import asyncio
+import gzip
+import random
+import threading
+import time
+from contextlib import asynccontextmanager
+
+import uvicorn
+from fastapi import FastAPI, Request, Response
+from google.protobuf.message import DecodeError
+from opentelemetry.proto.collector.logs.v1.logs_service_pb2 import (
+    ExportLogsServiceRequest,
+    ExportLogsServiceResponse,
+)
+from opentelemetry.proto.collector.metrics.v1.metrics_service_pb2 import (
+    ExportMetricsServiceRequest,
+    ExportMetricsServiceResponse,
+)
+from opentelemetry.proto.collector.trace.v1.trace_service_pb2 import (
+    ExportTraceServiceRequest,
+    ExportTraceServiceResponse,
+)
+
+
+def _count_spans(request: ExportTraceServiceRequest) -> int:
+    return sum(
+        len(scope_spans.spans)
+        for resource_spans in request.resource_spans
+        for scope_spans in resource_spans.scope_spans
+    )
+
+
+def _count_metric_points(request: ExportMetricsServiceRequest) -> int:
+    points = 0
+    for resource_metrics in request.resource_metrics:
+        for scope_metrics in resource_metrics.scope_metrics:
+            for metric in scope_metrics.metrics:
+                kind = metric.WhichOneof("data")
+                if kind is not None:
+                    points += len(getattr(metric, kind).data_points)
+    return points
+
+
+def _count_log_records(request: ExportLogsServiceRequest) -> int:
+    return sum(
+        len(scope_logs.log_records)
+        for resource_logs in request.resource_logs
+        for scope_logs in resource_logs.scope_logs
+    )
+
+
+# Sinal -> (mensagem da requisição, mensagem da resposta, contador de itens)
+SIGNALS = {
+    "traces": (ExportTraceServiceRequest, ExportTraceServiceResponse, _count_spans),
+    "metrics": (ExportMetricsServiceRequest, ExportMetricsServiceResponse, _count_metric_points),
+    "logs": (ExportLogsServiceRequest, ExportLogsServiceResponse, _count_log_records),
+}
+
+
+class SignalStats:
+    __slots__ = ("requests", "items", "bytes", "errors_injected", "decode_errors")
+
+    def __init__(self):
+        self.requests = 0
+        self.items = 0
+        self.bytes = 0
+        self.errors_injected = 0
+        self.decode_errors = 0
+
+
+class OTLPSink:
+    """Contadores por sinal e configuração da injeção de falhas."""
+
+    def __init__(self, latency_ms: float = 0, error_rate: float = 0, error_status: int = 503):
+        self.latency_ms = latency_ms
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.stats = {signal: SignalStats() for signal in SIGNALS}
+            self.started = time.monotonic()
+
+    async def receive(self, signal: str, body: bytes, content_encoding: str) -> Response:
+        request_cls, response_cls, count_items = SIGNALS[signal]
+
+        if self.latency_ms:
+            await asyncio.sleep(self.latency_ms / 1000)
+
+        stats = self.stats[signal]
+        if self.error_rate and random.uniform(0, 100) < self.error_rate:
+            with self._lock:
+                stats.errors_injected += 1
+            return Response(status_code=self.error_status)
+
+        raw = gzip.decompress(body) if content_encoding == "gzip" else body
+        try:
+            items = count_items(request_cls.FromString(raw))
+        except DecodeError:
+            with self._lock:
+                stats.decode_errors += 1
+            return Response(status_code=400)
+
+        with self._lock:
+            stats.requests += 1
+            stats.items += items
+            stats.bytes += len(body)
+        return Response(response_cls().SerializeToString(), media_type="application/x-protobuf")
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            elapsed = max(time.monotonic() - self.started, 1e-9)
+            return {
+                "elapsed_s": elapsed,
+                "signals": {
+                    signal: {
+                        "requests": stats.requests,
+                        "items": stats.items,
+                        "bytes": stats.bytes,
+                        "errors_injected": stats.errors_injected,
+                        "decode_errors": stats.decode_errors,
+                        "items_per_request": stats.items / stats.requests if stats.requests else 0.0,
+                        "items_per_s": stats.items / elapsed,
+                        "bytes_per_s": stats.bytes / elapsed,
+                    }
+                    for signal, stats in self.stats.items()
+                },
+            }
+
+
+def _format_report(previous: dict, current: dict) -> str:
+    interval = max(current["elapsed_s"] - previous["elapsed_s"], 1e-9)
+    parts = []
+    for signal in SIGNALS:
+        before, after = previous["signals"][signal], current["signals"][signal]
+        parts.append(
+            f"{signal}: {(after['items'] - before['items']) / interval:8.1f} itens/s "
+            f"{(after['bytes'] - before['bytes']) / interval / 1024:8.1f} KiB/s "
+            f"{after['items_per_request']:6.1f} itens/req"
+        )
+    return " | ".join(parts)
+
+
+async def _report_periodically(sink: OTLPSink, interval_s: float):
+    previous = sink.snapshot()
+    while True:
+        await asyncio.sleep(interval_s)
+        current = sink.snapshot()
+        print(_format_report(previous, current), flush=True)
+        previous = current
+
+
+def create_sink_app(sink: OTLPSink, report_interval_s: float = 0) -> FastAPI:
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        reporter = None
+        if report_interval_s > 0:
+            reporter = asyncio.create_task(_report_periodically(sink, report_interval_s))
+        yield
+        if reporter is not None:
+            reporter.cancel()
+
+    app = FastAPI(lifespan=lifespan)
+
+    @app.post("/v1/{signal}")
+    async def receive(signal: str, request: Request):
+        if signal not in SIGNALS:
+            return Response(status_code=404)
+        body = await request.body()
+        return await sink.receive(signal, body, request.headers.get("content-encoding", ""))
+
+    @app.get("/stats")
+    def stats():
+        return sink.snapshot()
+
+    @app.post("/stats/reset")
+    def reset():
+        sink.reset()
+        return sink.snapshot()
+
+    return app
+
+
+def start_in_thread(port: int, sink: OTLPSink = None):
+    """
+    Sobe o receptor em uma thread do processo atual. Retorna (sink, server);
+    para encerrar, use server.should_exit = True.
+    """
+    sink = sink or OTLPSink()
+    server = uvicorn.Server(uvicorn.Config(
+        create_sink_app(sink), host="127.0.0.1", port=port, log_level="warning", access_log=False,
+    ))
+    thread = threading.Thread(target=server.run, name="otlp-sink", daemon=True)
+    thread.start()
+    while not server.started and thread.is_alive():
+        time.sleep(0.01)
+    return sink, server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Receptor OTLP/HTTP local para testes e benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=4318)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0, help="porcentagem de respostas com erro (0-100)")
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--report-interval", type=float, default=0, help="segundos entre relatórios no terminal (0 desativa)")
+    args = parser.parse_args()
+
+    sink = OTLPSink(latency_ms=args.latency_ms, error_rate=args.error_rate, error_status=args.error_status)
+    uvicorn.run(
+        create_sink_app(sink, args.report_interval),
+        host=args.host, port=args.port, log_level="warning", access_log=False,
+    )
+
+
+if __name__ == "__main__":
+    main()
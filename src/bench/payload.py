@@ -0,0 +1,68 @@
+# =============================================================================
+# BENCHMARK DE TAMANHO DE PAYLOAD - CAMINHO PADRÃO x CAMINHO RÁPIDO DE JSON
+# =============================================================================
+# Para cada tamanho de payload (--sizes, em itens), roda bench.chain duas
+# vezes, com FAST_JSON_ENABLED=false (pydantic + json) e true (fastjson.py), e
+# compara vazão, latência e CPU por requisição somando todas as instâncias.
+# Payloads grandes são onde decodificar, validar, copiar e serializar a lista
+# a cada hop domina o custo.
+#
+# Uso (a partir de src/):
+#   python -m bench.payload
+#   python -m bench.payload --sizes 10,1000,10000 --services 3 --duration 5
+#   python -m bench.payload --no-traces --no-logs --json
+
+import argparse
+import json
+
+from bench.chain import SIGNALS, run_benchmark
+
+MODES = {"padrão": "false", "fast": "true"}
+
+
+def _format(size: int, mode: str, result: dict, baseline: dict) -> str:
+    line = (
+        f"itens={size:<8} json={mode:<7} req={result['requests']:<7} err={result['errors']:<5} "
+        f"rps={result['throughput_rps']:8.1f}  p50={result['p50_ms']:8.2f}ms  "
+        f"p99={result['p99_ms']:8.2f}ms  cpu/req={result['cpu_ms_per_request']:7.2f}ms"
+    )
+    if baseline is not None and result["cpu_ms_per_request"]:
+        line += f"  ({baseline['cpu_ms_per_request'] / result['cpu_ms_per_request']:.2f}x cpu)"
+    return line
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do caminho rápido de JSON por tamanho de payload")
+    parser.add_argument("--sizes", default="10,1000,10000,100000", help="tamanhos do payload, em itens")
+    parser.add_argument("--services", type=int, default=3)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=5, help="segundos de medição")
+    parser.add_argument("--warmup", type=float, default=1, help="segundos de aquecimento")
+    parser.add_argument("--env", action="append", default=[], help="variável extra para as instâncias (CHAVE=valor)")
+    parser.add_argument("--json", action="store_true", help="saída em JSON (uma linha por execução)")
+    for signal in SIGNALS:
+        parser.add_argument(f"--{signal}", action=argparse.BooleanOptionalAction, default=True)
+    args = parser.parse_args()
+
+    signals = {signal: getattr(args, signal) for signal in SIGNALS}
+    # Parâmetros de bench.chain que não variam aqui
+    args.rate = 0
+    args.sink_latency_ms = 0
+    args.sink_error_rate = 0
+    base_env = args.env
+
+    for size in (int(size) for size in args.sizes.split(",")):
+        args.payload_size = size
+        baseline = None
+        for mode, enabled in MODES.items():
+            args.env = [*base_env, f"FAST_JSON_ENABLED={enabled}"]
+            result = run_benchmark(args, signals)
+            if args.json:
+                print(json.dumps({"payload_size": size, "json": mode, **result}), flush=True)
+            else:
+                print(_format(size, mode, result, baseline), flush=True)
+            baseline = baseline or result
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+# =============================================================================
+# BENCHMARK DE COLD START - IMPORT E STARTUP
+# =============================================================================
+# Mede, sempre em processos novos (sem cache de módulos do processo atual):
+#   - import: tempo de "import app" (só definição da aplicação; a telemetria
+#     não é configurada no import, ver otel/telemetry.py)
+#   - ready:  tempo desde o spawn do uvicorn até a primeira resposta de GET /,
+#     incluindo o lifespan (setup_telemetry) e o bind da porta
+#
+# Cada medida é repetida --runs vezes e reportada como mediana e mínimo.
+# --importtime lista os módulos de topo mais lentos (python -X importtime),
+# para achar o responsável por uma regressão.
+#
+# Uso (a partir de src/):
+#   python -m bench.startup
+#   python -m bench.startup --runs 10 --importtime
+#   python -m bench.startup --no-traces --no-logs --json
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from bench.chain import SIGNALS, SRC_DIR, _free_port, _spawn, _wait_ready
+
+IMPORT_SNIPPET = "import time; start = time.perf_counter(); import app; print(time.perf_counter() - start)"
+
+
+def _env(signals: dict, extra_env: dict) -> dict:
+    return {
+        **extra_env,
+        **{f"TELEMETRY_{signal.upper()}_ENABLED": str(enabled).lower()
+           for signal, enabled in signals.items()},
+    }
+
+
+def measure_import(env: dict) -> float:
+    output = subprocess.run(
+        [sys.executable, "-c", IMPORT_SNIPPET],
+        cwd=SRC_DIR, env={**os.environ, **env}, capture_output=True, text=True, check=True,
+    ).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def measure_ready(env: dict) -> float:
+    port = _free_port()
+    start = time.perf_counter()
+    process = _spawn(
+        ["uvicorn", "app:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning", "--no-access-log"],
+        env,
+    )
+    try:
+        _wait_ready(f"http://127.0.0.1:{port}/", process, timeout=60)
+        return time.perf_counter() - start
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def slowest_imports(env: dict, top: int) -> list:
+    """Módulos importados diretamente por app (ou pelo interpretador), pelo tempo acumulado."""
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app"],
+        cwd=SRC_DIR, env={**os.environ, **env}, capture_output=True, text=True, check=True,
+    ).stderr
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        # "import time: <self> | <cumulative> | <nome indentado por nível>"
+        _, cumulative_us, name = line.split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth <= 1:
+            modules.append((name.strip(), int(cumulative_us) / 1000))
+    modules.sort(key=lambda item: item[1], reverse=True)
+    return modules[:top]
+
+
+def _summary(samples: list) -> dict:
+    return {
+        "median_ms": statistics.median(samples) * 1000,
+        "min_ms": min(samples) * 1000,
+    }
+
+
+def run_benchmark(args, signals: dict) -> dict:
+    env = _env(signals, dict(env.split("=", 1) for env in args.env))
+    result = {
+        "signals": signals,
+        "runs": args.runs,
+        "import": _summary([measure_import(env) for _ in range(args.runs)]),
+        "ready": _summary([measure_ready(env) for _ in range(args.runs)]),
+    }
+    if args.importtime:
+        result["slowest_imports_ms"] = dict(slowest_imports(env, args.top))
+    return result
+
+
+def _format(result: dict) -> str:
+    enabled = ",".join(signal for signal in SIGNALS if result["signals"][signal]) or "nenhum"
+    lines = [
+        f"sinais={enabled:<20} runs={result['runs']:<3} "
+        f"import: mediana={result['import']['median_ms']:7.1f}ms min={result['import']['min_ms']:7.1f}ms  "
+        f"ready: mediana={result['ready']['median_ms']:7.1f}ms min={result['ready']['min_ms']:7.1f}ms"
+    ]
+    for name, elapsed in result.get("slowest_imports_ms", {}).items():
+        lines.append(f"    {elapsed:8.1f}ms  {name}")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de tempo de import e de startup da aplicação")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--importtime", action="store_true", help="lista os imports mais lentos")
+    parser.add_argument("--top", type=int, default=10, help="quantidade de módulos em --importtime")
+    parser.add_argument("--env", action="append", default=[], help="variável extra para a aplicação (CHAVE=valor)")
+    parser.add_argument("--json", action="store_true", help="saída em JSON")
+    for signal in SIGNALS:
+        parser.add_argument(f"--{signal}", action=argparse.BooleanOptionalAction, default=True)
+    args = parser.parse_args()
+
+    result = run_benchmark(args, {signal: getattr(args, signal) for signal in SIGNALS})
+    print(json.dumps(result) if args.json else _format(result), flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+# =============================================================================
+# COALESCÊNCIA DE REQUISIÇÕES (SINGLE-FLIGHT)
+# =============================================================================
+# Clientes que repetem ou duplicam um payload ao mesmo tempo fazem cada cópia
+# executar o processamento simulado e percorrer toda a cadeia de
+# APP_URL_DESTINO de novo. Com COALESCE_ENABLED, requisições idênticas em
+# andamento compartilham uma única execução (a do "líder") e uma única
+# propagação downstream.
+#
+# A chave é um hash (blake2b) da codificação JSON de [rota, payload, valores
+# dos headers listados em COALESCE_KEY_HEADERS (ex.: "x-tenant-id")]; o JSON
+# delimita cada item, então entradas diferentes não colidem. Atrás do single-flight fica um
+# cache pequeno de resultados bem-sucedidos (2xx), com TTL
+# (COALESCE_CACHE_TTL_MS, 0 desativa) e no máximo COALESCE_CACHE_MAX_ENTRIES
+# entradas, descartando a menos usada (LRU).
+#
+# A execução compartilhada roda em uma task própria, sob um span próprio
+# ("coalesce-execution", filho do span do líder): se o cliente do líder
+# desconectar e o span dele terminar, a execução continua registrando
+# atributos, status e exceções em um span ainda aberto, e as demais
+# requisições continuam esperando o mesmo resultado. O span de cada
+# requisição (líder, coalesced ou hit no cache) ganha um link para o span da
+# execução e um status derivado do resultado compartilhado; elas são
+# contadas em app_coalesce_requests_total por resultado (hit, miss,
+# coalesced).
+
+import asyncio
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from opentelemetry import trace
+from opentelemetry.trace import Status, StatusCode
+
+import config
+from otel import phases
+from otel.metrics import limit_cardinality, meter
+from otel.tracing import tracer
+
+coalesce_counter = limit_cardinality(
+    meter.create_counter,
+    name="app_coalesce_requests_total",
+    description="Requisições por resultado da coalescência (hit no cache, miss ou coalesced)",
+    unit="1",
+)
+
+
+class _Entry:
+    __slots__ = ("result", "span_context", "expires_at")
+
+    def __init__(self, result, span_context, expires_at):
+        self.result = result
+        self.span_context = span_context
+        self.expires_at = expires_at
+
+
+class ResultCache:
+    """Cache LRU com TTL dos resultados de execuções bem-sucedidas."""
+
+    def __init__(self, ttl_ms: float, max_entries: int):
+        self._ttl = ttl_ms / 1000
+        self._max_entries = max_entries
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+
+    @property
+    def enabled(self) -> bool:
+        return self._ttl > 0 and self._max_entries > 0
+
+    def get(self, key: str) -> Optional[_Entry]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() >= entry.expires_at:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key: str, result, span_context) -> None:
+        if not self.enabled:
+            return
+        self._entries[key] = _Entry(result, span_context, time.monotonic() + self._ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+
+
+class Coalescer:
+    def __init__(self, enabled: bool, key_headers: str, cache: ResultCache):
+        self.enabled = enabled
+        self._key_headers = [name.strip().lower() for name in key_headers.split(",") if name.strip()]
+        self._cache = cache
+        # Chave -> (task da execução compartilhada, span da execução)
+        self._inflight: Dict[str, Tuple[asyncio.Task, trace.SpanContext]] = {}
+
+    def key(self, route: str, payload, headers) -> str:
+        encoded = json.dumps(
+            [route, payload, [headers.get(name, "") for name in self._key_headers]],
+            separators=(",", ":"),
+            default=str,
+        )
+        return hashlib.blake2b(encoded.encode(), digest_size=16).hexdigest()
+
+    async def run(self, route: str, key: str, execute: Callable[[object], Awaitable[Tuple[int, object]]], span):
+        """
+        Retorna (status, corpo) do cache, de uma execução idêntica em
+        andamento ou de uma nova execução de execute(span_da_execução).
+        """
+        attributes = {"app": config.APP_NAME, "route": route}
+
+        entry = self._cache.get(key)
+        if entry is not None:
+            coalesce_counter.add(1, {**attributes, "result": "hit"})
+            return self._join(span, entry.span_context, "hit", entry.result)
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            task, execution_context = inflight
+            coalesce_counter.add(1, {**attributes, "result": "coalesced"})
+            self._link(span, execution_context, "follower", "coalesced")
+            with phases.waiting("coalesced"):
+                result = await asyncio.shield(task)
+            return self._join(span, execution_context, None, result)
+
+        coalesce_counter.add(1, {**attributes, "result": "miss"})
+        # Criado aqui, com o span do líder como pai, para que o contexto já
+        # exista quando outras requisições chegarem; termina com a task
+        execution_span = tracer.start_span("coalesce-execution", attributes={"coalesce.route": route})
+        execution_context = execution_span.get_span_context()
+
+        async def shared():
+            with trace.use_span(execution_span, end_on_exit=True):
+                result = await execute(execution_span)
+                _set_status(execution_span, result[0])
+                return result
+
+        task = asyncio.ensure_future(shared())
+        self._inflight[key] = (task, execution_context)
+        task.add_done_callback(lambda done: self._finish(key, done, execution_context))
+        self._link(span, execution_context, "leader", "miss")
+        result = await asyncio.shield(task)
+        return self._join(span, execution_context, None, result)
+
+    def _finish(self, key: str, task: asyncio.Task, execution_context) -> None:
+        self._inflight.pop(key, None)
+        if task.cancelled() or task.exception() is not None:
+            return
+        status_code, _ = task.result()
+        if 200 <= status_code < 300:
+            self._cache.put(key, task.result(), execution_context)
+
+    def _join(self, span, execution_context, result: Optional[str], shared_result):
+        """Liga o span da requisição ao resultado compartilhado e define seu status."""
+        if result is not None:
+            self._link(span, execution_context, "follower", result)
+        _set_status(span, shared_result[0])
+        return shared_result
+
+    @staticmethod
+    def _link(span, execution_context, role: str, result: str) -> None:
+        span.set_attribute("coalesce.role", role)
+        span.set_attribute("coalesce.result", result)
+        if execution_context.is_valid:
+            span.add_link(execution_context, {"coalesce.result": result})
+
+
+def _set_status(span, status_code: int) -> None:
+    if status_code >= 400:
+        span.set_status(Status(StatusCode.ERROR, f"HTTP {status_code}"))
+    else:
+        span.set_status(Status(StatusCode.OK))
+
+
+coalescer = Coalescer(
+    enabled=config.COALESCE_ENABLED,
+    key_headers=config.COALESCE_KEY_HEADERS,
+    cache=ResultCache(config.COALESCE_CACHE_TTL_MS, config.COALESCE_CACHE_MAX_ENTRIES),
+)
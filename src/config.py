@@ -13,5 +13,258 @@ APP_URL_DESTINO = os.getenv("APP_URL_DESTINO", "")
 # Simulação de problemas
 APP_ERRORS = int(os.getenv("APP_ERRORS", "0"))  # Porcentagem de erro (0 a 100)
 APP_LATENCY = int(os.getenv("APP_LATENCY", "0"))  # Tempo máximo de atraso (em ms)
+# Injeção de falhas por rota e por destino (JSON, ver faults.py) e semente
+# dos sorteios para execuções reproduzíveis (vazia usa uma semente aleatória)
+FAULT_RULES = os.getenv("FAULT_RULES", "")
+FAULT_SEED = os.getenv("FAULT_SEED") or None
 
-OTLP_ENDPOINT = os.getenv("OTLP_ENDPOINT", "") 
\ No newline at end of file
+# Caminho rápido de JSON em /process (fastjson.py): corpo decodificado e
+# validado com orjson, e bytes das respostas downstream repassados sem recodificar
+FAST_JSON_ENABLED = os.getenv("FAST_JSON_ENABLED", "false").lower() in ("1", "true", "yes")
+
+OTLP_ENDPOINT = os.getenv("OTLP_ENDPOINT", "") 
+
+# Transporte OTLP: "http/protobuf" (OTLP_ENDPOINT na porta 4318) ou "grpc"
+# (OTLP_ENDPOINT na porta 4317)
+OTLP_PROTOCOL = os.getenv("OTLP_PROTOCOL", "http/protobuf").lower()
+OTLP_COMPRESSION = os.getenv("OTLP_COMPRESSION", "gzip").lower()  # "gzip" ou "none"
+OTLP_TIMEOUT_S = int(os.getenv("OTLP_TIMEOUT_S", "10"))  # Timeout de cada exportação
+
+# Nível do logger da aplicação (pode ser alterado em runtime via /admin/config)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+
+# Token dos endpoints /admin (Authorization: Bearer <token>); vazio desabilita
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+# Arquivo compartilhado pelos workers do mesmo pod: alterações feitas em
+# /admin/config são gravadas nele e aplicadas por todos os workers, que o
+# verificam a cada ADMIN_SETTINGS_POLL_MS. Vazio aplica só no processo que
+# atendeu a requisição; o launcher.py define um com mais de um worker
+ADMIN_SETTINGS_FILE = os.getenv("ADMIN_SETTINGS_FILE", "")
+ADMIN_SETTINGS_POLL_MS = int(os.getenv("ADMIN_SETTINGS_POLL_MS", "1000"))
+
+# Liga/desliga cada sinal de telemetria de forma independente
+TELEMETRY_TRACES_ENABLED = os.getenv("TELEMETRY_TRACES_ENABLED", "true").lower() in ("1", "true", "yes")
+TELEMETRY_METRICS_ENABLED = os.getenv("TELEMETRY_METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+TELEMETRY_LOGS_ENABLED = os.getenv("TELEMETRY_LOGS_ENABLED", "true").lower() in ("1", "true", "yes")
+
+# ================================
+#  CLIENTE HTTP DOWNSTREAM
+# ================================
+
+# Modo de propagação para APP_URL_DESTINO:
+#   "sequential" -> encadeia os serviços (resposta de um é o payload do próximo)
+#   "concurrent" -> chama todos os destinos em paralelo com o mesmo payload
+APP_FANOUT_MODE = os.getenv("APP_FANOUT_MODE", "sequential").lower()
+
+# Limites do pool de conexões do httpx.AsyncClient compartilhado
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))  # Em segundos
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "5"))  # Em segundos
+
+
+# ================================
+#  RESILIÊNCIA DOWNSTREAM
+# ================================
+
+# Circuit breaker por destino: abre após N falhas seguidas, fica aberto por
+# BREAKER_OPEN_MS e então deixa passar chamadas de teste (half-open)
+BREAKER_ENABLED = os.getenv("BREAKER_ENABLED", "true").lower() in ("1", "true", "yes")
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_OPEN_MS = int(os.getenv("BREAKER_OPEN_MS", "5000"))
+BREAKER_HALF_OPEN_MAX_CALLS = int(os.getenv("BREAKER_HALF_OPEN_MAX_CALLS", "1"))
+
+# Retries de falhas transitórias, limitados por um orçamento (token bucket)
+# por destino: cada chamada deposita RETRY_BUDGET_RATIO token, cada retry gasta 1
+RETRY_MAX_RETRIES = int(os.getenv("RETRY_MAX_RETRIES", "2"))
+RETRY_BACKOFF_MS = int(os.getenv("RETRY_BACKOFF_MS", "50"))  # Base do backoff exponencial
+RETRY_BUDGET_RATIO = float(os.getenv("RETRY_BUDGET_RATIO", "0.1"))
+RETRY_BUDGET_MAX_TOKENS = float(os.getenv("RETRY_BUDGET_MAX_TOKENS", "10"))
+
+# Hedging: segunda requisição quando a primeira passa do percentil de latência
+# do destino (após HEDGE_MIN_SAMPLES amostras; HEDGE_WINDOW controla o decaimento)
+HEDGE_ENABLED = os.getenv("HEDGE_ENABLED", "false").lower() in ("1", "true", "yes")
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "0.95"))
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "50"))
+HEDGE_WINDOW = int(os.getenv("HEDGE_WINDOW", "1000"))
+
+# ================================
+#  PROCESSAMENTO EM LOTE
+# ================================
+
+# /process/batch: itens por lote (um span, um log e uma chamada downstream por
+# lote) e espera máxima, em ms, para fechar um lote incompleto enquanto o
+# corpo ainda está chegando
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "100"))
+BATCH_MAX_WAIT_MS = int(os.getenv("BATCH_MAX_WAIT_MS", "50"))
+# Tamanho máximo de um item (em bytes); acima disso a leitura é interrompida
+BATCH_MAX_ITEM_BYTES = int(os.getenv("BATCH_MAX_ITEM_BYTES", str(1024 * 1024)))
+
+# ================================
+#  COALESCÊNCIA DE REQUISIÇÕES
+# ================================
+
+# /process: requisições idênticas em andamento compartilham uma execução.
+# A chave é o payload mais os headers listados (separados por vírgula)
+COALESCE_ENABLED = os.getenv("COALESCE_ENABLED", "false").lower() in ("1", "true", "yes")
+COALESCE_KEY_HEADERS = os.getenv("COALESCE_KEY_HEADERS", "")
+# Cache LRU dos resultados bem-sucedidos; COALESCE_CACHE_TTL_MS=0 desativa
+COALESCE_CACHE_TTL_MS = int(os.getenv("COALESCE_CACHE_TTL_MS", "1000"))
+COALESCE_CACHE_MAX_ENTRIES = int(os.getenv("COALESCE_CACHE_MAX_ENTRIES", "1024"))
+
+# ================================
+#  DIAGNÓSTICO DE LATÊNCIA
+# ================================
+
+# Tempo por fase de /process (fila, CPU do handler, sleep, downstream,
+# telemetria) nos spans e em app_request_phase_seconds (otel/phases.py)
+PHASE_TIMING_ENABLED = os.getenv("PHASE_TIMING_ENABLED", "true").lower() in ("1", "true", "yes")
+# Duração máxima de um profiling via POST /admin/profile (otel/profiler.py)
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "60"))
+
+# ================================
+#  LAUNCHER (PRE-FORK)
+# ================================
+
+# Endereço e workers do launcher.py; WEB_CONCURRENCY=0 calcula os workers
+# pela cota de CPU do cgroup (ou pelas CPUs disponíveis)
+APP_HOST = os.getenv("APP_HOST", "0.0.0.0")
+APP_PORT = int(os.getenv("APP_PORT", "8000"))
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "0"))
+# Tempo para os workers terminarem as requisições em andamento e exportarem a
+# telemetria no encerramento, antes de serem finalizados com SIGKILL
+GRACEFUL_TIMEOUT_S = float(os.getenv("GRACEFUL_TIMEOUT_S", "30"))
+
+
+# ================================
+#  EXPORTAÇÃO DE LOGS
+# ================================
+
+# Exportador de console para logs (desligado por padrão)
+LOG_CONSOLE_EXPORTER = os.getenv("LOG_CONSOLE_EXPORTER", "false").lower() in ("1", "true", "yes")
+
+# Fila limitada e lotes da exportação de logs
+LOG_EXPORT_MAX_QUEUE_SIZE = int(os.getenv("LOG_EXPORT_MAX_QUEUE_SIZE", "2048"))
+LOG_EXPORT_MAX_BATCH_SIZE = int(os.getenv("LOG_EXPORT_MAX_BATCH_SIZE", "512"))
+LOG_EXPORT_SCHEDULE_DELAY_MS = int(os.getenv("LOG_EXPORT_SCHEDULE_DELAY_MS", "1000"))
+
+# Política com a fila cheia: "drop" descarta na hora; "block" espera até
+# LOG_EXPORT_BLOCK_TIMEOUT_MS por espaço e então descarta
+LOG_EXPORT_FULL_POLICY = os.getenv("LOG_EXPORT_FULL_POLICY", "drop").lower()
+LOG_EXPORT_BLOCK_TIMEOUT_MS = int(os.getenv("LOG_EXPORT_BLOCK_TIMEOUT_MS", "50"))
+
+# Como payloads aparecem nos logs: "size" (padrão), "hash" ou "full"
+LOG_PAYLOAD_MODE = os.getenv("LOG_PAYLOAD_MODE", "size").lower()
+
+
+# ================================
+#  AMOSTRAGEM DE TRACES
+# ================================
+
+# Head sampling: fração dos traces novos que são gravados (0.0 a 1.0).
+# Traces que chegam com traceparent seguem a decisão do serviço anterior.
+TRACE_SAMPLING_RATIO = float(os.getenv("TRACE_SAMPLING_RATIO", "1.0"))
+
+# Tail sampling local: mantém traces com erro ou lentos e uma fração dos demais
+TAIL_SAMPLING_ENABLED = os.getenv("TAIL_SAMPLING_ENABLED", "false").lower() in ("1", "true", "yes")
+TAIL_SAMPLING_LATENCY_MS = float(os.getenv("TAIL_SAMPLING_LATENCY_MS", "500"))
+TAIL_SAMPLING_SUCCESS_RATIO = float(os.getenv("TAIL_SAMPLING_SUCCESS_RATIO", "0.1"))
+TAIL_SAMPLING_MAX_TRACES = int(os.getenv("TAIL_SAMPLING_MAX_TRACES", "1000"))
+TAIL_SAMPLING_MAX_SPANS_PER_TRACE = int(os.getenv("TAIL_SAMPLING_MAX_SPANS_PER_TRACE", "256"))
+
+
+# ================================
+#  EXPORTAÇÃO DE SPANS
+# ================================
+
+# Fila e lotes do BatchSpanProcessor (padrões do SDK)
+SPAN_EXPORT_MAX_QUEUE_SIZE = int(os.getenv("SPAN_EXPORT_MAX_QUEUE_SIZE", "2048"))
+SPAN_EXPORT_MAX_BATCH_SIZE = int(os.getenv("SPAN_EXPORT_MAX_BATCH_SIZE", "512"))
+SPAN_EXPORT_SCHEDULE_DELAY_MS = int(os.getenv("SPAN_EXPORT_SCHEDULE_DELAY_MS", "5000"))
+SPAN_EXPORT_TIMEOUT_MS = int(os.getenv("SPAN_EXPORT_TIMEOUT_MS", "30000"))
+
+
+# Fila de exportação persistente em disco para spans e logs (vazio desabilita)
+EXPORT_QUEUE_DIR = os.getenv("EXPORT_QUEUE_DIR", "")
+EXPORT_QUEUE_MAX_BYTES = int(os.getenv("EXPORT_QUEUE_MAX_BYTES", str(256 * 1024 * 1024)))  # Por sinal e worker
+EXPORT_QUEUE_SEGMENT_BYTES = int(os.getenv("EXPORT_QUEUE_SEGMENT_BYTES", str(8 * 1024 * 1024)))
+EXPORT_QUEUE_RETRY_MAX_S = float(os.getenv("EXPORT_QUEUE_RETRY_MAX_S", "30"))  # Backoff máximo do reenvio
+
+
+# ================================
+#  LIMITES DE SPAN
+# ================================
+
+# Limites aplicados pelo TracerProvider a cada span
+SPAN_MAX_ATTRIBUTE_LENGTH = int(os.getenv("SPAN_MAX_ATTRIBUTE_LENGTH", "1024"))  # Caracteres por valor
+SPAN_MAX_ATTRIBUTES = int(os.getenv("SPAN_MAX_ATTRIBUTES", "64"))
+SPAN_MAX_EVENTS = int(os.getenv("SPAN_MAX_EVENTS", "32"))
+
+# Como payloads aparecem nos spans: "summary" (tamanho, bytes e hash) ou "full"
+SPAN_PAYLOAD_MODE = os.getenv("SPAN_PAYLOAD_MODE", "summary").lower()
+# No modo "full", quantidade máxima de elementos gravados
+SPAN_PAYLOAD_MAX_ITEMS = int(os.getenv("SPAN_PAYLOAD_MAX_ITEMS", "50"))
+
+
+# ================================
+#  EXPORTAÇÃO DE MÉTRICAS
+# ================================
+
+# Intervalo de exportação OTLP (em ms)
+METRICS_EXPORT_INTERVAL_MS = int(os.getenv("METRICS_EXPORT_INTERVAL_MS", "10000"))
+
+# Temporalidade OTLP: "cumulative", "delta" ou "lowmemory"
+METRICS_TEMPORALITY = os.getenv("METRICS_TEMPORALITY", "cumulative").lower()
+
+# Agregação dos histogramas enviados via OTLP: "explicit" ou "exponential"
+METRICS_HISTOGRAM_AGGREGATION = os.getenv("METRICS_HISTOGRAM_AGGREGATION", "explicit").lower()
+# Modo "exponential": máximo de buckets e escala inicial (base 2^(2^-escala))
+METRICS_EXPONENTIAL_MAX_SIZE = int(os.getenv("METRICS_EXPONENTIAL_MAX_SIZE", "160"))
+METRICS_EXPONENTIAL_MAX_SCALE = int(os.getenv("METRICS_EXPONENTIAL_MAX_SCALE", "20"))
+
+# Allow-list de atributos por instrumento ("instrumento:chave1,chave2;...")
+METRICS_ATTRIBUTE_KEYS = os.getenv(
+    "METRICS_ATTRIBUTE_KEYS",
+    "app_requests_total:app,endpoint;app_response_time_seconds:app,route,status_class;app_active_requests:app,route"
+)
+
+# Instrumentos descartados por completo (separados por vírgula)
+METRICS_DROP_INSTRUMENTS = os.getenv("METRICS_DROP_INSTRUMENTS", "")
+
+# Máximo de combinações de atributos por instrumento antes do overflow
+METRICS_CARDINALITY_LIMIT = int(os.getenv("METRICS_CARDINALITY_LIMIT", "2000"))
+
+# Tempo de vida do snapshot servido em /metrics (em ms, 0 desativa o cache)
+METRICS_SCRAPE_CACHE_TTL_MS = int(os.getenv("METRICS_SCRAPE_CACHE_TTL_MS", "1000"))
+# Nível de compressão gzip do /metrics quando o scraper envia Accept-Encoding
+METRICS_SCRAPE_GZIP_LEVEL = int(os.getenv("METRICS_SCRAPE_GZIP_LEVEL", "6"))
+
+# Modo multiprocess (uvicorn --workers): diretório compartilhado onde cada
+# worker grava snapshots das suas métricas; vazio desabilita
+METRICS_MULTIPROC_DIR = os.getenv("METRICS_MULTIPROC_DIR", "")
+METRICS_MULTIPROC_SYNC_INTERVAL_MS = int(os.getenv("METRICS_MULTIPROC_SYNC_INTERVAL_MS", "1000"))
+
+
+# ================================
+#  MÉTRICAS DE RUNTIME
+# ================================
+
+# Intervalo mínimo entre leituras do psutil, compartilhadas entre callbacks
+RUNTIME_SAMPLE_INTERVAL_MS = int(os.getenv("RUNTIME_SAMPLE_INTERVAL_MS", "1000"))
+# Intervalo do monitor de lag do event loop e do threadpool
+RUNTIME_LOOP_MONITOR_INTERVAL_MS = int(os.getenv("RUNTIME_LOOP_MONITOR_INTERVAL_MS", "500"))
+
+
+# ================================
+#  CONTROLE DE ADMISSÃO
+# ================================
+
+# Limites de concorrência por rota: "rota=limite[:fila],..." (ex.: "/process=64:128")
+# Rotas não listadas não têm limite
+ADMISSION_LIMITS = os.getenv("ADMISSION_LIMITS", "")
+# Tamanho padrão da fila de espera por rota e tempo máximo de espera (em ms)
+ADMISSION_QUEUE_SIZE = int(os.getenv("ADMISSION_QUEUE_SIZE", "64"))
+ADMISSION_QUEUE_TIMEOUT_MS = int(os.getenv("ADMISSION_QUEUE_TIMEOUT_MS", "1000"))
+# Status das requisições rejeitadas (503 ou 429) e valor do header Retry-After
+ADMISSION_SHED_STATUS = int(os.getenv("ADMISSION_SHED_STATUS", "503"))
+ADMISSION_RETRY_AFTER_S = int(os.getenv("ADMISSION_RETRY_AFTER_S", "1"))
@@ -0,0 +1,334 @@
+# =============================================================================
+# MÓDULO DE CHAMADAS DOWNSTREAM
+# =============================================================================
+# Centraliza a propagação do payload para os serviços listados em
+# APP_URL_DESTINO. Usa um único httpx.AsyncClient compartilhado, com pool de
+# conexões keep-alive, para evitar abrir uma conexão TCP nova a cada hop.
+
+import asyncio
+import json
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, List, Optional, Tuple
+
+import config
+import fastjson
+import faults
+import resilience
+from otel.logs import RequestLogger
+from otel.tracing import tracer, propagator
+
+# httpx só é importado na primeira chamada downstream (fora do caminho de
+# import da aplicação)
+if TYPE_CHECKING:
+    import httpx
+
+# =============================================================================
+# CLIENTE HTTP COMPARTILHADO
+# =============================================================================
+# O cliente é criado sob demanda na primeira chamada e fechado no shutdown da
+# aplicação (ver lifespan em app.py).
+_client: Optional["httpx.AsyncClient"] = None
+
+
+def get_client() -> "httpx.AsyncClient":
+    """
+    Retorna o cliente HTTP assíncrono compartilhado, criando-o se necessário.
+    Os limites do pool vêm de config.py.
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        import httpx
+
+        _client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=config.HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=config.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=config.HTTP_KEEPALIVE_EXPIRY,
+            ),
+            timeout=httpx.Timeout(config.HTTP_TIMEOUT),
+        )
+    return _client
+
+
+async def close_client() -> None:
+    """Fecha o cliente compartilhado e libera as conexões do pool."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+# =============================================================================
+# RESULTADO DE UMA CHAMADA
+# =============================================================================
+@dataclass
+class DownstreamResult:
+    url: str
+    status_code: Optional[int] = None
+    payload: Optional[List[str]] = None
+    error: Optional[Exception] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None and self.status_code == 200
+
+
+def _is_payload(value) -> bool:
+    return isinstance(value, list) and all(isinstance(item, str) for item in value)
+
+
+async def _post(url: str, path: str, **kwargs) -> "httpx.Response":
+    """
+    Uma tentativa de POST, com as falhas injetadas para o destino
+    (FAULT_RULES) sorteadas a cada tentativa. Um status simulado vira uma
+    resposta sem corpo, sem chamar o destino.
+    """
+    import httpx
+
+    plan = await faults.before_call(url)
+    injected_status = faults.simulated_status(plan)
+    if injected_status is not None:
+        return httpx.Response(injected_status)
+    resp = await get_client().post(f"{url}{path}", **kwargs)
+    await faults.after_call(plan)
+    return resp
+
+
+async def send(url: str, payload: List[str], log: RequestLogger) -> DownstreamResult:
+    """
+    Envia o payload para um serviço downstream dentro de um span filho
+    "send-request", injetando o traceparent nos headers. Circuit breaker,
+    retries e hedging ficam em resilience.call().
+    """
+    import httpx
+
+    with tracer.start_as_current_span("send-request") as child_span:
+        # Log do início da requisição externa
+        log.debug(
+            "Enviando requisição para serviço downstream",
+            destination_url=url,
+            request_method="POST",
+            request_path="/process"
+        )
+
+        headers = {}
+        propagator.inject(headers)
+
+        child_span.set_attribute("net.peer.name", url)
+        child_span.set_attribute("destination.url", url)
+
+        # Caminho rápido: corpo serializado com orjson, ou os bytes recebidos do
+        # destino anterior repassados como estão (fastjson.EncodedList)
+        if config.FAST_JSON_ENABLED:
+            headers["content-type"] = "application/json"
+            body = {"content": fastjson.dumps(payload)}
+        else:
+            body = {"json": payload}
+
+        try:
+            resp = await resilience.call(
+                url, lambda: _post(url, "/process", headers=headers, **body), child_span
+            )
+        except (httpx.HTTPError, resilience.CircuitOpenError) as e:
+            child_span.record_exception(e)
+            return DownstreamResult(url=url, error=e)
+
+        child_span.set_attribute("http.status_code", resp.status_code)
+
+        if resp.status_code != 200:
+            return DownstreamResult(url=url, status_code=resp.status_code)
+
+        # Corpo que não é JSON ou não é uma lista de strings é uma falha da
+        # requisição externa, como um erro de conexão
+        try:
+            result_payload = fastjson.loads_list(resp.content) if config.FAST_JSON_ENABLED else resp.json()
+            if not _is_payload(result_payload):
+                raise ValueError(f"resposta de {url} não é uma lista de strings")
+        except ValueError as e:
+            child_span.record_exception(e)
+            return DownstreamResult(url=url, status_code=resp.status_code, error=e)
+
+        child_span.add_event("Requisição externa bem-sucedida", {"url": url})
+        return DownstreamResult(url=url, status_code=resp.status_code, payload=result_payload)
+
+
+async def chain(
+    urls: List[str], payload: List[str], log: RequestLogger
+) -> Tuple[List[str], Optional[DownstreamResult]]:
+    """
+    Modo sequencial: a resposta de cada serviço é o payload do próximo.
+    Interrompe na primeira falha.
+    """
+    for url in urls:
+        result = await send(url, payload, log)
+        if not result.ok:
+            return payload, result
+        payload = result.payload
+        _log_success(result, log)
+    return payload, None
+
+
+async def fan_out(
+    urls: List[str], payload: List[str], log: RequestLogger
+) -> Tuple[List[str], Optional[DownstreamResult]]:
+    """
+    Modo concorrente: todos os destinos recebem o mesmo payload ao mesmo tempo.
+    Os elementos acrescentados por cada destino são concatenados na ordem de
+    APP_URL_DESTINO. A primeira falha (na mesma ordem) é devolvida.
+    """
+    results = await asyncio.gather(*(send(url, payload, log) for url in urls))
+
+    merged = list(payload)
+    for result in results:
+        if not result.ok:
+            return payload, result
+        _log_success(result, log)
+        merged.extend(result.payload[len(payload):])
+    return merged, None
+
+
+async def propagate(
+    urls: List[str], payload: List[str], log: RequestLogger
+) -> Tuple[List[str], Optional[DownstreamResult]]:
+    """Propaga o payload conforme APP_FANOUT_MODE ("sequential" ou "concurrent")."""
+    if config.APP_FANOUT_MODE == "concurrent":
+        return await fan_out(urls, payload, log)
+    return await chain(urls, payload, log)
+
+
+# =============================================================================
+# LOTES (/process/batch)
+# =============================================================================
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+async def send_batch(url: str, items: List[dict], log: RequestLogger) -> List[DownstreamResult]:
+    """
+    Envia um lote para /process/batch de um serviço downstream em um único
+    POST NDJSON, dentro de um span filho "send-batch". Cada item é um objeto
+    {"payload": [...], "traceparent": ...}. Retorna um resultado por item, na
+    ordem do lote.
+    """
+    import httpx
+
+    with tracer.start_as_current_span("send-batch") as child_span:
+        log.debug(
+            "Enviando lote para serviço downstream",
+            destination_url=url,
+            request_method="POST",
+            request_path="/process/batch",
+            batch_size=len(items)
+        )
+
+        headers = {"content-type": NDJSON_MEDIA_TYPE}
+        propagator.inject(headers)
+
+        child_span.set_attribute("net.peer.name", url)
+        child_span.set_attribute("destination.url", url)
+        child_span.set_attribute("batch.size", len(items))
+
+        body = "".join(json.dumps(item, separators=(",", ":")) + "\n" for item in items)
+        try:
+            resp = await resilience.call(
+                url, lambda: _post(url, "/process/batch", content=body, headers=headers), child_span
+            )
+        except (httpx.HTTPError, resilience.CircuitOpenError) as e:
+            child_span.record_exception(e)
+            return [DownstreamResult(url=url, error=e) for _ in items]
+
+        child_span.set_attribute("http.status_code", resp.status_code)
+
+        if resp.status_code != 200:
+            return [DownstreamResult(url=url, status_code=resp.status_code) for _ in items]
+
+        # Uma linha por item: {"index": i, "status": ..., "payload" | "error": ...}
+        # Itens sem linha válida (resposta interrompida no meio de uma linha,
+        # linha de erro final do lote, índice fora do lote, status 200 sem
+        # um payload que seja lista de strings) são tratados como 502
+        results = [DownstreamResult(url=url, status_code=502) for _ in items]
+        invalid_lines = 0
+        for line in resp.text.splitlines():
+            if not line:
+                continue
+            try:
+                result = json.loads(line)
+                index, status_code = result["index"], result["status"]
+            except (ValueError, KeyError, TypeError):
+                invalid_lines += 1
+                continue
+            if type(index) is not int or not 0 <= index < len(items) or type(status_code) is not int:
+                invalid_lines += 1
+                continue
+            payload = result.get("payload")
+            if status_code == 200 and not _is_payload(payload):
+                invalid_lines += 1
+                continue
+            results[index] = DownstreamResult(url=url, status_code=status_code, payload=payload)
+
+        if invalid_lines:
+            child_span.set_attribute("batch.invalid_lines", invalid_lines)
+            log.warning(
+                "Linhas inválidas na resposta do lote",
+                destination_url=url,
+                invalid_lines=invalid_lines
+            )
+        return results
+
+
+async def propagate_batch(
+    urls: List[str], items: List[dict], log: RequestLogger
+) -> List[Tuple[List[str], Optional[DownstreamResult]]]:
+    """
+    Propaga um lote conforme APP_FANOUT_MODE, com uma chamada por destino
+    para o lote inteiro. Retorna, para cada item, o payload final e a falha
+    (ou None), com a mesma semântica de propagate().
+    """
+    payloads = [item["payload"] for item in items]
+    failures: List[Optional[DownstreamResult]] = [None] * len(items)
+
+    if config.APP_FANOUT_MODE == "concurrent":
+        per_url = await asyncio.gather(*(send_batch(url, items, log) for url in urls))
+        merged = [list(payload) for payload in payloads]
+        for results in per_url:
+            for index, result in enumerate(results):
+                if failures[index] is not None:
+                    continue
+                if not result.ok:
+                    failures[index] = result
+                else:
+                    merged[index].extend(result.payload[len(payloads[index]):])
+        payloads = [payloads[index] if failures[index] else merged[index] for index in range(len(items))]
+    else:
+        # Sequencial: cada destino recebe só os itens que ainda não falharam
+        pending = list(range(len(items)))
+        for url in urls:
+            if not pending:
+                break
+            results = await send_batch(url, [{**items[index], "payload": payloads[index]} for index in pending], log)
+            still_pending = []
+            for index, result in zip(pending, results):
+                if result.ok:
+                    payloads[index] = result.payload
+                    still_pending.append(index)
+                else:
+                    failures[index] = result
+            pending = still_pending
+
+    # Um único log por lote, em vez de um por item
+    log.info(
+        "Lote propagado para serviços downstream",
+        destination_urls=urls,
+        batch_size=len(items),
+        failed_items=sum(failure is not None for failure in failures)
+    )
+    return list(zip(payloads, failures))
+
+
+def _log_success(result: DownstreamResult, log: RequestLogger) -> None:
+    # Log de sucesso na requisição externa
+    log.info(
+        "Requisição externa bem-sucedida",
+        destination_url=result.url,
+        response_status=result.status_code,
+        payload_sent=result.payload
+    )
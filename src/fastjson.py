@@ -0,0 +1,81 @@
+# =============================================================================
+# CAMINHO RÁPIDO DE JSON - /process
+# =============================================================================
+# Com FAST_JSON_ENABLED, /process deixa de declarar "payload: List[str]" (o
+# pydantic valida elemento por elemento e o FastAPI serializa a resposta com
+# jsonable_encoder + json.dumps) e passa a:
+#   - ler o corpo bruto e decodificá-lo com orjson, validando os tipos dos
+#     elementos em uma única passada (parse_payload)
+#   - serializar a resposta com orjson (json_response)
+#   - nas chamadas downstream, enviar o corpo com orjson e decodificar a
+#     resposta direto dos bytes, sem o resp.json() do httpx
+#
+# O payload decodificado de uma resposta downstream é um EncodedList: uma
+# lista que guarda os bytes exatos de onde veio. No modo sequencial esses
+# bytes são repassados como corpo para o próximo destino e devolvidos como
+# resposta ao cliente, sem recodificar. Os bytes só valem enquanto a lista não
+# é modificada; quem precisa alterar o payload cria uma lista nova.
+
+from typing import List
+
+import orjson
+from fastapi import status
+from starlette.responses import Response
+
+
+class EncodedList(list):
+    """Lista decodificada de JSON que guarda o próprio JSON em content."""
+
+    __slots__ = ("content",)
+
+    def __init__(self, items, content: bytes):
+        super().__init__(items)
+        self.content = content
+
+
+class PayloadError(ValueError):
+    """Corpo de /process inválido; detail segue o formato de erro do FastAPI."""
+
+    def __init__(self, error_type: str, message: str, loc: tuple = ("body",)):
+        super().__init__(message)
+        self.detail = [{"type": error_type, "loc": list(loc), "msg": message}]
+
+
+def parse_payload(body: bytes) -> List[str]:
+    """Decodifica o corpo de /process e valida que é uma lista de strings."""
+    try:
+        payload = orjson.loads(body)
+    except orjson.JSONDecodeError as exc:
+        raise PayloadError("json_invalid", f"JSON inválido: {exc}") from exc
+    if type(payload) is not list:
+        raise PayloadError("list_type", "Input should be a valid list")
+    for index, item in enumerate(payload):
+        if type(item) is not str:
+            raise PayloadError("string_type", "Input should be a valid string", ("body", index))
+    return payload
+
+
+def dumps(payload) -> bytes:
+    """Bytes JSON do payload, reaproveitando os de um EncodedList."""
+    if type(payload) is EncodedList:
+        return payload.content
+    return orjson.dumps(payload)
+
+
+def loads_list(content: bytes) -> EncodedList:
+    """
+    Decodifica uma resposta downstream mantendo os bytes originais. Levanta
+    ValueError se o corpo não for JSON ou não for um array.
+    """
+    value = orjson.loads(content)
+    if not isinstance(value, list):
+        raise ValueError("a resposta não é um array JSON")
+    return EncodedList(value, content)
+
+
+def json_response(status_code: int, body) -> Response:
+    return Response(content=dumps(body), status_code=status_code, media_type="application/json")
+
+
+def error_response(exc: PayloadError) -> Response:
+    return json_response(status.HTTP_422_UNPROCESSABLE_ENTITY, {"detail": exc.detail})
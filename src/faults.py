@@ -0,0 +1,374 @@
+# =============================================================================
+# INJEÇÃO DE FALHAS
+# =============================================================================
+# Usado em testes de capacidade para simular dependências lentas ou instáveis.
+# As regras ficam em FAULT_RULES (JSON), por rota ("/process") ou por destino
+# (uma URL de APP_URL_DESTINO):
+#
+#   {"/process": {"latency": "lognormal:40:0.6", "error_pct": 2},
+#    "http://app-c:8000": {"timeout_pct": 1, "reset_pct": 0.5}}
+#
+# Latência ("latency", em ms), aplicada a latency_pct% das requisições:
+#   "fixed:<ms>"                          sempre o mesmo valor
+#   "uniform:<min>:<max>"                 uniforme entre min e max
+#   "lognormal:<mediana>:<sigma>"         cauda longa típica de serviços reais
+#   "pareto:<escala>:<alfa>"              cauda pesada (alfa menor -> cauda maior)
+#   "bimodal:<rápido>:<lento>:<%lento>"   dois modos (ex.: cache hit/miss), cada
+#                                         um com variação lognormal de sigma 0.1
+# latency_max_ms limita o valor sorteado.
+#
+# Falhas (porcentagens mutuamente exclusivas, sorteadas uma vez por requisição):
+#   error_pct      -> resposta error_status (padrão 500) sem executar a rota /
+#                     sem chamar o destino
+#   timeout_pct    -> espera timeout_ms (padrão HTTP_TIMEOUT) e responde 504 /
+#                     levanta httpx.ReadTimeout
+#   reset_pct      -> a rota executa, mas a conexão cai depois do início da
+#                     resposta / levanta httpx.RemoteProtocolError
+#   slow_body_pct  -> o corpo da resposta é entregue em pedaços ao longo de
+#                     slow_body_ms / a leitura da resposta demora slow_body_ms
+#
+# Todas as esperas usam asyncio.sleep: nenhuma thread fica bloqueada, então a
+# vazão simulada não é limitada pelo threadpool.
+#
+# Com FAULT_SEED, os sorteios são reproduzíveis: a n-ésima requisição de cada
+# alvo recebe sempre as mesmas falhas, independentemente da ordem em que
+# requisições concorrentes chegam. O gerador `fault_random` também é usado
+# pela simulação de APP_ERRORS e APP_LATENCY.
+#
+# Depois de um fork() (launcher.py), o processo filho ressorteia os
+# geradores: sem FAULT_SEED com entropia do sistema, com FAULT_SEED com a
+# semente combinada ao pid. O launcher então chama reseed(índice do worker),
+# o que torna os sorteios de cada worker reproduzíveis entre execuções sem
+# que todos os workers sorteiem a mesma sequência.
+#
+# Cada falha injetada vira um evento "fault.injected" (e o atributo
+# fault.types) no span corrente e é contada em app_faults_injected_total.
+
+import asyncio
+import itertools
+import json
+import math
+import os
+import random
+import threading
+from typing import Dict, Optional
+
+from pydantic import BaseModel, Field, field_validator
+from opentelemetry import trace
+
+import config
+from middleware import resolve_route
+from otel.metrics import limit_cardinality, meter
+from otel.tracing import tracer, propagator
+
+faults_counter = limit_cardinality(
+    meter.create_counter,
+    name="app_faults_injected_total",
+    description="Falhas injetadas por alvo (rota ou destino) e tipo",
+    unit="1",
+)
+
+# Gerador usado nas simulações; reproduzível com FAULT_SEED
+fault_random = random.Random(config.FAULT_SEED)
+
+FAULT_TYPES = ("error", "timeout", "reset", "slow_body")
+
+
+# =============================================================================
+# DISTRIBUIÇÕES DE LATÊNCIA
+# =============================================================================
+def _fixed(rng, ms):
+    return ms
+
+
+def _uniform(rng, low, high):
+    return rng.uniform(low, high)
+
+
+def _lognormal(rng, median, sigma):
+    return rng.lognormvariate(math.log(median), sigma)
+
+
+def _pareto(rng, scale, alpha):
+    return scale * rng.paretovariate(alpha)
+
+
+def _bimodal(rng, fast, slow, slow_pct):
+    median = slow if rng.random() * 100 < slow_pct else fast
+    return rng.lognormvariate(math.log(median), 0.1)
+
+
+_DISTRIBUTIONS = {
+    "fixed": (_fixed, 1),
+    "uniform": (_uniform, 2),
+    "lognormal": (_lognormal, 2),
+    "pareto": (_pareto, 2),
+    "bimodal": (_bimodal, 3),
+}
+
+
+def parse_latency(spec: str):
+    """Converte "lognormal:40:0.6" em (função, parâmetros)."""
+    name, *params = spec.split(":")
+    if name not in _DISTRIBUTIONS:
+        raise ValueError(f"distribuição desconhecida: {name} (use {', '.join(_DISTRIBUTIONS)})")
+    function, arity = _DISTRIBUTIONS[name]
+    if len(params) != arity:
+        raise ValueError(f"{name} espera {arity} parâmetro(s), recebeu {len(params)}")
+    values = tuple(float(param) for param in params)
+    if name in ("lognormal", "bimodal") and min(values[:2]) <= 0:
+        raise ValueError(f"{name}: as medianas devem ser maiores que zero")
+    return function, values
+
+
+# =============================================================================
+# REGRAS
+# =============================================================================
+class FaultRule(BaseModel):
+    latency: Optional[str] = None
+    latency_pct: float = Field(default=100, ge=0, le=100)
+    latency_max_ms: Optional[float] = Field(default=None, gt=0)
+    error_pct: float = Field(default=0, ge=0, le=100)
+    error_status: int = Field(default=500, ge=400, le=599)
+    timeout_pct: float = Field(default=0, ge=0, le=100)
+    timeout_ms: Optional[float] = Field(default=None, gt=0)
+    reset_pct: float = Field(default=0, ge=0, le=100)
+    slow_body_pct: float = Field(default=0, ge=0, le=100)
+    slow_body_ms: float = Field(default=1000, gt=0)
+
+    @field_validator("latency")
+    @classmethod
+    def _check_latency(cls, value):
+        if value is not None:
+            parse_latency(value)
+        return value
+
+
+class FaultPlan:
+    """Falhas sorteadas para uma requisição (ou chamada downstream)."""
+
+    __slots__ = ("target", "rule", "delay_ms", "fault")
+
+    def __init__(self, target: str, rule: FaultRule, delay_ms: float, fault: Optional[str]):
+        self.target = target
+        self.rule = rule
+        self.delay_ms = delay_ms
+        self.fault = fault
+
+    @property
+    def timeout_ms(self) -> float:
+        return self.rule.timeout_ms if self.rule.timeout_ms is not None else config.HTTP_TIMEOUT * 1000
+
+    def record(self, span) -> None:
+        """Marca as falhas no span e conta cada uma na métrica."""
+        types = [fault for fault in (("latency" if self.delay_ms else None), self.fault) if fault]
+        if not types:
+            return
+        span.set_attribute("fault.types", types)
+        for fault in types:
+            attributes = {"fault.type": fault, "fault.target": self.target}
+            if fault == "latency":
+                attributes["fault.delay_ms"] = self.delay_ms
+            elif fault == "timeout":
+                attributes["fault.timeout_ms"] = self.timeout_ms
+            elif fault == "error":
+                attributes["fault.status"] = self.rule.error_status
+            elif fault == "slow_body":
+                attributes["fault.slow_body_ms"] = self.rule.slow_body_ms
+            span.add_event("fault.injected", attributes)
+            faults_counter.add(1, {"app": config.APP_NAME, "target": self.target, "type": fault})
+
+
+class FaultInjector:
+    def __init__(self, rules: Dict[str, FaultRule], seed: Optional[str]):
+        self.rules = rules
+        self._seed = seed
+        self._latency = {target: parse_latency(rule.latency) for target, rule in rules.items() if rule.latency}
+        self._counters = {target: itertools.count() for target in rules}
+        self._lock = threading.Lock()
+
+    def reseed(self, seed: Optional[str]) -> None:
+        self._seed = seed
+        self._counters = {target: itertools.count() for target in self.rules}
+        self._lock = threading.Lock()
+
+    def _rng(self, target: str) -> random.Random:
+        if self._seed is None:
+            return fault_random
+        with self._lock:
+            sequence = next(self._counters[target])
+        return random.Random(f"{self._seed}:{target}:{sequence}")
+
+    def plan(self, target: str) -> Optional[FaultPlan]:
+        """Sorteia as falhas do alvo; None se não houver regra para ele."""
+        rule = self.rules.get(target)
+        if rule is None:
+            return None
+        rng = self._rng(target)
+
+        delay_ms = 0.0
+        if target in self._latency and rng.random() * 100 < rule.latency_pct:
+            function, params = self._latency[target]
+            delay_ms = function(rng, *params)
+            if rule.latency_max_ms is not None:
+                delay_ms = min(delay_ms, rule.latency_max_ms)
+
+        fault = None
+        draw = rng.random() * 100
+        for name in FAULT_TYPES:
+            draw -= getattr(rule, f"{name}_pct")
+            if draw < 0:
+                fault = name
+                break
+        return FaultPlan(target, rule, delay_ms, fault)
+
+
+def load_rules(spec: str) -> Dict[str, FaultRule]:
+    """Lê FAULT_RULES; um JSON inválido impede o startup com a mensagem do erro."""
+    if not spec.strip():
+        return {}
+    return {target: FaultRule(**rule) for target, rule in json.loads(spec).items()}
+
+
+injector = FaultInjector(load_rules(config.FAULT_RULES), config.FAULT_SEED)
+
+
+def reseed(worker=None) -> None:
+    """
+    Ressorteia fault_random e o injector para este processo. Com FAULT_SEED,
+    a semente passa a ser "<FAULT_SEED>:worker-<worker>"; sem ela, usa
+    entropia do sistema.
+    """
+    seed = None if config.FAULT_SEED is None else f"{config.FAULT_SEED}:worker-{worker}"
+    # seed() em vez de um novo Random: app.py e batch.py importam o objeto
+    fault_random.seed(seed)
+    injector.reseed(seed)
+
+
+# Sem isso, todos os filhos de um fork() herdariam o mesmo estado do gerador
+# e sorteariam as mesmas falhas em sincronia
+os.register_at_fork(after_in_child=lambda: reseed(f"pid-{os.getpid()}"))
+
+
+# =============================================================================
+# FALHAS POR ROTA (MIDDLEWARE)
+# =============================================================================
+class InjectedConnectionReset(ConnectionResetError):
+    """Queda de conexão simulada depois do início da resposta."""
+
+
+class FaultInjectionMiddleware:
+    """
+    Aplica as regras de rota de FAULT_RULES. Como a falha acontece antes do
+    handler, ela é registrada em um span próprio "fault-injection", filho do
+    traceparent recebido, que cobre também a espera injetada.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not injector.rules:
+            await self.app(scope, receive, send)
+            return
+
+        plan = injector.plan(resolve_route(scope["app"], scope))
+        if plan is None or (not plan.delay_ms and plan.fault is None):
+            await self.app(scope, receive, send)
+            return
+
+        headers = {key.decode("latin-1"): value.decode("latin-1") for key, value in scope["headers"]}
+        with tracer.start_as_current_span("fault-injection", context=propagator.extract(headers)) as span:
+            plan.record(span)
+            if plan.delay_ms:
+                await asyncio.sleep(plan.delay_ms / 1000)
+            if plan.fault == "timeout":
+                await asyncio.sleep(plan.timeout_ms / 1000)
+
+        if plan.fault in ("error", "timeout"):
+            await _send_status(send, plan.rule.error_status if plan.fault == "error" else 504)
+            return
+        if plan.fault == "reset":
+            await self.app(scope, receive, _reset_after_start(send))
+            return
+        if plan.fault == "slow_body":
+            await self.app(scope, receive, _slow_body(send, plan.rule.slow_body_ms / 1000))
+            return
+        await self.app(scope, receive, send)
+
+
+async def _send_status(send, status_code: int) -> None:
+    body = json.dumps({"error": f"Falha injetada em {config.APP_NAME}"}).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status_code,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+def _reset_after_start(send):
+    async def send_wrapper(message):
+        await send(message)
+        if message["type"] == "http.response.start":
+            raise InjectedConnectionReset("conexão encerrada por injeção de falha")
+    return send_wrapper
+
+
+_SLOW_BODY_CHUNKS = 10
+
+
+def _slow_body(send, duration: float):
+    async def send_wrapper(message):
+        body = message.get("body", b"")
+        if message["type"] != "http.response.body" or not body:
+            await send(message)
+            return
+        # Cada mensagem do corpo é entregue em pedaços ao longo de duration
+        size = max(1, math.ceil(len(body) / _SLOW_BODY_CHUNKS))
+        chunks = [body[start:start + size] for start in range(0, len(body), size)]
+        for index, chunk in enumerate(chunks):
+            await asyncio.sleep(duration / len(chunks))
+            last = index == len(chunks) - 1
+            await send({"type": "http.response.body", "body": chunk,
+                        "more_body": message.get("more_body", False) if last else True})
+    return send_wrapper
+
+
+# =============================================================================
+# FALHAS POR DESTINO (downstream.py)
+# =============================================================================
+async def before_call(url: str) -> Optional[FaultPlan]:
+    """
+    Aplica as falhas do destino antes da chamada downstream, marcando o span
+    corrente. Levanta as mesmas exceções do httpx para timeout e reset; com
+    plan.fault == "error" a chamada não deve ser feita (ver simulated_status).
+    """
+    plan = injector.plan(url)
+    if plan is None:
+        return None
+    plan.record(trace.get_current_span())
+    if plan.delay_ms:
+        await asyncio.sleep(plan.delay_ms / 1000)
+
+    if plan.fault in ("timeout", "reset"):
+        import httpx
+
+        if plan.fault == "timeout":
+            await asyncio.sleep(plan.timeout_ms / 1000)
+            raise httpx.ReadTimeout(f"timeout injetado ao chamar {url}")
+        raise httpx.RemoteProtocolError(f"conexão com {url} encerrada por injeção de falha")
+    return plan
+
+
+def simulated_status(plan: Optional[FaultPlan]) -> Optional[int]:
+    """Status HTTP simulado para o destino (a chamada não é feita), ou None."""
+    if plan is not None and plan.fault == "error":
+        return plan.rule.error_status
+    return None
+
+
+async def after_call(plan: Optional[FaultPlan]) -> None:
+    """Leitura lenta da resposta do destino (slow_body)."""
+    if plan is not None and plan.fault == "slow_body":
+        await asyncio.sleep(plan.rule.slow_body_ms / 1000)
@@ -0,0 +1,265 @@
+# =============================================================================
+# LAUNCHER DE PRODUÇÃO - PRE-FORK
+# =============================================================================
+# Sobe N workers uvicorn em um único socket compartilhado:
+#   - o processo master importa a aplicação uma vez (os workers herdam os
+#     módulos já carregados via fork(), sem repetir o import), abre o socket
+#     e faz fork() dos workers
+#   - N vem de WEB_CONCURRENCY ou, se 0, da cota de CPU do cgroup (cpu.max no
+#     cgroup v2, cpu.cfs_quota_us no v1), limitada às CPUs disponíveis
+#   - uvloop e httptools são obrigatórios: o launcher falha no import se não
+#     estiverem instalados, em vez de cair silenciosamente em asyncio/h11
+#
+# A telemetria é configurada no lifespan de cada worker, depois do fork():
+# cada um cria os próprios providers, exportadores e threads, com um
+# service.instance.id distinto (otel/resource.py). O master nunca configura
+# telemetria (fork_safe_check). Com mais de um worker, o modo multiprocess de
+# /metrics (METRICS_MULTIPROC_DIR) é ativado com um diretório temporário se
+# nenhum foi definido, e o mesmo vale para ADMIN_SETTINGS_FILE, que leva as
+# alterações de /admin/config a todos os workers (admin.py).
+#
+# SIGTERM/SIGINT no master são repassados aos workers, que param de aceitar
+# conexões, terminam as requisições em andamento e, no lifespan, exportam o
+# que está nas filas de traces, métricas e logs. Depois de GRACEFUL_TIMEOUT_S
+# os que restarem recebem SIGKILL. Um worker que morre fora do encerramento é
+# substituído.
+#
+# Uso (a partir de src/):
+#   python launcher.py
+#   python launcher.py --workers 4 --port 8000
+
+import argparse
+import glob
+import logging
+import math
+import os
+import shutil
+import signal
+import sys
+import tempfile
+import time
+from typing import Dict, Optional
+
+import httptools  # noqa: F401 - obrigatório (ver acima)
+import uvicorn
+import uvloop  # noqa: F401 - obrigatório (ver acima)
+
+import config
+from otel.telemetry import fork_safe_check, shutdown_telemetry
+
+log = logging.getLogger("launcher")
+
+# Intervalo mínimo entre substituições do mesmo worker, para não entrar em
+# laço de fork quando o worker falha logo no startup
+RESPAWN_BACKOFF_S = 1.0
+
+
+# =============================================================================
+# QUANTIDADE DE WORKERS
+# =============================================================================
+def _read(path: str) -> Optional[str]:
+    try:
+        with open(path) as file:
+            return file.read().strip()
+    except OSError:
+        return None
+
+
+def cgroup_cpu_quota() -> Optional[float]:
+    """Cota de CPU do container em CPUs (ex.: 1.5), ou None se não houver limite."""
+    # cgroup v2: "<quota> <período>" ou "max <período>"
+    cpu_max = _read("/sys/fs/cgroup/cpu.max")
+    if cpu_max is not None:
+        quota, _, period = cpu_max.partition(" ")
+        if quota != "max" and period:
+            return int(quota) / int(period)
+        return None
+
+    # cgroup v1: quota -1 significa sem limite
+    quota = _read("/sys/fs/cgroup/cpu/cpu.cfs_quota_us")
+    period = _read("/sys/fs/cgroup/cpu/cpu.cfs_period_us")
+    if quota is not None and period is not None and int(quota) > 0:
+        return int(quota) / int(period)
+    return None
+
+
+def worker_count() -> int:
+    if config.WEB_CONCURRENCY > 0:
+        return config.WEB_CONCURRENCY
+    cpus = len(os.sched_getaffinity(0))
+    quota = cgroup_cpu_quota()
+    if quota is not None:
+        # Arredonda para baixo: workers além da cota só geram throttling
+        cpus = min(cpus, math.floor(quota))
+    return max(1, cpus)
+
+
+def prepare_multiprocess_metrics(workers: int) -> Optional[str]:
+    """
+    Garante um diretório multiprocess vazio para /metrics com vários workers.
+    Retorna o diretório temporário criado, se foi o caso, para ser removido
+    no encerramento.
+    """
+    if workers <= 1:
+        return None
+    if not config.METRICS_MULTIPROC_DIR:
+        config.METRICS_MULTIPROC_DIR = tempfile.mkdtemp(prefix="metrics-multiproc-")
+        os.environ["METRICS_MULTIPROC_DIR"] = config.METRICS_MULTIPROC_DIR
+        return config.METRICS_MULTIPROC_DIR
+    # O launcher é o início do pod: snapshots de execuções anteriores saem
+    for path in glob.glob(os.path.join(config.METRICS_MULTIPROC_DIR, "worker-*.json")):
+        os.remove(path)
+    return None
+
+
+def prepare_shared_settings(workers: int) -> Optional[str]:
+    """
+    Garante um ADMIN_SETTINGS_FILE novo para /admin/config valer em todos os
+    workers. Retorna o diretório temporário criado, se foi o caso.
+    """
+    if workers <= 1:
+        return None
+    if not config.ADMIN_SETTINGS_FILE:
+        directory = tempfile.mkdtemp(prefix="admin-settings-")
+        config.ADMIN_SETTINGS_FILE = os.path.join(directory, "settings.json")
+        os.environ["ADMIN_SETTINGS_FILE"] = config.ADMIN_SETTINGS_FILE
+        return directory
+    # Alterações de runtime não sobrevivem a um reinício do pod
+    if os.path.exists(config.ADMIN_SETTINGS_FILE):
+        os.remove(config.ADMIN_SETTINGS_FILE)
+    return None
+
+
+# =============================================================================
+# WORKERS
+# =============================================================================
+def run_worker(index: int, app, sock, log_level: str) -> None:
+    """Executa um worker no processo filho; nunca retorna."""
+    exit_code = 1
+    try:
+        # Os handlers do master não valem aqui; o uvicorn instala os seus
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+
+        # Sorteios de falhas reproduzíveis por worker com FAULT_SEED (o
+        # módulo já foi importado pelo master junto com a aplicação)
+        import faults
+        faults.reseed(index)
+
+        server = uvicorn.Server(uvicorn.Config(
+            app,
+            loop="uvloop",
+            http="httptools",
+            lifespan="on",
+            log_level=log_level,
+            timeout_graceful_shutdown=config.GRACEFUL_TIMEOUT_S,
+        ))
+        log.info("Worker %d iniciado (pid %d)", index, os.getpid())
+        server.run(sockets=[sock])
+        exit_code = 0 if server.started else 3
+    except BaseException:
+        log.exception("Worker %d falhou", index)
+    finally:
+        # Normalmente já feito no lifespan; cobre falhas antes dele terminar
+        shutdown_telemetry()
+        logging.shutdown()
+        # Sai sem voltar para o código do master (laço de supervisão, atexit)
+        os._exit(exit_code)
+
+
+class Master:
+    def __init__(self, app, sock, workers: int, log_level: str):
+        self.app = app
+        self.sock = sock
+        self.workers = workers
+        self.log_level = log_level
+        self.children: Dict[int, int] = {}  # pid -> índice do worker
+        self.started_at: Dict[int, float] = {}  # índice -> último fork
+        self.stopping = False
+        self.stop_deadline = None
+
+    def spawn(self, index: int) -> None:
+        self.started_at[index] = time.monotonic()
+        pid = os.fork()
+        if pid == 0:
+            run_worker(index, self.app, self.sock, self.log_level)
+        self.children[pid] = index
+
+    def stop(self, signum, frame) -> None:
+        if self.stopping:
+            return
+        log.info("Sinal %s recebido, encerrando %d workers", signal.Signals(signum).name, len(self.children))
+        self.stopping = True
+        self.stop_deadline = time.monotonic() + config.GRACEFUL_TIMEOUT_S + 5
+        for pid in self.children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def run(self) -> int:
+        # Antes de qualquer fork: providers criados aqui não sobreviveriam
+        fork_safe_check()
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        for index in range(self.workers):
+            self.spawn(index)
+
+        while self.children:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+            if pid == 0:
+                if self.stopping and time.monotonic() > self.stop_deadline:
+                    log.warning("Tempo de encerramento esgotado, finalizando %d workers", len(self.children))
+                    for child in self.children:
+                        os.kill(child, signal.SIGKILL)
+                    self.stop_deadline = float("inf")
+                time.sleep(0.1)
+                continue
+
+            index = self.children.pop(pid, None)
+            if index is None or self.stopping:
+                continue
+            log.warning("Worker %d (pid %d) terminou com status %d, substituindo",
+                        index, pid, os.waitstatus_to_exitcode(status))
+            elapsed = time.monotonic() - self.started_at[index]
+            if elapsed < RESPAWN_BACKOFF_S:
+                time.sleep(RESPAWN_BACKOFF_S - elapsed)
+            self.spawn(index)
+
+        log.info("Todos os workers encerrados")
+        return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Launcher pre-fork da aplicação (uvloop + httptools)")
+    parser.add_argument("--host", default=config.APP_HOST)
+    parser.add_argument("--port", type=int, default=config.APP_PORT)
+    parser.add_argument("--workers", type=int, default=0, help="0 usa WEB_CONCURRENCY ou a cota de CPU")
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(name)s - %(process)d - %(levelname)s - %(message)s",
+    )
+
+    workers = args.workers or worker_count()
+    temp_dirs = [prepare_multiprocess_metrics(workers), prepare_shared_settings(workers)]
+
+    # Import único no master; os workers herdam os módulos carregados
+    from app import app
+
+    sock = uvicorn.Config(app, host=args.host, port=args.port).bind_socket()
+    log.info("Escutando em %s:%d com %d workers (cota de CPU: %s)",
+             args.host, args.port, workers, cgroup_cpu_quota() or "sem limite")
+    try:
+        return Master(app, sock, workers, args.log_level).run()
+    finally:
+        sock.close()
+        for temp_dir in filter(None, temp_dirs):
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
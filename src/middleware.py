@@ -0,0 +1,189 @@
+# =============================================================================
+# MIDDLEWARES ASGI
+# =============================================================================
+# Middlewares puros (ASGI), aplicados a todas as rotas sem depender do código
+# de cada handler.
+
+import asyncio
+import time
+from typing import Dict, Optional
+
+from starlette.routing import Match
+from starlette.responses import Response
+
+import config
+from otel.metrics import active_requests_counter, response_time_histogram, shed_requests_counter
+
+UNMATCHED_ROUTE = "unmatched"
+ROUTE_SCOPE_KEY = "app.route_template"
+# Instante de chegada da requisição (perf_counter_ns), gravado pelo
+# TimingMiddleware; início da fase "queue" (otel/phases.py)
+RECEIVED_SCOPE_KEY = "app.received_ns"
+
+
+def resolve_route(app, scope) -> str:
+    """
+    Retorna o template da rota (ex.: "/process") que atenderá a requisição.
+    Usar o template, e não o path bruto, mantém a cardinalidade dos labels
+    limitada. O resultado fica no scope para os demais middlewares.
+    """
+    route_template = scope.get(ROUTE_SCOPE_KEY)
+    if route_template is not None:
+        return route_template
+
+    route_template = UNMATCHED_ROUTE
+    for route in app.router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            route_template = getattr(route, "path", UNMATCHED_ROUTE)
+            break
+    scope[ROUTE_SCOPE_KEY] = route_template
+    return route_template
+
+
+# =============================================================================
+# TEMPO DE RESPOSTA
+# =============================================================================
+class TimingMiddleware:
+    """
+    Mede o tempo de resposta de todas as rotas com relógio monotônico
+    (perf_counter_ns), inclusive retornos antecipados, erros e requisições
+    rejeitadas pelo controle de admissão. Registra em app_response_time_seconds
+    com a rota (template) e a classe do status (2xx, 4xx, 5xx...).
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter_ns()
+        scope[RECEIVED_SCOPE_KEY] = start
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = (time.perf_counter_ns() - start) / 1e9
+            response_time_histogram.record(elapsed, {
+                "app": config.APP_NAME,
+                "route": resolve_route(scope["app"], scope),
+                "status_class": f"{status_code // 100}xx",
+            })
+
+
+# =============================================================================
+# CONTROLE DE ADMISSÃO
+# =============================================================================
+class RouteLimiter:
+    """
+    Limita requisições simultâneas de uma rota. Acima do limite, até
+    max_queue requisições esperam por uma vaga por no máximo queue_timeout;
+    as demais são rejeitadas imediatamente.
+    """
+
+    def __init__(self, max_concurrent: int, max_queue: int, queue_timeout_ms: float):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self._queue_timeout = queue_timeout_ms / 1000
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self.waiting = 0
+
+    async def acquire(self) -> Optional[str]:
+        """Retorna None se admitida, ou o motivo da rejeição."""
+        if not self._semaphore.locked():
+            await self._semaphore.acquire()
+            return None
+
+        if self.waiting >= self.max_queue:
+            return "queue_full"
+
+        self.waiting += 1
+        try:
+            # asyncio.timeout cancela a própria espera: se a vaga for obtida
+            # junto com o timeout, Semaphore.acquire a devolve ao ser
+            # cancelado. Com wait_for (3.11) a vaga podia ficar presa e
+            # reduzir o limite da rota para sempre
+            async with asyncio.timeout(self._queue_timeout):
+                await self._semaphore.acquire()
+            return None
+        except TimeoutError:
+            return "queue_timeout"
+        finally:
+            self.waiting -= 1
+
+    def release(self) -> None:
+        self._semaphore.release()
+
+
+def parse_admission_limits(spec: str, default_queue: int, queue_timeout_ms: float) -> Dict[str, RouteLimiter]:
+    """
+    Converte "/process=64:128,/=200" em limitadores por rota. O tamanho da
+    fila (depois de ":") é opcional e usa default_queue quando omitido.
+    """
+    limiters = {}
+    for entry in filter(None, (part.strip() for part in spec.split(","))):
+        route, _, limits = entry.partition("=")
+        concurrent, _, queue = limits.partition(":")
+        limiters[route.strip()] = RouteLimiter(
+            max_concurrent=int(concurrent),
+            max_queue=int(queue) if queue else default_queue,
+            queue_timeout_ms=queue_timeout_ms,
+        )
+    return limiters
+
+
+class InFlightMiddleware:
+    """
+    Conta as requisições em andamento por rota (UpDownCounter: +1 na entrada,
+    -1 na saída, inclusive em erros) e aplica os limites de ADMISSION_LIMITS.
+    Requisições rejeitadas recebem ADMISSION_SHED_STATUS com Retry-After,
+    sem chegar ao threadpool nem aos serviços downstream.
+    """
+
+    def __init__(self, app, limiters: Optional[Dict[str, RouteLimiter]] = None):
+        self.app = app
+        if limiters is None:
+            limiters = parse_admission_limits(
+                config.ADMISSION_LIMITS,
+                default_queue=config.ADMISSION_QUEUE_SIZE,
+                queue_timeout_ms=config.ADMISSION_QUEUE_TIMEOUT_MS,
+            )
+        self.limiters = limiters
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        route = resolve_route(scope["app"], scope)
+        attributes = {"app": config.APP_NAME, "route": route}
+
+        limiter = self.limiters.get(route)
+        if limiter is not None:
+            reason = await limiter.acquire()
+            if reason is not None:
+                shed_requests_counter.add(1, {**attributes, "reason": reason})
+                response = Response(
+                    status_code=config.ADMISSION_SHED_STATUS,
+                    headers={"Retry-After": str(config.ADMISSION_RETRY_AFTER_S)},
+                )
+                await response(scope, receive, send)
+                return
+
+        active_requests_counter.add(1, attributes)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            active_requests_counter.add(-1, attributes)
+            if limiter is not None:
+                limiter.release()
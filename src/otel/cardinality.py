@@ -0,0 +1,65 @@
+# =============================================================================
+# LIMITE DE CARDINALIDADE POR INSTRUMENTO
+# =============================================================================
+# Cada combinação distinta de atributos (labels) vira uma série temporal nova
+# no SDK, no collector e no Prometheus. Um label com valores ilimitados (ex.:
+# uma URL com IDs) faz a memória crescer sem controle.
+#
+# CardinalityGuard envolve um instrumento síncrono (Counter, UpDownCounter,
+# Histogram, Gauge) e aceita no máximo `limit` combinações de atributos.
+# Medições com combinações novas além do limite vão para uma série única de
+# overflow ({"otel.metric.overflow": true}) e incrementam o contador
+# app_metric_cardinality_overflow_total.
+
+import threading
+from typing import Iterable, Optional
+
+OVERFLOW_ATTRIBUTES = {"otel.metric.overflow": True}
+
+
+class CardinalityGuard:
+    """Proxy de um instrumento síncrono com limite de séries por instrumento."""
+
+    def __init__(self, instrument, name: str, limit: int, overflow_counter=None, attribute_keys: Optional[Iterable[str]] = None):
+        self._instrument = instrument
+        self._name = name
+        self._limit = limit
+        self._overflow_counter = overflow_counter
+        # Mesmas chaves da View do instrumento, para contar séries como o SDK conta
+        self._attribute_keys = frozenset(attribute_keys) if attribute_keys else None
+        self._seen = set()
+        self._lock = threading.Lock()
+
+    @property
+    def name(self):
+        return self._name
+
+    def _guard(self, attributes):
+        if not attributes:
+            return attributes
+
+        if self._attribute_keys is None:
+            key = frozenset(attributes.items())
+        else:
+            key = frozenset(item for item in attributes.items() if item[0] in self._attribute_keys)
+
+        if key in self._seen:
+            return attributes
+
+        with self._lock:
+            if key in self._seen or len(self._seen) < self._limit:
+                self._seen.add(key)
+                return attributes
+
+        if self._overflow_counter is not None:
+            self._overflow_counter.add(1, {"instrument": self._name})
+        return OVERFLOW_ATTRIBUTES
+
+    def add(self, amount, attributes=None, context=None):
+        self._instrument.add(amount, self._guard(attributes), context=context)
+
+    def record(self, amount, attributes=None, context=None):
+        self._instrument.record(amount, self._guard(attributes), context=context)
+
+    def set(self, amount, attributes=None, context=None):
+        self._instrument.set(amount, self._guard(attributes), context=context)
@@ -0,0 +1,178 @@
+# =============================================================================
+# FÁBRICA DE EXPORTADORES OTLP
+# =============================================================================
+# Um único ponto para criar os exportadores de traces, métricas e logs, com o
+# transporte escolhido por OTLP_PROTOCOL:
+#   "http/protobuf" (padrão) -> OTLP_ENDPOINT + /v1/<sinal> (collector :4318)
+#   "grpc"                   -> OTLP_ENDPOINT sem caminho (collector :4317)
+#
+# Os dois transportes mantêm a conexão aberta entre exportações: o HTTP usa
+# uma requests.Session (keep-alive) por exportador e o gRPC um canal HTTP/2
+# persistente. OTLP_COMPRESSION ("gzip" por padrão, ou "none") comprime os
+# lotes e OTLP_TIMEOUT_S limita cada exportação.
+#
+# Os módulos gRPC só são importados quando OTLP_PROTOCOL=grpc.
+#
+# create_sender() cria um envio "cru": recebe a requisição OTLP já
+# serializada (protobuf) e a envia no mesmo transporte. É usado pela fila
+# persistente (otel/persistent_queue.py), que guarda os lotes em disco já
+# serializados e os reenvia depois.
+
+import gzip
+import importlib
+from urllib.parse import urlparse
+
+import config
+
+PROTOCOL_HTTP = "http/protobuf"
+PROTOCOL_GRPC = "grpc"
+
+# Sinal -> (módulo HTTP, módulo gRPC, classe, caminho HTTP)
+_EXPORTERS = {
+    "traces": (
+        "opentelemetry.exporter.otlp.proto.http.trace_exporter",
+        "opentelemetry.exporter.otlp.proto.grpc.trace_exporter",
+        "OTLPSpanExporter",
+        "/v1/traces",
+    ),
+    "metrics": (
+        "opentelemetry.exporter.otlp.proto.http.metric_exporter",
+        "opentelemetry.exporter.otlp.proto.grpc.metric_exporter",
+        "OTLPMetricExporter",
+        "/v1/metrics",
+    ),
+    "logs": (
+        "opentelemetry.exporter.otlp.proto.http._log_exporter",
+        "opentelemetry.exporter.otlp.proto.grpc._log_exporter",
+        "OTLPLogExporter",
+        "/v1/logs",
+    ),
+}
+
+
+# Sinal -> método gRPC do serviço OTLP
+_GRPC_METHODS = {
+    "traces": "/opentelemetry.proto.collector.trace.v1.TraceService/Export",
+    "metrics": "/opentelemetry.proto.collector.metrics.v1.MetricsService/Export",
+    "logs": "/opentelemetry.proto.collector.logs.v1.LogsService/Export",
+}
+
+# Resultados de um envio cru
+SEND_OK = "ok"
+SEND_RETRY = "retry"        # Falha temporária: tentar de novo mais tarde
+SEND_REJECTED = "rejected"  # Recusado pelo collector: não adianta repetir
+
+_HTTP_RETRYABLE_STATUS = {408, 429, 502, 503, 504}
+
+
+def _compression(protocol: str):
+    if config.OTLP_COMPRESSION != "gzip":
+        return None
+    if protocol == PROTOCOL_GRPC:
+        import grpc
+        return grpc.Compression.Gzip
+    from opentelemetry.exporter.otlp.proto.http import Compression
+    return Compression.Gzip
+
+
+def create_exporter(signal: str, **kwargs):
+    """
+    Cria o exportador OTLP do sinal ("traces", "metrics" ou "logs") no
+    transporte configurado. kwargs são repassados ao exportador (ex.:
+    preferred_temporality nas métricas).
+    """
+    http_module, grpc_module, class_name, http_path = _EXPORTERS[signal]
+    protocol = config.OTLP_PROTOCOL
+
+    if protocol == PROTOCOL_GRPC:
+        module, endpoint = grpc_module, config.OTLP_ENDPOINT
+    elif protocol == PROTOCOL_HTTP:
+        module, endpoint = http_module, f"{config.OTLP_ENDPOINT}{http_path}"
+    else:
+        raise ValueError(f"OTLP_PROTOCOL inválido: {protocol!r} (use {PROTOCOL_HTTP!r} ou {PROTOCOL_GRPC!r})")
+
+    exporter_class = getattr(importlib.import_module(module), class_name)
+    return exporter_class(
+        endpoint=endpoint,
+        timeout=config.OTLP_TIMEOUT_S,
+        compression=_compression(protocol),
+        **kwargs,
+    )
+
+
+class HttpSender:
+    """Envia requisições OTLP serializadas via HTTP/protobuf."""
+
+    def __init__(self, endpoint: str, timeout: float, compress: bool):
+        import requests
+
+        self._requests = requests
+        self._endpoint = endpoint
+        self._timeout = timeout
+        self._compress = compress
+        self._session = requests.Session()
+        self._headers = {"Content-Type": "application/x-protobuf"}
+        if compress:
+            self._headers["Content-Encoding"] = "gzip"
+
+    def send(self, payload: bytes) -> str:
+        data = gzip.compress(payload) if self._compress else payload
+        try:
+            response = self._session.post(self._endpoint, data=data, headers=self._headers, timeout=self._timeout)
+        except self._requests.RequestException:
+            return SEND_RETRY
+        if response.ok:
+            return SEND_OK
+        if response.status_code in _HTTP_RETRYABLE_STATUS:
+            return SEND_RETRY
+        return SEND_REJECTED
+
+    def close(self) -> None:
+        self._session.close()
+
+
+class GrpcSender:
+    """Envia requisições OTLP serializadas via gRPC, sem desserializar."""
+
+    def __init__(self, endpoint: str, method: str, timeout: float, compress: bool):
+        import grpc
+
+        self._grpc = grpc
+        parsed = urlparse(endpoint)
+        target = parsed.netloc or endpoint
+        compression = grpc.Compression.Gzip if compress else None
+        if parsed.scheme == "https":
+            self._channel = grpc.secure_channel(target, grpc.ssl_channel_credentials(), compression=compression)
+        else:
+            self._channel = grpc.insecure_channel(target, compression=compression)
+        # Sem (de)serializadores: a chamada recebe e devolve bytes
+        self._call = self._channel.unary_unary(method)
+        self._timeout = timeout
+        self._retryable = {
+            grpc.StatusCode.UNAVAILABLE,
+            grpc.StatusCode.DEADLINE_EXCEEDED,
+            grpc.StatusCode.RESOURCE_EXHAUSTED,
+            grpc.StatusCode.ABORTED,
+            grpc.StatusCode.CANCELLED,
+        }
+
+    def send(self, payload: bytes) -> str:
+        try:
+            self._call(payload, timeout=self._timeout)
+        except self._grpc.RpcError as error:
+            return SEND_RETRY if error.code() in self._retryable else SEND_REJECTED
+        return SEND_OK
+
+    def close(self) -> None:
+        self._channel.close()
+
+
+def create_sender(signal: str):
+    """Cria o envio cru do sinal no transporte configurado (OTLP_PROTOCOL)."""
+    compress = config.OTLP_COMPRESSION == "gzip"
+    if config.OTLP_PROTOCOL == PROTOCOL_GRPC:
+        return GrpcSender(config.OTLP_ENDPOINT, _GRPC_METHODS[signal], config.OTLP_TIMEOUT_S, compress)
+    if config.OTLP_PROTOCOL == PROTOCOL_HTTP:
+        http_path = _EXPORTERS[signal][3]
+        return HttpSender(f"{config.OTLP_ENDPOINT}{http_path}", config.OTLP_TIMEOUT_S, compress)
+    raise ValueError(f"OTLP_PROTOCOL inválido: {config.OTLP_PROTOCOL!r} (use {PROTOCOL_HTTP!r} ou {PROTOCOL_GRPC!r})")
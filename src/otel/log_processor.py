@@ -0,0 +1,184 @@
+# =============================================================================
+# PROCESSADOR DE LOGS EM LOTE (NÃO BLOQUEANTE)
+# =============================================================================
+# Substitui o SimpleLogRecordProcessor, que exporta cada registro de forma
+# síncrona na thread da requisição. Aqui o emit() apenas enfileira o registro
+# em uma fila limitada; uma thread de background agrupa os registros e chama o
+# exportador quando o lote atinge o tamanho máximo ou quando o intervalo de
+# flush expira.
+
+import asyncio
+import collections
+import logging
+import threading
+import time
+from typing import Callable, Optional
+
+from opentelemetry.context import (
+    _SUPPRESS_INSTRUMENTATION_KEY,
+    attach,
+    detach,
+    set_value,
+)
+from opentelemetry.sdk._logs import LogData, LogRecordProcessor
+from opentelemetry.sdk._logs.export import LogExporter
+
+_logger = logging.getLogger(__name__)
+
+# Políticas quando a fila está cheia
+POLICY_DROP = "drop"    # Descarta o registro novo imediatamente
+POLICY_BLOCK = "block"  # Espera até block_timeout_millis por espaço e depois descarta;
+                        # na thread de um event loop descarta sem esperar, para
+                        # não parar todas as requisições do loop
+
+
+class BoundedBatchLogRecordProcessor(LogRecordProcessor):
+    """
+    Processador de logs com fila limitada, flush por tamanho e por tempo,
+    política configurável de fila cheia e contagem de registros descartados.
+    """
+
+    def __init__(
+        self,
+        exporter: LogExporter,
+        max_queue_size: int = 2048,
+        max_export_batch_size: int = 512,
+        schedule_delay_millis: float = 1000,
+        full_policy: str = POLICY_DROP,
+        block_timeout_millis: float = 50,
+        on_drop: Optional[Callable[[int], None]] = None,
+    ):
+        if max_export_batch_size > max_queue_size:
+            raise ValueError("max_export_batch_size não pode ser maior que max_queue_size")
+        if full_policy not in (POLICY_DROP, POLICY_BLOCK):
+            raise ValueError(f"Política de fila inválida: {full_policy}")
+
+        self._exporter = exporter
+        self._max_queue_size = max_queue_size
+        self._max_export_batch_size = max_export_batch_size
+        self._schedule_delay = schedule_delay_millis / 1000
+        self._full_policy = full_policy
+        self._block_timeout = block_timeout_millis / 1000
+        self._on_drop = on_drop
+
+        self._queue = collections.deque()
+        self._condition = threading.Condition(threading.Lock())
+        self._export_lock = threading.Lock()
+        self._shutdown = False
+        self.dropped = 0
+
+        self._worker = threading.Thread(
+            name="OtelBoundedBatchLogRecordProcessor", target=self._run, daemon=True
+        )
+        self._worker.start()
+
+    # -------------------------------------------------------------------------
+    # Caminho da requisição: só enfileira
+    # -------------------------------------------------------------------------
+    def emit(self, log_data: LogData) -> None:
+        if self._shutdown:
+            return
+        with self._condition:
+            if (
+                len(self._queue) >= self._max_queue_size
+                and self._full_policy == POLICY_BLOCK
+                and not _on_event_loop()
+            ):
+                deadline = time.monotonic() + self._block_timeout
+                while len(self._queue) >= self._max_queue_size and not self._shutdown:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+
+            if len(self._queue) >= self._max_queue_size:
+                self._drop(1)
+                return
+
+            self._queue.append(log_data)
+            if len(self._queue) >= self._max_export_batch_size:
+                self._condition.notify_all()
+
+    def _drop(self, count: int) -> None:
+        self.dropped += count
+        if self._on_drop is not None:
+            self._on_drop(count)
+
+    # -------------------------------------------------------------------------
+    # Thread de background: agrupa e exporta
+    # -------------------------------------------------------------------------
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                if not self._shutdown and len(self._queue) < self._max_export_batch_size:
+                    self._condition.wait(self._schedule_delay)
+                if self._shutdown:
+                    break
+            self._export_batches(drain=False)
+        # Exporta o que sobrou antes de encerrar
+        self._export_batches(drain=True)
+
+    def _export_batches(self, drain: bool, deadline: Optional[float] = None) -> bool:
+        """
+        Exporta um lote (ou, com drain=True, todos os lotes) da fila.
+        O lock de exportação garante que force_flush e a thread de background
+        não chamem o exportador ao mesmo tempo. Com deadline (time.monotonic),
+        para de esperar pelo lock e de iniciar lotes quando ele passa; retorna
+        False se a fila não foi esvaziada a tempo.
+        """
+        timeout = -1 if deadline is None else max(0.0, deadline - time.monotonic())
+        if not self._export_lock.acquire(timeout=timeout):
+            return False
+        try:
+            while True:
+                with self._condition:
+                    if not self._queue:
+                        return True
+                    if deadline is not None and time.monotonic() >= deadline:
+                        return False
+                    batch = [
+                        self._queue.popleft()
+                        for _ in range(min(len(self._queue), self._max_export_batch_size))
+                    ]
+                    # Acorda quem está bloqueado esperando espaço na fila
+                    self._condition.notify_all()
+
+                # Evita que o próprio exportador gere telemetria recursiva
+                token = attach(set_value(_SUPPRESS_INSTRUMENTATION_KEY, True))
+                try:
+                    self._exporter.export(batch)
+                except Exception:  # pylint: disable=broad-exception-caught
+                    _logger.exception("Falha ao exportar lote de logs")
+                finally:
+                    detach(token)
+
+                if not drain:
+                    return True
+        finally:
+            self._export_lock.release()
+
+    # -------------------------------------------------------------------------
+    # Ciclo de vida
+    # -------------------------------------------------------------------------
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        if self._shutdown:
+            return True
+        return self._export_batches(drain=True, deadline=time.monotonic() + timeout_millis / 1000)
+
+    def shutdown(self) -> None:
+        if self._shutdown:
+            return
+        with self._condition:
+            self._shutdown = True
+            self._condition.notify_all()
+        self._worker.join()
+        self._exporter.shutdown()
+
+
+def _on_event_loop() -> bool:
+    """True se a thread atual está executando um event loop do asyncio."""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
@@ -1,67 +1,247 @@
 # Importação das bibliotecas necessárias
+# Só a API é importada aqui: o LoggerProvider, os processadores e os
+# exportadores são criados em setup_logs(), chamado no startup da aplicação
+# (otel/telemetry.py). Até lá o logger da aplicação descarta os registros.
+import hashlib
 import logging
+import time
 import config
-from opentelemetry.sdk._logs import LoggerProvider, LoggingHandler
-from opentelemetry.sdk._logs.export import ConsoleLogExporter, SimpleLogRecordProcessor
-from opentelemetry.sdk.resources import Resource
-from opentelemetry.semconv.attributes.service_attributes import (
-    SERVICE_NAME,
-    SERVICE_VERSION
-)
-from opentelemetry._logs import set_logger_provider
-from opentelemetry.exporter.otlp.proto.http._log_exporter import OTLPLogExporter
+from otel import phases
+from opentelemetry import metrics
+from opentelemetry.trace import get_current_span
 
 # Define o nome da aplicação usando variável de ambiente ou valor padrão
 
 
-# Cria um recurso OpenTelemetry com informações do serviço
-# Isso ajuda a identificar a origem dos logs
-resource = Resource.create({
-    SERVICE_NAME: config.APP_NAME,  # Nome do serviço
-    SERVICE_VERSION: "1.0.0"  # Versão do serviço
-})
-
-# Inicializa o provedor de logs do OpenTelemetry
-# Este é o componente principal que gerencia os logs
-logger_provider = LoggerProvider(resource=resource)
-
-# Configura o exportador de logs para console
-# Isso permite que os logs sejam exibidos no terminal
-console_exporter = ConsoleLogExporter()
-logger_provider.add_log_record_processor(
-    SimpleLogRecordProcessor(console_exporter)
+# Contador de registros descartados quando a fila de exportação está cheia
+# Usa o meter global, que passa a exportar assim que o MeterProvider é definido
+dropped_log_records_counter = metrics.get_meter(config.APP_NAME).create_counter(
+    name="app_log_records_dropped_total",
+    description="Registros de log descartados por fila de exportação cheia",
+    unit="1",
 )
 
-# Configura o exportador de logs para OTLP
-otlp_exporter = OTLPLogExporter(
-    endpoint=f"{config.OTLP_ENDPOINT}/v1/logs" 
-)
-logger_provider.add_log_record_processor(
-    SimpleLogRecordProcessor(otlp_exporter)
-)
 
-# Define o provedor de logs como global
-# Isso permite que outros componentes da aplicação usem o mesmo provedor
-set_logger_provider(logger_provider)
+def batch_processor(exporter, name):
+    """
+    Cria o processador em lote para um exportador. O emit() apenas enfileira;
+    a exportação acontece em uma thread de background, fora da requisição.
+    """
+    from otel.log_processor import BoundedBatchLogRecordProcessor
 
-# Cria um handler OpenTelemetry para processar os logs
-# Este handler integra o logging padrão do Python com OpenTelemetry
-otel_handler = LoggingHandler(logger_provider=logger_provider)
-otel_handler.setLevel(logging.INFO)
+    return BoundedBatchLogRecordProcessor(
+        exporter,
+        max_queue_size=config.LOG_EXPORT_MAX_QUEUE_SIZE,
+        max_export_batch_size=config.LOG_EXPORT_MAX_BATCH_SIZE,
+        schedule_delay_millis=config.LOG_EXPORT_SCHEDULE_DELAY_MS,
+        full_policy=config.LOG_EXPORT_FULL_POLICY,
+        block_timeout_millis=config.LOG_EXPORT_BLOCK_TIMEOUT_MS,
+        on_drop=lambda count: dropped_log_records_counter.add(count, {"exporter": name}),
+    )
 
-# Configura o logging básico do Python para console
-# Define o formato e nível dos logs
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(process)d - %(levelname)s - %(message)s",
-)
 
 # Cria um logger específico para a aplicação
 # Este logger será usado para registrar eventos da aplicação
+# Até setup_logs() (e sempre, sem logs habilitados) o NullHandler evita que o
+# logging use o handler de último recurso (stderr)
 logger = logging.getLogger(config.APP_NAME)
-logger.addHandler(otel_handler)
-logger.setLevel(logging.INFO)
+logger.addHandler(logging.NullHandler())
+logger.setLevel(config.LOG_LEVEL)
 
 # Desativa a propagação dos logs para o root logger
 # Isso evita logs duplicados
-logger.propagate = False
\ No newline at end of file
+logger.propagate = False
+
+# Provider e handler criados por setup_logs()
+logger_provider = None
+otel_handler = None
+
+
+def setup_logs():
+    """
+    Cria o LoggerProvider com seus processadores, define-o como global e liga
+    o handler OpenTelemetry ao logger da aplicação.
+    """
+    global logger_provider, otel_handler
+
+    from opentelemetry.sdk._logs import LoggerProvider, LoggingHandler
+    from otel.resource import service_resource
+    from opentelemetry._logs import set_logger_provider
+
+    # Cria um recurso OpenTelemetry com informações do serviço
+    # Isso ajuda a identificar a origem dos logs
+    resource = service_resource()
+
+    # Inicializa o provedor de logs do OpenTelemetry
+    # Este é o componente principal que gerencia os logs
+    # O encerramento é feito por shutdown_telemetry() (otel/telemetry.py)
+    logger_provider = LoggerProvider(resource=resource, shutdown_on_exit=False)
+
+    # Configura o exportador de logs para console (desligado por padrão)
+    # Isso permite que os logs sejam exibidos no terminal durante o desenvolvimento
+    if config.TELEMETRY_LOGS_ENABLED and config.LOG_CONSOLE_EXPORTER:
+        from opentelemetry.sdk._logs.export import ConsoleLogExporter
+
+        logger_provider.add_log_record_processor(
+            batch_processor(ConsoleLogExporter(), "console")
+        )
+
+    # Configura o exportador de logs para OTLP
+    # Com TELEMETRY_LOGS_ENABLED=false nenhum processador é registrado
+    # Com EXPORT_QUEUE_DIR, os lotes passam pela fila persistente em disco
+    if config.TELEMETRY_LOGS_ENABLED:
+        if config.EXPORT_QUEUE_DIR:
+            from otel.persistent_queue import create_persistent_exporter
+
+            otlp_exporter = create_persistent_exporter("logs")
+        else:
+            from otel.exporters import create_exporter
+
+            otlp_exporter = create_exporter("logs")
+        logger_provider.add_log_record_processor(
+            batch_processor(otlp_exporter, "otlp")
+        )
+
+    # Define o provedor de logs como global
+    # Isso permite que outros componentes da aplicação usem o mesmo provedor
+    set_logger_provider(logger_provider)
+
+    # Cria um handler OpenTelemetry para processar os logs
+    # Este handler integra o logging padrão do Python com OpenTelemetry
+    otel_handler = LoggingHandler(logger_provider=logger_provider)
+    otel_handler.setLevel(logger.level)
+
+    # Configura o logging básico do Python para console
+    # Define o formato e nível dos logs
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(name)s - %(process)d - %(levelname)s - %(message)s",
+    )
+
+    if config.TELEMETRY_LOGS_ENABLED:
+        for handler in list(logger.handlers):
+            logger.removeHandler(handler)
+        logger.addHandler(otel_handler)
+    return logger_provider
+
+
+def set_log_level(level: str) -> None:
+    """
+    Altera o nível do logger da aplicação e do handler OpenTelemetry em
+    runtime (ver admin.py). Os dois precisam mudar juntos: com o handler em
+    INFO, baixar só o logger para DEBUG não exportaria nada a mais.
+    """
+    logger.setLevel(level)
+    if otel_handler is not None:
+        otel_handler.setLevel(level)
+
+
+# =============================================================================
+# LOG ESTRUTURADO POR REQUISIÇÃO
+# =============================================================================
+# RequestLogger associa o contexto da requisição (serviço, operação, trace_id,
+# span_id) uma única vez. Os campos extras de cada chamada só são avaliados
+# depois da checagem de nível: um logger.debug descartado não monta dicionário,
+# não copia payload e não chama funções passadas como valor.
+#
+# Regras para os campos extras:
+#   - Valores chamáveis (ex.: lambda) são avaliados somente se o log for emitido
+#   - Listas e tuplas em campos cujo nome contém "payload" são resumidas
+#     conforme LOG_PAYLOAD_MODE:
+#       "size" -> <campo>_count (padrão, O(1))
+#       "hash" -> além da contagem, <campo>_chars e <campo>_hash (blake2b de 8 bytes)
+#       "full" -> registra uma cópia completa, como antes
+
+
+def summarize_payload(name, payload, mode=None):
+    """Resumo de um payload para log, sem copiar seus elementos."""
+    mode = mode or config.LOG_PAYLOAD_MODE
+    if mode == "full":
+        return {name: list(payload)}
+
+    if mode != "hash":
+        return {f"{name}_count": len(payload)}
+
+    digest = hashlib.blake2b(digest_size=8)
+    chars = 0
+    for item in payload:
+        item = str(item)
+        chars += len(item)
+        digest.update(item.encode())
+        digest.update(b"\0")
+    return {
+        f"{name}_count": len(payload),
+        f"{name}_chars": chars,
+        f"{name}_hash": digest.hexdigest(),
+    }
+
+
+class RequestLogger:
+    """
+    Logger com contexto fixo de requisição. Use request_logger() para criar
+    um a partir do span atual.
+    """
+
+    __slots__ = ("_logger", "_context")
+
+    def __init__(self, base_logger, context):
+        self._logger = base_logger
+        self._context = context
+
+    @property
+    def context(self):
+        return self._context
+
+    def bind(self, **fields):
+        """Retorna um novo RequestLogger com campos adicionais no contexto."""
+        return RequestLogger(self._logger, {**self._context, **fields})
+
+    def isEnabledFor(self, level):
+        return self._logger.isEnabledFor(level)
+
+    def debug(self, msg, **fields):
+        self._log(logging.DEBUG, msg, fields)
+
+    def info(self, msg, **fields):
+        self._log(logging.INFO, msg, fields)
+
+    def warning(self, msg, **fields):
+        self._log(logging.WARNING, msg, fields)
+
+    def error(self, msg, exc_info=None, **fields):
+        self._log(logging.ERROR, msg, fields, exc_info)
+
+    def critical(self, msg, exc_info=None, **fields):
+        self._log(logging.CRITICAL, msg, fields, exc_info)
+
+    def _log(self, level, msg, fields, exc_info=None):
+        if not self._logger.isEnabledFor(level):
+            return
+
+        start = time.perf_counter_ns()
+        extra = dict(self._context)
+        for key, value in fields.items():
+            if callable(value):
+                value = value()
+            if "payload" in key and isinstance(value, (list, tuple)):
+                extra.update(summarize_payload(key, value))
+            else:
+                extra[key] = value
+
+        # stacklevel=3 aponta o registro para quem chamou info()/debug()/...
+        self._logger.log(level, msg, extra=extra, exc_info=exc_info, stacklevel=3)
+        # Tempo de log na fase "telemetry" da requisição (otel/phases.py)
+        phases.add_telemetry(start)
+
+
+def request_logger(**context):
+    """
+    Cria um RequestLogger com service_name, os campos informados e, se houver
+    span ativo, trace_id e span_id já formatados.
+    """
+    bound = {"service_name": config.APP_NAME, **context}
+    span_context = get_current_span().get_span_context()
+    if span_context.is_valid:
+        bound["trace_id"] = format(span_context.trace_id, "032x")
+        bound["span_id"] = format(span_context.span_id, "016x")
+    return RequestLogger(logger, bound)
@@ -0,0 +1,59 @@
+# =============================================================================
+# LEITOR PERIÓDICO DE MÉTRICAS COM INTERVALO AJUSTÁVEL
+# =============================================================================
+# O PeriodicExportingMetricReader do SDK calcula o intervalo uma única vez, ao
+# iniciar a thread de exportação. Esta variante relê o intervalo a cada ciclo
+# e pode ser acordada por set_export_interval(), de forma que a mudança vale
+# imediatamente (a contagem recomeça a partir da alteração), sem reiniciar o
+# processo.
+
+import logging
+import threading
+
+from opentelemetry.sdk.metrics import MetricsTimeoutError
+from opentelemetry.sdk.metrics.export import PeriodicExportingMetricReader
+
+_logger = logging.getLogger(__name__)
+
+
+class ReconfigurablePeriodicExportingMetricReader(PeriodicExportingMetricReader):
+    def __init__(self, exporter, export_interval_millis: float, **kwargs):
+        # Precisa existir antes do super().__init__, que já inicia a thread
+        self._wakeup = threading.Event()
+        super().__init__(exporter, export_interval_millis=export_interval_millis, **kwargs)
+
+    @property
+    def export_interval_millis(self) -> float:
+        return self._export_interval_millis
+
+    def set_export_interval(self, export_interval_millis: float) -> None:
+        if export_interval_millis <= 0:
+            raise ValueError("export_interval_millis deve ser positivo")
+        self._export_interval_millis = export_interval_millis
+        self._wakeup.set()
+
+    def _ticker(self) -> None:
+        while True:
+            self._wakeup.wait(self._export_interval_millis / 1e3)
+            if self._shutdown_event.is_set():
+                break
+            if self._wakeup.is_set():
+                # Intervalo alterado: recomeça a espera com o novo valor
+                self._wakeup.clear()
+                continue
+            try:
+                self.collect(timeout_millis=self._export_timeout_millis)
+            except MetricsTimeoutError:
+                _logger.warning("Metric collection timed out", exc_info=True)
+
+        # Última coleta antes de encerrar, como no reader do SDK
+        try:
+            self.collect(timeout_millis=self._export_interval_millis)
+        except MetricsTimeoutError:
+            _logger.warning("Metric collection timed out", exc_info=True)
+
+    def shutdown(self, timeout_millis: float = 30_000, **kwargs) -> None:
+        # Acorda a thread para que o join do SDK não espere o intervalo inteiro
+        self._shutdown_event.set()
+        self._wakeup.set()
+        super().shutdown(timeout_millis=timeout_millis, **kwargs)
@@ -6,57 +6,227 @@
 # em um ponto específico no tempo (ex: número de requisições, uso de CPU, etc.)
 
 # Importações necessárias para trabalhar com métricas OpenTelemetry
+# Só a API é importada aqui: o SDK, os readers e os exportadores são criados
+# em setup_metrics(), chamado no startup da aplicação (otel/telemetry.py).
+# Os instrumentos abaixo são criados no meter global (proxy) e passam a
+# registrar medições assim que o MeterProvider é definido.
 from opentelemetry import metrics
-from opentelemetry.sdk.metrics import MeterProvider
-from opentelemetry.exporter.prometheus import PrometheusMetricReader
 import random
 from typing import Iterable
 from opentelemetry.metrics import CallbackOptions, Observation
-import psutil
 import os
 import config
 
-from opentelemetry.sdk.metrics.export import PeriodicExportingMetricReader
-from opentelemetry.exporter.otlp.proto.http.metric_exporter import OTLPMetricExporter
+from otel.cardinality import OVERFLOW_ATTRIBUTES, CardinalityGuard
 
 
 # Nome da aplicação - usado para identificar de qual serviço vêm as métricas
 APP_NAME = os.getenv("APP_NAME", "app-a")
 
+# =============================================================================
+# TEMPORALIDADE, AGREGAÇÃO E VIEWS
+# =============================================================================
+# Temporalidade: "cumulative" envia o total desde o início do processo a cada
+# exportação; "delta" envia só a variação desde a última exportação (menos
+# estado no collector). "lowmemory" usa delta apenas para Counter e Histogram.
+def temporality_preset(name):
+    from opentelemetry.sdk.metrics import (
+        Counter,
+        Histogram,
+        ObservableCounter,
+        ObservableGauge,
+        ObservableUpDownCounter,
+        UpDownCounter,
+    )
+    from opentelemetry.sdk.metrics.export import AggregationTemporality
+
+    presets = {
+        "cumulative": {},
+        "delta": {
+            Counter: AggregationTemporality.DELTA,
+            Histogram: AggregationTemporality.DELTA,
+            ObservableCounter: AggregationTemporality.DELTA,
+            UpDownCounter: AggregationTemporality.CUMULATIVE,
+            ObservableUpDownCounter: AggregationTemporality.CUMULATIVE,
+            ObservableGauge: AggregationTemporality.CUMULATIVE,
+        },
+        "lowmemory": {
+            Counter: AggregationTemporality.DELTA,
+            Histogram: AggregationTemporality.DELTA,
+            ObservableCounter: AggregationTemporality.CUMULATIVE,
+            UpDownCounter: AggregationTemporality.CUMULATIVE,
+            ObservableUpDownCounter: AggregationTemporality.CUMULATIVE,
+            ObservableGauge: AggregationTemporality.CUMULATIVE,
+        },
+    }
+    return presets[name]
+
+
+# Agregação dos histogramas enviados via OTLP: "explicit" usa os buckets
+# definidos em cada instrumento; "exponential" usa buckets exponenciais
+# (base 2), com resolução automática: a escala se ajusta à faixa de valores
+# observada, mantendo a resolução da cauda sem buckets ajustados à mão.
+# O exportador Prometheus não suporta histogramas exponenciais, por isso a
+# escolha vale só para o reader OTLP.
+def histogram_aggregation(name):
+    from opentelemetry.sdk.metrics.view import (
+        ExplicitBucketHistogramAggregation,
+        ExponentialBucketHistogramAggregation,
+    )
+
+    if name == "exponential":
+        return ExponentialBucketHistogramAggregation(
+            max_size=config.METRICS_EXPONENTIAL_MAX_SIZE,
+            max_scale=config.METRICS_EXPONENTIAL_MAX_SCALE,
+        )
+    return ExplicitBucketHistogramAggregation()
+
+
+def parse_attribute_keys(spec):
+    """
+    Converte "inst_a:k1,k2;inst_b:k3" em {"inst_a": {"k1", "k2"}, "inst_b": {"k3"}}.
+    """
+    result = {}
+    for entry in filter(None, (part.strip() for part in spec.split(";"))):
+        name, _, keys = entry.partition(":")
+        result[name.strip()] = {key.strip() for key in keys.split(",") if key.strip()}
+    return result
+
+
+# Chaves permitidas por instrumento e instrumentos descartados (ver config.py)
+METRIC_ATTRIBUTE_KEYS = parse_attribute_keys(config.METRICS_ATTRIBUTE_KEYS)
+METRIC_DROP_INSTRUMENTS = {name.strip() for name in config.METRICS_DROP_INSTRUMENTS.split(",") if name.strip()}
+
+
+def build_views():
+    """
+    Views do SDK: descartam instrumentos inteiros (DropAggregation) ou
+    restringem os atributos de um instrumento a uma allow-list. Cada View
+    casa com um único instrumento, para que nenhum instrumento gere dois
+    fluxos de dados.
+    """
+    from opentelemetry.sdk.metrics.view import DropAggregation, View
+
+    views = [
+        View(instrument_name=name, aggregation=DropAggregation())
+        for name in METRIC_DROP_INSTRUMENTS
+    ]
+    # O atributo de overflow do CardinalityGuard é sempre permitido
+    views.extend(
+        View(instrument_name=name, attribute_keys=keys | OVERFLOW_ATTRIBUTES.keys())
+        for name, keys in METRIC_ATTRIBUTE_KEYS.items()
+        if name not in METRIC_DROP_INSTRUMENTS
+    )
+    return views
+
+
 # =============================================================================
 # CONFIGURAÇÃO DO SISTEMA DE MÉTRICAS
 # =============================================================================
-# PrometheusMetricReader: Responsável por expor as métricas no formato que o Prometheus entende
-# O Prometheus é uma ferramenta de monitoramento que coleta e armazena métricas
-prometheus_reader = PrometheusMetricReader()
+meter_provider = None
+otlp_reader = None
 
-otlp_exporter = OTLPMetricExporter(
-    endpoint=f"{config.OTLP_ENDPOINT}/v1/metrics"
-)
 
-otlp_reader = PeriodicExportingMetricReader(
-    exporter=otlp_exporter,
-    export_interval_millis=1000 # Exporta a cada 1 segundo
-)
+def setup_metrics():
+    """
+    Cria os readers (Prometheus e OTLP) e define o MeterProvider global.
+    Com TELEMETRY_METRICS_ENABLED=false o MeterProvider fica sem readers: os
+    instrumentos continuam existindo, mas nada é agregado, exposto ou exportado.
+    """
+    global meter_provider, otlp_reader
+
+    from opentelemetry.sdk.metrics import Histogram, MeterProvider
+    from otel.resource import service_resource
+
+    metric_readers = []
 
-# MeterProvider: É o ponto central de configuração para métricas
-# Define como as métricas serão coletadas e exportadas
-metrics.set_meter_provider(
-    MeterProvider(
-        metric_readers=[prometheus_reader, otlp_reader]  # Lista de leitores que coletam as métricas
+    if config.TELEMETRY_METRICS_ENABLED:
+        from opentelemetry.exporter.prometheus import PrometheusMetricReader
+        from otel.exporters import create_exporter
+        from otel.metric_reader import ReconfigurablePeriodicExportingMetricReader
+
+        # PrometheusMetricReader: Responsável por expor as métricas no formato que o Prometheus entende
+        # O Prometheus é uma ferramenta de monitoramento que coleta e armazena métricas
+        prometheus_reader = PrometheusMetricReader()
+
+        # Com vários workers (METRICS_MULTIPROC_DIR), /metrics agrega os snapshots
+        # de todos os workers (otel/multiprocess.py) em vez de ler o REGISTRY global.
+        # O collector continua no REGISTRY: o shutdown do reader o remove de lá
+        if config.METRICS_MULTIPROC_DIR:
+            from otel.multiprocess import enable_multiprocess
+
+            enable_multiprocess(prometheus_reader._collector)
+
+        otlp_exporter = create_exporter(
+            "metrics",
+            preferred_temporality=temporality_preset(config.METRICS_TEMPORALITY),
+            preferred_aggregation={
+                Histogram: histogram_aggregation(config.METRICS_HISTOGRAM_AGGREGATION),
+            },
+        )
+
+        # O intervalo pode ser alterado em runtime (otlp_reader.set_export_interval)
+        otlp_reader = ReconfigurablePeriodicExportingMetricReader(
+            exporter=otlp_exporter,
+            export_interval_millis=config.METRICS_EXPORT_INTERVAL_MS  # Intervalo de exportação (config.py)
+        )
+
+        metric_readers = [prometheus_reader, otlp_reader]
+
+    # Resource: identifica o serviço que gera as métricas (igual ao de traces e logs)
+    resource = service_resource()
+
+    # MeterProvider: É o ponto central de configuração para métricas
+    # Define como as métricas serão coletadas e exportadas
+    # O encerramento é feito por shutdown_telemetry() (otel/telemetry.py)
+    meter_provider = MeterProvider(
+        resource=resource,
+        metric_readers=metric_readers,  # Lista de leitores que coletam as métricas
+        views=build_views(),
+        shutdown_on_exit=False,
     )
-)
+    metrics.set_meter_provider(meter_provider)
+    return meter_provider
+
 
 # Meter: É o instrumento principal para criar métricas
 # Funciona como uma "fábrica" de métricas para uma aplicação específica
 meter = metrics.get_meter(APP_NAME)
 
+# =============================================================================
+# LIMITE DE CARDINALIDADE
+# =============================================================================
+# Conta quantas medições foram desviadas para a série de overflow porque o
+# instrumento já tinha METRICS_CARDINALITY_LIMIT combinações de atributos
+cardinality_overflow_counter = meter.create_counter(
+    name="app_metric_cardinality_overflow_total",
+    description="Medições desviadas para a série de overflow por excesso de cardinalidade",
+    unit="1",
+)
+
+
+def limit_cardinality(create_instrument, name, **kwargs):
+    """
+    Cria um instrumento síncrono (ex.: meter.create_counter) com o
+    CardinalityGuard aplicado. Todos os instrumentos síncronos com atributos
+    passam por aqui, exceto app_metric_cardinality_overflow_total, cujo único
+    atributo é o nome do instrumento.
+    """
+    return CardinalityGuard(
+        create_instrument(name=name, **kwargs),
+        name=name,
+        limit=config.METRICS_CARDINALITY_LIMIT,
+        overflow_counter=cardinality_overflow_counter,
+        attribute_keys=METRIC_ATTRIBUTE_KEYS.get(name),
+    )
+
 # =============================================================================
 # COUNTER (CONTADOR) - MÉTRICA CUMULATIVA
 # =============================================================================
 # Counter: Só aumenta, nunca diminui (ex: número total de requisições)
 # Ideal para contar eventos que acontecem ao longo do tempo
-requests_counter = meter.create_counter(
+requests_counter = limit_cardinality(
+    meter.create_counter,
     name="app_requests_total",           # Nome da métrica (padrão: nome_total)
     description="Número de requisições processadas",  # Descrição humana
     unit="1",                            # Unidade de medida (1 = contagem)
@@ -88,13 +258,24 @@ random_counter = meter.create_observable_counter(
 )
 
 # =============================================================================
-# GAUGE (MEDIDOR) - MÉTRICA DE VALOR ATUAL
+# UP DOWN COUNTER (CONTADOR BIDIRECIONAL) - VALOR QUE SOBE E DESCE
 # =============================================================================
-# Gauge: Representa um valor atual que pode subir ou descer
-# Ex: temperatura, uso de memória, número de conexões ativas
-active_requests_gauge = meter.create_gauge(
+# UpDownCounter: Recebe incrementos positivos e negativos; o valor exportado é
+# a soma atual. Ideal para "quantos estão em andamento agora".
+# Ex: requisições em andamento (+1 na entrada, -1 na saída), itens em fila
+# O InFlightMiddleware (middleware.py) mantém este contador por rota
+active_requests_counter = limit_cardinality(
+    meter.create_up_down_counter,
     name="app_active_requests",
-    description="Número de requisições ativas",
+    description="Número de requisições em andamento por rota",
+    unit="1",
+)
+
+# Requisições rejeitadas pelo controle de admissão (limite por rota atingido)
+shed_requests_counter = limit_cardinality(
+    meter.create_counter,
+    name="app_requests_shed_total",
+    description="Requisições rejeitadas pelo controle de admissão",
     unit="1",
 )
 
@@ -104,15 +285,15 @@ active_requests_gauge = meter.create_gauge(
 # Observable Gauge: Valor atual calculado dinamicamente
 # Perfeito para métricas do sistema que mudam constantemente
 
-# Obtém referência ao processo atual para monitorar recursos
-process = psutil.Process()
-
 def get_memory_usage(options: CallbackOptions) -> Iterable[Observation]:
     """
     Callback function que monitora o uso de memória do processo
     Demonstra como coletar métricas do sistema operacional
     """
-    memory_usage = process.memory_percent()  # Uso de memória em porcentagem
+    # Usa a amostra compartilhada de otel/runtime.py: uma leitura do psutil por
+    # intervalo, mesmo com dois readers (import tardio evita import circular)
+    from otel.runtime import runtime_sampler
+    memory_usage = runtime_sampler.sample().memory_percent  # Uso de memória em porcentagem
     yield Observation(
         memory_usage,                    # Valor da métrica (porcentagem)
         {"service": APP_NAME}           # Atributos para identificação
@@ -131,17 +312,35 @@ memory_gauge = meter.create_observable_gauge(
 # Histogram: Agrupa observações em buckets (caixas) baseado em valores
 # Ideal para medir latência, tamanho de requisições, etc.
 # Permite analisar percentis (ex: 95% das requisições respondem em menos de X segundos)
-response_time_histogram = meter.create_histogram(
+# Limites dos buckets em segundos; também usados pelo hedging (resilience.py)
+RESPONSE_TIME_BUCKETS = [
+    0.005,  # 5ms
+    0.01,   # 10ms
+    0.025,  # 25ms
+    0.05,   # 50ms
+    0.1,    # 100ms
+    0.25,   # 250ms
+    0.5,    # 500ms
+    1,      # 1s
+    2.5,    # 2.5s
+    5,      # 5s (timeout padrão das chamadas downstream)
+    10      # 10s
+]
+
+response_time_histogram = limit_cardinality(
+    meter.create_histogram,
     name="app_response_time_seconds",
     description="Tempo de resposta das requisições em segundos",
     unit="s",                           # Unidade: segundos
-    explicit_bucket_boundaries_advisory=[  # Limites dos buckets em segundos
-        0.005,  # 5ms
-        0.01,   # 10ms
-        0.025,  # 25ms
-        0.05,   # 50ms
-        0.1,    # 100ms
-        0.25,   # 250ms
-        0.5     # 500ms
-    ]
+    explicit_bucket_boundaries_advisory=RESPONSE_TIME_BUCKETS,
+)
+
+# Duração do endpoint /metrics, separando scrapes servidos do cache (hit) dos
+# que precisaram coletar um snapshot novo (miss)
+scrape_duration_histogram = limit_cardinality(
+    meter.create_histogram,
+    name="app_metrics_scrape_duration_seconds",
+    description="Duração do scrape do endpoint /metrics em segundos",
+    unit="s",
+    explicit_bucket_boundaries_advisory=[0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25]
 )
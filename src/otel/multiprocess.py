@@ -0,0 +1,195 @@
+# =============================================================================
+# MÉTRICAS COM VÁRIOS WORKERS (uvicorn --workers)
+# =============================================================================
+# Com vários workers, cada processo tem o próprio MeterProvider e o próprio
+# PrometheusMetricReader, e /metrics mostraria só o worker que atendeu o
+# scrape. Com METRICS_MULTIPROC_DIR definido:
+#   - cada worker grava periodicamente (METRICS_MULTIPROC_SYNC_INTERVAL_MS) e
+#     ao encerrar um snapshot das suas métricas em um arquivo próprio no
+#     diretório compartilhado (escrita atômica: arquivo temporário + rename)
+#   - /metrics lê os arquivos de todos os workers e agrega:
+#       counter, histogram, summary -> soma de todos os workers, inclusive
+#                                      os que já morreram (os totais não
+#                                      voltam para trás quando um worker
+#                                      é reiniciado)
+#       gauge                       -> conforme GAUGE_MODES, só entre os
+#                                      workers vivos (como o multiprocess_mode
+#                                      do prometheus_client):
+#                                        "sum" -> soma (valores aditivos:
+#                                                 requisições ativas, RSS,
+#                                                 threads, filas)
+#                                        "max" / "min"
+#                                        "all" -> uma série por worker, com o
+#                                                 label pid (padrão: estados
+#                                                 como o do circuit breaker,
+#                                                 limiares e porcentagens
+#                                                 não se somam)
+#       info e demais               -> valor de um dos workers vivos
+#
+# Só counters, histogramas e summaries de workers mortos entram no scrape:
+# gauges e info (target_info, com o service.instance.id de cada worker)
+# somem junto com o worker.
+#
+# O arquivo de cada worker é identificado por PID + horário de início do
+# processo, então um PID reaproveitado não é confundido com o worker antigo.
+# O diretório deve ser limpo a cada início do pod (ex.: emptyDir ou /tmp do
+# container), como no modo multiprocess do prometheus_client.
+#
+# Incrementos feitos por um worker depois do último snapshot e antes de uma
+# morte abrupta (SIGKILL, OOM) se perdem: no máximo um intervalo de sync.
+
+import glob
+import json
+import os
+import threading
+from typing import Iterable, Optional
+
+from prometheus_client import CollectorRegistry
+from prometheus_client.metrics_core import Metric
+
+import config
+
+# Tipos cumulativos: somados entre todos os workers, vivos ou não
+_CUMULATIVE_TYPES = {"counter", "histogram", "gaugehistogram", "summary"}
+
+# Agregação de cada gauge entre os workers vivos (nome da família no
+# Prometheus); gauges fora da lista usam "all"
+GAUGE_MODES = {
+    "app_active_requests": "sum",
+    "app_runtime_memory_rss_bytes": "sum",
+    "app_runtime_open_fds": "sum",
+    "app_runtime_threads": "sum",
+    "app_runtime_threadpool_tokens": "sum",
+    "app_export_queue_batches": "sum",
+    "app_export_queue_bytes": "sum",
+    "app_export_queue_replay_lag_seconds": "max",
+}
+
+_GAUGE_COMBINE = {"sum": lambda a, b: a + b, "max": max, "min": min}
+
+
+def _process_key(pid: int) -> Optional[str]:
+    import psutil
+
+    try:
+        return f"{pid}-{int(psutil.Process(pid).create_time() * 1000)}"
+    except psutil.NoSuchProcess:
+        return None
+
+
+class MultiprocessMetricsStore:
+    """Snapshots por worker em um diretório compartilhado."""
+
+    def __init__(self, directory: str, collector, sync_interval_ms: float):
+        self._directory = directory
+        self._collector = collector
+        self._interval = sync_interval_ms / 1000
+        self._key = _process_key(os.getpid())
+        self._path = os.path.join(directory, f"worker-{self._key}.json")
+        # O collector do OpenTelemetry não é seguro para coletas concorrentes,
+        # e a thread de sync e o scrape gravam no mesmo arquivo temporário
+        self._write_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        os.makedirs(directory, exist_ok=True)
+
+    # ---------------------------------------------------------------------
+    # Escrita (cada worker)
+    # ---------------------------------------------------------------------
+    def write_snapshot(self) -> None:
+        # Coleta, escrita e rename sob o mesmo lock: duas escritas
+        # intercaladas no .tmp gerariam um arquivo corrompido, ignorado na
+        # leitura, e os contadores do worker sumiriam daquele scrape
+        with self._write_lock:
+            families = [
+                {
+                    "name": family.name,
+                    "documentation": family.documentation,
+                    "type": family.type,
+                    "unit": family.unit,
+                    "samples": [[sample.name, sample.labels, sample.value] for sample in family.samples],
+                }
+                for family in self._collector.collect()
+            ]
+            temp_path = f"{self._path}.tmp"
+            with open(temp_path, "w") as file:
+                json.dump(families, file)
+            os.replace(temp_path, self._path)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self._interval):
+            self.write_snapshot()
+
+    def start(self) -> None:
+        self.write_snapshot()
+        self._thread = threading.Thread(target=self._run, name="metrics-multiproc-sync", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Encerramento normal: grava o snapshot final."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.write_snapshot()
+
+    # ---------------------------------------------------------------------
+    # Leitura e agregação (worker que atende o scrape)
+    # ---------------------------------------------------------------------
+    def _worker_files(self) -> Iterable[tuple]:
+        for path in glob.glob(os.path.join(self._directory, "worker-*.json")):
+            key = os.path.basename(path)[len("worker-"):-len(".json")]
+            pid = int(key.split("-", 1)[0])
+            yield path, key == _process_key(pid)
+
+    def collect(self) -> Iterable[Metric]:
+        # O snapshot do próprio worker é atualizado para o scrape
+        self.write_snapshot()
+
+        merged = {}
+        for path, alive in self._worker_files():
+            try:
+                with open(path) as file:
+                    families = json.load(file)
+            except (OSError, ValueError):
+                continue
+
+            pid = os.path.basename(path)[len("worker-"):].split("-", 1)[0]
+            for family in families:
+                cumulative = family["type"] in _CUMULATIVE_TYPES
+                if not cumulative and not alive:
+                    continue
+                mode = GAUGE_MODES.get(family["name"], "all") if family["type"] == "gauge" else None
+                entry = merged.setdefault(family["name"], (family, {}))
+                values = entry[1]
+                for sample_name, labels, value in family["samples"]:
+                    if mode == "all":
+                        labels = {**labels, "pid": pid}
+                    sample_key = (sample_name, tuple(sorted(labels.items())))
+                    if sample_key not in values:
+                        values[sample_key] = value
+                    elif cumulative:
+                        values[sample_key] += value
+                    elif mode in _GAUGE_COMBINE:
+                        values[sample_key] = _GAUGE_COMBINE[mode](values[sample_key], value)
+
+        for family, values in merged.values():
+            metric = Metric(family["name"], family["documentation"], family["type"], family["unit"])
+            for (sample_name, labels), value in values.items():
+                metric.add_sample(sample_name, dict(labels), value)
+            yield metric
+
+
+multiprocess_store: Optional[MultiprocessMetricsStore] = None
+multiprocess_registry: Optional[CollectorRegistry] = None
+
+
+def enable_multiprocess(collector) -> None:
+    """Ativa o modo multiprocess (chamado por otel/metrics.py)."""
+    global multiprocess_store, multiprocess_registry
+    multiprocess_store = MultiprocessMetricsStore(
+        config.METRICS_MULTIPROC_DIR,
+        collector,
+        config.METRICS_MULTIPROC_SYNC_INTERVAL_MS,
+    )
+    multiprocess_registry = CollectorRegistry(auto_describe=False)
+    multiprocess_registry.register(multiprocess_store)
@@ -0,0 +1,445 @@
+# =============================================================================
+# FILA DE EXPORTAÇÃO PERSISTENTE EM DISCO
+# =============================================================================
+# Com o collector fora do ar ou lento, a fila em memória do BatchSpanProcessor
+# enche e descarta spans, e a telemetria do incidente se perde. Com
+# EXPORT_QUEUE_DIR definido, os exportadores de spans e de logs passam a:
+#   1. serializar cada lote (OTLP/protobuf) e anexá-lo ao segmento atual em
+#      disco (append-only), retornando sucesso na hora: a thread do
+#      processador de lote nunca espera o collector, então a fila em memória
+#      não enche por causa dele (e as requisições nunca esperam I/O de rede);
+#   2. reenviar os lotes em ordem, em uma thread de background, com backoff
+#      exponencial enquanto o collector estiver indisponível.
+#
+# Formato: arquivos <id>.seg com registros [tamanho, crc32, timestamp_ns,
+# payload]. O cursor (segmento e offset do próximo lote a enviar) fica em um
+# arquivo próprio, atualizado a cada envio confirmado, então lotes pendentes
+# sobrevivem a reinícios. Segmentos consumidos são apagados; acima de
+# EXPORT_QUEUE_MAX_BYTES, os segmentos mais antigos são descartados.
+#
+# Cada processo (worker) reserva um diretório <sinal>-<n> com flock; um
+# worker reiniciado reaproveita o diretório livre e reenvia o que ficou.
+
+import abc
+import fcntl
+import itertools
+import logging
+import os
+import struct
+import threading
+import time
+import zlib
+from typing import Iterable, Optional, Sequence, Tuple
+
+from opentelemetry import metrics
+from opentelemetry.exporter.otlp.proto.common._log_encoder import encode_logs
+from opentelemetry.exporter.otlp.proto.common.trace_encoder import encode_spans
+from opentelemetry.metrics import CallbackOptions, Observation
+from opentelemetry.sdk._logs.export import LogExporter, LogExportResult
+from opentelemetry.sdk.trace.export import SpanExporter, SpanExportResult
+
+import config
+from otel.exporters import SEND_OK, SEND_REJECTED, create_sender
+
+_logger = logging.getLogger(__name__)
+
+# tamanho do payload, crc32 do payload, timestamp (ns) da gravação
+_HEADER = struct.Struct("<IIq")
+_SEGMENT_SUFFIX = ".seg"
+_CURSOR_FILE = "cursor"
+
+
+# =============================================================================
+# SEGMENTOS EM DISCO
+# =============================================================================
+class SegmentQueue:
+    """Fila FIFO de payloads em segmentos append-only com limite de tamanho."""
+
+    def __init__(self, directory: str, max_bytes: int, segment_bytes: int):
+        self._dir = directory
+        self._max_bytes = max_bytes
+        self._segment_bytes = segment_bytes
+        self._condition = threading.Condition(threading.Lock())
+        # id do segmento -> [bytes válidos, registros]
+        self._segments = {}
+        self._readers = {}
+        self._peeked = None
+        self.evicted = 0
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    def _path(self, segment_id: int) -> str:
+        return os.path.join(self._dir, f"{segment_id:020d}{_SEGMENT_SUFFIX}")
+
+    def _scan(self, segment_id: int, until: Optional[int] = None) -> Tuple[int, int]:
+        """Retorna (bytes válidos, registros) do segmento, parando em um registro incompleto."""
+        size = records = 0
+        with open(self._path(segment_id), "rb") as file:
+            while until is None or size < until:
+                header = file.read(_HEADER.size)
+                if len(header) < _HEADER.size:
+                    break
+                length, crc, _ = _HEADER.unpack(header)
+                payload = file.read(length)
+                if len(payload) < length or zlib.crc32(payload) != crc:
+                    break
+                size += _HEADER.size + length
+                records += 1
+        return size, records
+
+    def _load(self) -> None:
+        ids = sorted(
+            int(name[:-len(_SEGMENT_SUFFIX)])
+            for name in os.listdir(self._dir)
+            if name.endswith(_SEGMENT_SUFFIX)
+        )
+        for segment_id in ids:
+            self._segments[segment_id] = list(self._scan(segment_id))
+
+        # Sempre começa um segmento novo: o final do último pode estar incompleto
+        self._write_id = ids[-1] + 1 if ids else 1
+        self._segments[self._write_id] = [0, 0]
+        self._file = open(self._path(self._write_id), "ab")
+
+        cursor_segment, cursor_offset = self._read_cursor()
+        if cursor_segment not in self._segments:
+            cursor_segment, cursor_offset = next(iter(self._segments)), 0
+        # Segmentos anteriores ao cursor já foram enviados (o processo pode ter
+        # parado antes de apagá-los)
+        for segment_id in [segment_id for segment_id in self._segments if segment_id < cursor_segment]:
+            self._remove_segment(segment_id)
+        self._cursor_segment = cursor_segment
+        self._cursor_offset = min(cursor_offset, self._segments[cursor_segment][0])
+        self._cursor_index = self._scan(cursor_segment, until=self._cursor_offset)[1] if self._cursor_offset else 0
+
+    def _read_cursor(self) -> Tuple[int, int]:
+        try:
+            with open(os.path.join(self._dir, _CURSOR_FILE)) as file:
+                segment_id, offset = file.read().split()
+                return int(segment_id), int(offset)
+        except (OSError, ValueError):
+            return -1, 0
+
+    def _write_cursor(self) -> None:
+        path = os.path.join(self._dir, _CURSOR_FILE)
+        with open(f"{path}.tmp", "w") as file:
+            file.write(f"{self._cursor_segment} {self._cursor_offset}")
+        os.replace(f"{path}.tmp", path)
+
+    def _remove_segment(self, segment_id: int) -> None:
+        del self._segments[segment_id]
+        reader = self._readers.pop(segment_id, None)
+        if reader is not None:
+            reader.close()
+        try:
+            os.remove(self._path(segment_id))
+        except FileNotFoundError:
+            pass
+
+    # -------------------------------------------------------------------------
+    # Escrita
+    # -------------------------------------------------------------------------
+    def append(self, payload: bytes) -> None:
+        record = _HEADER.pack(len(payload), zlib.crc32(payload), time.time_ns()) + payload
+        with self._condition:
+            current = self._segments[self._write_id]
+            if current[0] and current[0] + len(record) > self._segment_bytes:
+                self._file.close()
+                self._write_id += 1
+                current = self._segments[self._write_id] = [0, 0]
+                self._file = open(self._path(self._write_id), "ab")
+
+            self._file.write(record)
+            self._file.flush()
+            current[0] += len(record)
+            current[1] += 1
+            self._evict()
+            self._condition.notify_all()
+
+    def _evict(self) -> None:
+        """Descarta os segmentos mais antigos enquanto o total passar do limite."""
+        while sum(size for size, _ in self._segments.values()) > self._max_bytes:
+            oldest = next(iter(self._segments))
+            if oldest == self._write_id:
+                break
+            _, records = self._segments[oldest]
+            if oldest == self._cursor_segment:
+                self.evicted += records - self._cursor_index
+                self._move_cursor(next(itertools.islice(self._segments, 1, None)))
+            else:
+                self.evicted += records
+            self._remove_segment(oldest)
+
+    # -------------------------------------------------------------------------
+    # Leitura
+    # -------------------------------------------------------------------------
+    def _move_cursor(self, segment_id: int) -> None:
+        self._cursor_segment, self._cursor_offset, self._cursor_index = segment_id, 0, 0
+        self._write_cursor()
+
+    def _advance_segment(self) -> bool:
+        """Pula segmentos já consumidos; retorna False se não há nada para ler."""
+        while self._cursor_offset >= self._segments[self._cursor_segment][0]:
+            if self._cursor_segment == self._write_id:
+                return False
+            consumed = self._cursor_segment
+            self._move_cursor(next(itertools.islice(self._segments, 1, None)))
+            self._remove_segment(consumed)
+        return True
+
+    def _read_at_cursor(self, header_only: bool = False) -> Tuple[int, int, Optional[bytes]]:
+        """(tamanho do payload, timestamp_ns, payload) do registro no cursor."""
+        reader = self._readers.get(self._cursor_segment)
+        if reader is None:
+            reader = self._readers[self._cursor_segment] = open(self._path(self._cursor_segment), "rb")
+        reader.seek(self._cursor_offset)
+        length, _, timestamp_ns = _HEADER.unpack(reader.read(_HEADER.size))
+        return length, timestamp_ns, None if header_only else reader.read(length)
+
+    def peek(self, timeout: Optional[float] = None) -> Optional[bytes]:
+        """Próximo payload sem removê-lo; espera até timeout se a fila estiver vazia."""
+        with self._condition:
+            if not self._advance_segment():
+                self._condition.wait(timeout)
+                if not self._advance_segment():
+                    return None
+            length, _, payload = self._read_at_cursor()
+            self._peeked = (self._cursor_segment, self._cursor_offset, length)
+            return payload
+
+    def ack(self) -> None:
+        """Confirma o payload devolvido por peek()."""
+        with self._condition:
+            segment_id, offset, length = self._peeked
+            # Se o segmento foi descartado pelo limite de tamanho entre o
+            # peek() e o ack(), o cursor já avançou
+            if (segment_id, offset) != (self._cursor_segment, self._cursor_offset):
+                return
+            self._cursor_offset += _HEADER.size + length
+            self._cursor_index += 1
+            self._write_cursor()
+
+    # -------------------------------------------------------------------------
+    # Estado (métricas)
+    # -------------------------------------------------------------------------
+    def pending(self) -> Tuple[int, int]:
+        """(lotes pendentes, bytes pendentes)."""
+        with self._condition:
+            records = size = 0
+            for segment_id, (segment_size, segment_records) in self._segments.items():
+                if segment_id < self._cursor_segment:
+                    continue
+                if segment_id == self._cursor_segment:
+                    records += segment_records - self._cursor_index
+                    size += segment_size - self._cursor_offset
+                else:
+                    records += segment_records
+                    size += segment_size
+            return records, size
+
+    def oldest_age(self) -> float:
+        """Idade (s) do lote pendente mais antigo, 0 se a fila está vazia."""
+        with self._condition:
+            if not self._advance_segment():
+                return 0.0
+            timestamp_ns = self._read_at_cursor(header_only=True)[1]
+            return max(0.0, (time.time_ns() - timestamp_ns) / 1e9)
+
+    def close(self) -> None:
+        with self._condition:
+            self._file.close()
+            for reader in self._readers.values():
+                reader.close()
+            self._readers.clear()
+
+
+def claim_directory(base_dir: str, signal: str):
+    """
+    Reserva o primeiro diretório <sinal>-<n> livre (flock exclusivo). O lock
+    vale enquanto o arquivo retornado estiver aberto.
+    """
+    for index in itertools.count():
+        directory = os.path.join(base_dir, f"{signal}-{index}")
+        os.makedirs(directory, exist_ok=True)
+        lock_file = open(os.path.join(directory, "lock"), "w")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            continue
+        return directory, lock_file
+
+
+# =============================================================================
+# EXPORTADORES
+# =============================================================================
+_exporters = []
+
+
+class _PersistentExporter(abc.ABC):
+    """Base dos exportadores: grava o lote em disco e reenvia em background."""
+
+    signal = None
+
+    def __init__(self, base_dir: str, max_bytes: int, segment_bytes: int, retry_max_s: float, sender=None):
+        directory, self._lock_file = claim_directory(base_dir, self.signal)
+        self._queue = SegmentQueue(directory, max_bytes, segment_bytes)
+        self._sender = sender or create_sender(self.signal)
+        self._retry_max = retry_max_s
+        self._stop = threading.Event()
+        self.rejected = 0
+        self.write_errors = 0
+        self._thread = threading.Thread(
+            target=self._replay, name=f"persistent-export-{self.signal}", daemon=True
+        )
+        self._thread.start()
+        _exporters.append(self)
+
+    @abc.abstractmethod
+    def _encode(self, batch) -> bytes:
+        """Serializa o lote no formato OTLP (protobuf) do sinal."""
+
+    def _store(self, batch) -> bool:
+        try:
+            self._queue.append(self._encode(batch))
+            return True
+        except OSError:
+            self.write_errors += 1
+            _logger.exception("Falha ao gravar lote na fila persistente (%s)", self.signal)
+            return False
+
+    def _replay(self) -> None:
+        backoff = 0.5
+        while not self._stop.is_set():
+            payload = self._queue.peek(timeout=1)
+            if payload is None:
+                continue
+            result = self._sender.send(payload)
+            if result == SEND_OK or result == SEND_REJECTED:
+                if result == SEND_REJECTED:
+                    self.rejected += 1
+                    _logger.warning("Lote de %s recusado pelo collector e descartado", self.signal)
+                self._queue.ack()
+                backoff = 0.5
+            else:
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, self._retry_max)
+
+    def pending(self) -> Tuple[int, int]:
+        return self._queue.pending()
+
+    def oldest_age(self) -> float:
+        return self._queue.oldest_age()
+
+    @property
+    def evicted(self) -> int:
+        return self._queue.evicted
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        deadline = time.monotonic() + timeout_millis / 1000
+        while self._queue.pending()[0]:
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.05)
+        return True
+
+    def shutdown(self) -> None:
+        # Lotes ainda não enviados ficam em disco para o próximo início
+        self._stop.set()
+        # Um envio em andamento pode levar até OTLP_TIMEOUT_S
+        self._thread.join(timeout=config.OTLP_TIMEOUT_S + 2)
+        if self._thread.is_alive():
+            # Fechar o sender e a fila agora concorreria com o envio: o ack
+            # (e o cursor) podia se perder e o lote seria reenviado no
+            # próximo início. A thread é daemon e termina com o processo
+            _logger.warning("Envio de %s ainda em andamento no encerramento; fila mantida aberta", self.signal)
+            return
+        self._queue.close()
+        self._sender.close()
+        self._lock_file.close()
+
+
+class PersistentSpanExporter(_PersistentExporter, SpanExporter):
+    signal = "traces"
+
+    def _encode(self, batch) -> bytes:
+        return encode_spans(batch).SerializeToString()
+
+    def export(self, spans: Sequence) -> SpanExportResult:
+        return SpanExportResult.SUCCESS if self._store(spans) else SpanExportResult.FAILURE
+
+
+class PersistentLogExporter(_PersistentExporter, LogExporter):
+    signal = "logs"
+
+    def _encode(self, batch) -> bytes:
+        return encode_logs(batch).SerializeToString()
+
+    def export(self, batch: Sequence) -> LogExportResult:
+        return LogExportResult.SUCCESS if self._store(batch) else LogExportResult.FAILURE
+
+
+def create_persistent_exporter(signal: str):
+    """Exportador persistente do sinal ("traces" ou "logs") com os limites de config.py."""
+    exporter_class = {"traces": PersistentSpanExporter, "logs": PersistentLogExporter}[signal]
+    return exporter_class(
+        config.EXPORT_QUEUE_DIR,
+        max_bytes=config.EXPORT_QUEUE_MAX_BYTES,
+        segment_bytes=config.EXPORT_QUEUE_SEGMENT_BYTES,
+        retry_max_s=config.EXPORT_QUEUE_RETRY_MAX_S,
+    )
+
+
+# =============================================================================
+# MÉTRICAS DA FILA
+# =============================================================================
+def _observe_batches(options: CallbackOptions) -> Iterable[Observation]:
+    for exporter in _exporters:
+        yield Observation(exporter.pending()[0], {"signal": exporter.signal})
+
+
+def _observe_bytes(options: CallbackOptions) -> Iterable[Observation]:
+    for exporter in _exporters:
+        yield Observation(exporter.pending()[1], {"signal": exporter.signal})
+
+
+def _observe_lag(options: CallbackOptions) -> Iterable[Observation]:
+    for exporter in _exporters:
+        yield Observation(exporter.oldest_age(), {"signal": exporter.signal})
+
+
+def _observe_dropped(options: CallbackOptions) -> Iterable[Observation]:
+    for exporter in _exporters:
+        yield Observation(exporter.evicted, {"signal": exporter.signal, "reason": "evicted"})
+        yield Observation(exporter.rejected, {"signal": exporter.signal, "reason": "rejected"})
+
+
+_meter = metrics.get_meter(config.APP_NAME)
+
+_meter.create_observable_gauge(
+    name="app_export_queue_batches",
+    description="Lotes aguardando envio na fila de exportação persistente",
+    unit="1",
+    callbacks=[_observe_batches],
+)
+
+_meter.create_observable_gauge(
+    name="app_export_queue_bytes",
+    description="Bytes aguardando envio na fila de exportação persistente",
+    unit="By",
+    callbacks=[_observe_bytes],
+)
+
+_meter.create_observable_gauge(
+    name="app_export_queue_replay_lag_seconds",
+    description="Idade do lote pendente mais antigo da fila de exportação persistente",
+    unit="s",
+    callbacks=[_observe_lag],
+)
+
+_meter.create_observable_counter(
+    name="app_export_queue_dropped_batches_total",
+    description="Lotes descartados da fila persistente (limite de tamanho ou recusados pelo collector)",
+    unit="1",
+    callbacks=[_observe_dropped],
+)
@@ -0,0 +1,168 @@
+# =============================================================================
+# TEMPO POR FASE DA REQUISIÇÃO
+# =============================================================================
+# Decompõe o tempo de /process para saber onde uma requisição lenta gastou
+# seu tempo:
+#   - queue:       da chegada da requisição (TimingMiddleware) até o início do
+#                  handler: middlewares, controle de admissão, falhas
+#                  injetadas na rota, leitura/validação do corpo e espera
+#                  pelo event loop (/process é async, não usa o threadpool)
+#   - sleep:       latência simulada (APP_LATENCY)
+#   - downstream:  espera pelas chamadas a APP_URL_DESTINO
+#   - coalesced:   espera pela execução de outra requisição (coalesce.py)
+#   - telemetry:   tempo dentro das chamadas de log (RequestLogger) e da
+#                  gravação de payloads nos spans (set_payload_attributes)
+#   - handler_cpu: o restante do tempo do handler, executado no event loop
+#
+# Cada fase vira um atributo do span "process-request" (phase.<fase>_ms) e
+# uma medição de app_request_phase_seconds{phase=...}. A medição é feita com
+# o span ainda ativo: com o filtro de exemplars padrão do SDK (trace_based)
+# os pontos exportados via OTLP carregam trace_id e span_id como exemplars.
+#
+# O RequestPhases da requisição fica em uma ContextVar, herdada pelas tasks
+# criadas durante a requisição (fan-out, hedging, execução compartilhada).
+
+import asyncio
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+import config
+from otel.metrics import RESPONSE_TIME_BUCKETS, limit_cardinality, meter
+
+# Fases em que o handler está esperando (não ocupa o event loop)
+WAIT_PHASES = ("sleep", "downstream", "coalesced")
+
+phase_histogram = limit_cardinality(
+    meter.create_histogram,
+    name="app_request_phase_seconds",
+    description="Tempo das requisições por fase (queue, handler_cpu, sleep, downstream, coalesced, telemetry)",
+    unit="s",
+    explicit_bucket_boundaries_advisory=[0.0001, 0.0005, 0.001, *RESPONSE_TIME_BUCKETS],
+)
+
+_current: ContextVar[Optional["RequestPhases"]] = ContextVar("request_phases", default=None)
+
+# Em Pythons sem Task.get_context() (< 3.12) o profiler não tem como ler a
+# ContextVar de outra task. Cada requisição registra aqui o frame da
+# corrotina da sua task; o profiler procura esses frames na pilha amostrada
+# do event loop. Um dict simples: copy() é atômico e pode ser feito a partir
+# da thread do profiler
+_HAS_TASK_CONTEXT = hasattr(asyncio.Task, "get_context")
+_request_frames: Dict[object, "RequestPhases"] = {}
+
+
+class RequestPhases:
+    __slots__ = ("trace_id", "received_ns", "started_ns", "durations", "_waiting", "_telemetry_while_waiting")
+
+    def __init__(self, trace_id: Optional[str], received_ns: Optional[int]):
+        self.trace_id = trace_id
+        self.started_ns = time.perf_counter_ns()
+        self.received_ns = received_ns or self.started_ns
+        self.durations = dict.fromkeys((*WAIT_PHASES, "telemetry"), 0)
+        # Telemetria emitida durante uma espera (ex.: logs das chamadas
+        # downstream) já está contida na espera e não sai do handler_cpu
+        self._waiting = 0
+        self._telemetry_while_waiting = 0
+
+    @contextmanager
+    def waiting(self, phase: str):
+        start = time.perf_counter_ns()
+        self._waiting += 1
+        try:
+            yield
+        finally:
+            self._waiting -= 1
+            self.durations[phase] += time.perf_counter_ns() - start
+
+    def add_telemetry(self, elapsed_ns: int) -> None:
+        self.durations["telemetry"] += elapsed_ns
+        if self._waiting:
+            self._telemetry_while_waiting += elapsed_ns
+
+    def finish(self) -> dict:
+        """Duração de cada fase, em segundos."""
+        handler_ns = time.perf_counter_ns() - self.started_ns
+        waits_ns = sum(self.durations[phase] for phase in WAIT_PHASES)
+        telemetry_ns = self.durations["telemetry"] - self._telemetry_while_waiting
+        durations = {
+            "queue": self.started_ns - self.received_ns,
+            "handler_cpu": max(0, handler_ns - waits_ns - telemetry_ns),
+            **self.durations,
+        }
+        return {phase: elapsed / 1e9 for phase, elapsed in durations.items()}
+
+
+@contextmanager
+def track_request(span, route: str, received_ns: Optional[int]):
+    """
+    Mede as fases da requisição enquanto o bloco executa e, no fim, grava os
+    atributos no span e as medições no histograma. Use dentro do span.
+    """
+    if not config.PHASE_TIMING_ENABLED:
+        yield None
+        return
+
+    span_context = span.get_span_context()
+    phases = RequestPhases(
+        format(span_context.trace_id, "032x") if span_context.is_valid else None,
+        received_ns,
+    )
+    token = _current.set(phases)
+    frame = None
+    if not _HAS_TASK_CONTEXT:
+        task = asyncio.current_task()
+        frame = task.get_coro().cr_frame if task is not None else None
+        if frame is not None:
+            _request_frames[frame] = phases
+    try:
+        yield phases
+    finally:
+        _current.reset(token)
+        if frame is not None:
+            _request_frames.pop(frame, None)
+
+        durations = phases.finish()
+        recording = span.is_recording()
+        for phase, seconds in durations.items():
+            if recording:
+                span.set_attribute(f"phase.{phase}_ms", seconds * 1000)
+            phase_histogram.record(seconds, {"app": config.APP_NAME, "route": route, "phase": phase})
+
+
+@contextmanager
+def waiting(phase: str):
+    """Conta o bloco como espera (sleep, downstream, coalesced) da requisição atual."""
+    phases = _current.get()
+    if phases is None:
+        yield
+        return
+    with phases.waiting(phase):
+        yield
+
+
+def add_telemetry(start_ns: int) -> None:
+    """Soma o tempo desde start_ns (perf_counter_ns) à fase telemetry da requisição atual."""
+    phases = _current.get()
+    if phases is not None:
+        phases.add_telemetry(time.perf_counter_ns() - start_ns)
+
+
+def running_trace_id(loop: asyncio.AbstractEventLoop, frame) -> Optional[str]:
+    """
+    trace_id da requisição em execução no event loop, dado o frame amostrado
+    da thread do loop; pode ser chamado de outra thread.
+    """
+    if _HAS_TASK_CONTEXT:
+        task = asyncio.current_task(loop)
+        phases = task.get_context().get(_current) if task is not None else None
+        return phases.trace_id if phases is not None else None
+
+    frames = _request_frames.copy()
+    while frame is not None:
+        phases = frames.get(frame)
+        if phases is not None:
+            return phases.trace_id
+        frame = frame.f_back
+    return None
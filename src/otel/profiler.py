@@ -0,0 +1,175 @@
+# =============================================================================
+# PROFILER ESTATÍSTICO SOB DEMANDA
+# =============================================================================
+# Amostra as pilhas de todas as threads (sys._current_frames) a uma taxa fixa
+# durante N segundos, em uma thread própria: o event loop continua atendendo
+# normalmente e o custo é proporcional à taxa de amostragem, não à carga.
+#
+# O resultado é agregado em "collapsed stacks" (o formato do flamegraph.pl e
+# do speedscope): uma linha por pilha distinta, com os frames da raiz para a
+# folha separados por ";" e o número de amostras no fim. O primeiro frame é
+# o nome da thread. Quando a thread do event loop está executando uma task de
+# uma requisição, o segundo frame é "trace_id=<id>" (ver otel/phases.py), o
+# que separa no flamegraph o tempo de cada trace.
+#
+# Usado por POST /admin/profile (admin.py), que devolve o texto collapsed ou
+# um flamegraph em SVG (render_flamegraph).
+
+import asyncio
+import html
+import os
+import sys
+import threading
+import time
+import zlib
+from collections import Counter
+from typing import Optional
+
+from otel.phases import running_trace_id
+
+_lock = threading.Lock()
+
+
+class ProfilerBusyError(RuntimeError):
+    """Já existe um profiling em andamento neste processo."""
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    path = code.co_filename
+    filename = os.path.join(os.path.basename(os.path.dirname(path)), os.path.basename(path))
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})"
+
+
+def _collapse(frame) -> list:
+    names = []
+    while frame is not None:
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+    names.reverse()
+    return names
+
+
+def sample_stacks(seconds: float, hz: int, loop: Optional[asyncio.AbstractEventLoop] = None,
+                  loop_thread_id: Optional[int] = None) -> Counter:
+    """Amostra as pilhas por `seconds` segundos, `hz` vezes por segundo."""
+    own_thread_id = threading.get_ident()
+    interval = 1 / hz
+    stacks = Counter()
+    deadline = time.monotonic() + seconds
+    next_sample = time.monotonic()
+
+    while next_sample < deadline:
+        thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_thread_id:
+                continue
+            names = [thread_names.get(thread_id, f"thread-{thread_id}")]
+            if thread_id == loop_thread_id and loop is not None:
+                trace_id = running_trace_id(loop, frame)
+                if trace_id is not None:
+                    names.append(f"trace_id={trace_id}")
+            names.extend(_collapse(frame))
+            stacks[";".join(names)] += 1
+
+        # Intervalo fixo a partir do início, sem acumular o custo da amostragem
+        next_sample += interval
+        delay = next_sample - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        else:
+            next_sample = time.monotonic()
+    return stacks
+
+
+async def profile(seconds: float, hz: int) -> Counter:
+    """
+    Roda sample_stacks em uma thread dedicada (sem ocupar o threadpool) e
+    devolve as pilhas agregadas. Um profiling por vez por processo.
+    """
+    if not _lock.acquire(blocking=False):
+        raise ProfilerBusyError("profiling já em andamento")
+
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+    loop_thread_id = threading.get_ident()
+
+    def set_result(result):
+        if not future.done():
+            future.set_result(result)
+
+    def set_exception(exc):
+        if not future.done():
+            future.set_exception(exc)
+
+    def run():
+        try:
+            loop.call_soon_threadsafe(set_result, sample_stacks(seconds, hz, loop, loop_thread_id))
+        except Exception as exc:
+            loop.call_soon_threadsafe(set_exception, exc)
+        finally:
+            _lock.release()
+
+    threading.Thread(target=run, name="stack-sampler", daemon=True).start()
+    return await future
+
+
+def collapsed(stacks: Counter) -> str:
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+# =============================================================================
+# FLAMEGRAPH (SVG)
+# =============================================================================
+FRAME_HEIGHT = 16
+FONT_WIDTH = 7  # Largura aproximada de um caractere na fonte de 12px
+
+
+def _color(name: str) -> str:
+    # Cor estável por frame, em tons quentes como no flamegraph.pl
+    value = zlib.crc32(name.encode())
+    return f"rgb({205 + value % 50},{80 + (value >> 8) % 120},{40 + (value >> 16) % 40})"
+
+
+def render_flamegraph(stacks: Counter, width: int = 1200) -> str:
+    """Flamegraph em SVG (raiz no topo), com tooltip de amostras por frame."""
+    # Nó: [amostras, {nome do filho: nó}]
+    root = [0, {}]
+    depth = 0
+    for stack, count in stacks.items():
+        node = root
+        node[0] += count
+        frames = stack.split(";")
+        depth = max(depth, len(frames))
+        for name in frames:
+            node = node[1].setdefault(name, [0, {}])
+            node[0] += count
+
+    total = root[0] or 1
+    elements = []
+
+    def walk(children: dict, x: float, level: int):
+        for name, (count, grandchildren) in sorted(children.items()):
+            frame_width = count / total * width
+            if frame_width >= 0.5:
+                y = (level + 1) * FRAME_HEIGHT
+                label = name if len(name) * FONT_WIDTH < frame_width - 4 else name[:max(0, int(frame_width // FONT_WIDTH) - 3)] + ".."
+                title = html.escape(f"{name} ({count} amostras, {count / total:.2%})")
+                elements.append(
+                    f'<g><title>{title}</title>'
+                    f'<rect x="{x:.1f}" y="{y}" width="{frame_width:.1f}" height="{FRAME_HEIGHT - 1}" fill="{_color(name)}"/>'
+                    + (f'<text x="{x + 2:.1f}" y="{y + FRAME_HEIGHT - 4}">{html.escape(label)}</text>' if frame_width > 3 * FONT_WIDTH else "")
+                    + "</g>"
+                )
+                walk(grandchildren, x, level + 1)
+            x += frame_width
+
+    walk(root[1], 0.0, 0)
+    height = (depth + 1) * FRAME_HEIGHT
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+        f'font-family="monospace" font-size="12">'
+        f'<text x="0" y="12">{total} amostras</text>'
+        + "".join(elements)
+        + "</svg>\n"
+    )
@@ -0,0 +1,47 @@
+# =============================================================================
+# RESOURCE - IDENTIFICAÇÃO DO SERVIÇO E DA INSTÂNCIA
+# =============================================================================
+# Resource compartilhado por traces, métricas e logs. Além do nome e da versão
+# do serviço, cada processo recebe um service.instance.id próprio: com vários
+# workers no mesmo pod (launcher.py), as séries e os spans de cada worker
+# ficam separados em vez de se sobrescreverem no backend.
+#
+# O id é gerado no primeiro uso e descartado no processo filho após um
+# fork(), para que cada worker gere o seu.
+
+import os
+import uuid
+
+import config
+
+_instance_id = None
+
+
+def _reset_instance_id():
+    global _instance_id
+    _instance_id = None
+
+
+os.register_at_fork(after_in_child=_reset_instance_id)
+
+
+def service_resource():
+    """Resource do serviço com o service.instance.id deste processo."""
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.semconv.attributes.service_attributes import (
+        SERVICE_NAME,
+        SERVICE_VERSION
+    )
+
+    global _instance_id
+    if _instance_id is None:
+        _instance_id = str(uuid.uuid4())
+
+    return Resource.create({
+        SERVICE_NAME: config.APP_NAME,
+        SERVICE_VERSION: "1.0.0",
+        # service.instance.id e process.pid ainda são atributos "incubating"
+        # nas semantic conventions, por isso os nomes literais
+        "service.instance.id": _instance_id,
+        "process.pid": os.getpid(),
+    })
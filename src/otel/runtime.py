@@ -0,0 +1,267 @@
+# =============================================================================
+# MÓDULO DE MÉTRICAS DE RUNTIME - PROCESSO, GC, EVENT LOOP E THREADPOOL
+# =============================================================================
+# Sinais usados para dimensionar pods e detectar starvation do threadpool:
+#   - RSS, memória (%), CPU (user/system), file descriptors e threads (psutil)
+#   - Coletas e pausas do garbage collector por geração
+#   - Atraso (lag) do event loop do asyncio
+#   - Ocupação do threadpool do Starlette (limiter padrão do anyio)
+#
+# Amostragem compartilhada: RuntimeSampler faz no máximo uma leitura do
+# psutil por RUNTIME_SAMPLE_INTERVAL_MS, não importa quantos readers
+# (Prometheus, OTLP) ou callbacks observáveis peçam o valor.
+
+import asyncio
+import collections
+import gc
+import threading
+import time
+from typing import Iterable, Optional
+
+import anyio.to_thread
+from opentelemetry.metrics import CallbackOptions, Observation
+
+import config
+from otel.metrics import limit_cardinality, meter
+
+ATTRIBUTES = {"service": config.APP_NAME}
+
+
+# =============================================================================
+# AMOSTRA DO PROCESSO (psutil)
+# =============================================================================
+class ProcessSample:
+    __slots__ = ("rss", "memory_percent", "cpu_user", "cpu_system", "open_fds", "threads")
+
+    def __init__(self, rss, memory_percent, cpu_user, cpu_system, open_fds, threads):
+        self.rss = rss
+        self.memory_percent = memory_percent
+        self.cpu_user = cpu_user
+        self.cpu_system = cpu_system
+        self.open_fds = open_fds
+        self.threads = threads
+
+
+class RuntimeSampler:
+    """
+    Lê o processo via psutil no máximo uma vez por intervalo. Sem proc, o
+    psutil só é importado na primeira leitura (fora do caminho de import).
+    """
+
+    def __init__(self, proc, interval_ms: float):
+        self._process = proc
+        self._interval = interval_ms / 1000
+        self._sample: Optional[ProcessSample] = None
+        self._taken_at = 0.0
+        self._lock = threading.Lock()
+
+    def sample(self) -> ProcessSample:
+        with self._lock:
+            now = time.monotonic()
+            if self._sample is None or now - self._taken_at >= self._interval:
+                self._sample = self._read()
+                self._taken_at = now
+            return self._sample
+
+    def _read(self) -> ProcessSample:
+        if self._process is None:
+            import psutil
+
+            self._process = psutil.Process()
+        # oneshot() agrupa as leituras de /proc em uma única passada
+        with self._process.oneshot():
+            memory = self._process.memory_info()
+            cpu = self._process.cpu_times()
+            try:
+                open_fds = self._process.num_fds()
+            except AttributeError:  # Windows não tem num_fds
+                open_fds = 0
+            return ProcessSample(
+                rss=memory.rss,
+                memory_percent=self._process.memory_percent(memtype="rss"),
+                cpu_user=cpu.user,
+                cpu_system=cpu.system,
+                open_fds=open_fds,
+                threads=self._process.num_threads(),
+            )
+
+
+runtime_sampler = RuntimeSampler(None, config.RUNTIME_SAMPLE_INTERVAL_MS)
+
+
+def _observe_rss(options: CallbackOptions) -> Iterable[Observation]:
+    yield Observation(runtime_sampler.sample().rss, ATTRIBUTES)
+
+
+def _observe_cpu(options: CallbackOptions) -> Iterable[Observation]:
+    sample = runtime_sampler.sample()
+    yield Observation(sample.cpu_user, {**ATTRIBUTES, "mode": "user"})
+    yield Observation(sample.cpu_system, {**ATTRIBUTES, "mode": "system"})
+
+
+def _observe_fds(options: CallbackOptions) -> Iterable[Observation]:
+    yield Observation(runtime_sampler.sample().open_fds, ATTRIBUTES)
+
+
+def _observe_threads(options: CallbackOptions) -> Iterable[Observation]:
+    yield Observation(runtime_sampler.sample().threads, ATTRIBUTES)
+
+
+meter.create_observable_gauge(
+    name="app_runtime_memory_rss_bytes",
+    description="Memória residente (RSS) do processo",
+    unit="By",
+    callbacks=[_observe_rss],
+)
+
+meter.create_observable_counter(
+    name="app_runtime_cpu_seconds_total",
+    description="Tempo de CPU consumido pelo processo, por modo",
+    unit="s",
+    callbacks=[_observe_cpu],
+)
+
+meter.create_observable_gauge(
+    name="app_runtime_open_fds",
+    description="File descriptors abertos pelo processo",
+    unit="1",
+    callbacks=[_observe_fds],
+)
+
+meter.create_observable_gauge(
+    name="app_runtime_threads",
+    description="Threads do processo",
+    unit="1",
+    callbacks=[_observe_threads],
+)
+
+
+# =============================================================================
+# GARBAGE COLLECTOR
+# =============================================================================
+# gc.callbacks é chamado no início e no fim de cada coleta; a diferença entre
+# os dois instantes é a pausa causada pela coleta.
+# O callback NÃO grava direto no histograma: a coleta pode acontecer enquanto
+# o próprio SDK de métricas segura um lock (ex.: durante um collect()), e
+# gravar ali causaria deadlock. As pausas ficam em uma fila limitada e são
+# gravadas pelo monitor do event loop (ver drain_gc_pauses).
+gc_pause_histogram = limit_cardinality(
+    meter.create_histogram,
+    name="app_runtime_gc_pause_seconds",
+    description="Duração das pausas do garbage collector por geração",
+    unit="s",
+    explicit_bucket_boundaries_advisory=[0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1],
+)
+
+_gc_started_at = 0.0
+_gc_pauses = collections.deque(maxlen=1024)
+
+
+def _gc_callback(phase, info):
+    global _gc_started_at
+    if phase == "start":
+        _gc_started_at = time.perf_counter()
+    elif _gc_started_at:
+        _gc_pauses.append((info["generation"], time.perf_counter() - _gc_started_at))
+        _gc_started_at = 0.0
+
+
+def drain_gc_pauses():
+    """Grava no histograma as pausas acumuladas pelo callback do GC."""
+    while _gc_pauses:
+        generation, pause = _gc_pauses.popleft()
+        gc_pause_histogram.record(pause, {**ATTRIBUTES, "generation": str(generation)})
+
+
+def _observe_gc_collections(options: CallbackOptions) -> Iterable[Observation]:
+    for generation, stats in enumerate(gc.get_stats()):
+        yield Observation(stats["collections"], {**ATTRIBUTES, "generation": str(generation)})
+
+
+meter.create_observable_counter(
+    name="app_runtime_gc_collections_total",
+    description="Coletas do garbage collector por geração",
+    unit="1",
+    callbacks=[_observe_gc_collections],
+)
+
+
+# O callback é instalado por setup_telemetry() (otel/telemetry.py)
+def install_gc_callback():
+    if _gc_callback not in gc.callbacks:
+        gc.callbacks.append(_gc_callback)
+
+
+def uninstall_gc_callback():
+    if _gc_callback in gc.callbacks:
+        gc.callbacks.remove(_gc_callback)
+
+
+# =============================================================================
+# EVENT LOOP E THREADPOOL
+# =============================================================================
+# O monitor é uma task no próprio event loop: dorme por um intervalo fixo e
+# mede quanto acordou atrasado (lag). Na mesma passada lê o limiter do anyio,
+# que limita as threads usadas pelo Starlette para handlers síncronos e
+# run_in_threadpool. Essas leituras só podem ser feitas de dentro do loop.
+event_loop_lag_histogram = limit_cardinality(
+    meter.create_histogram,
+    name="app_runtime_event_loop_lag_seconds",
+    description="Atraso do event loop do asyncio, medido a cada intervalo do monitor",
+    unit="s",
+    explicit_bucket_boundaries_advisory=[0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5],
+)
+
+
+class LoopStats:
+    __slots__ = ("lag", "threadpool_in_use", "threadpool_capacity", "threadpool_waiting")
+
+    def __init__(self):
+        self.lag = 0.0
+        self.threadpool_in_use = 0
+        self.threadpool_capacity = 0
+        self.threadpool_waiting = 0
+
+
+loop_stats = LoopStats()
+
+
+async def monitor_event_loop(interval_ms: float):
+    """Task que mede o lag do event loop e a ocupação do threadpool."""
+    interval = interval_ms / 1000
+    limiter = anyio.to_thread.current_default_thread_limiter()
+    while True:
+        expected = time.perf_counter() + interval
+        await asyncio.sleep(interval)
+        lag = max(0.0, time.perf_counter() - expected)
+
+        event_loop_lag_histogram.record(lag, ATTRIBUTES)
+        drain_gc_pauses()
+
+        statistics = limiter.statistics()
+        loop_stats.lag = lag
+        loop_stats.threadpool_in_use = statistics.borrowed_tokens
+        loop_stats.threadpool_capacity = statistics.total_tokens
+        loop_stats.threadpool_waiting = statistics.tasks_waiting
+
+
+def start_event_loop_monitor() -> asyncio.Task:
+    """Inicia o monitor no event loop em execução (chamar no lifespan)."""
+    return asyncio.get_running_loop().create_task(
+        monitor_event_loop(config.RUNTIME_LOOP_MONITOR_INTERVAL_MS),
+        name="runtime-event-loop-monitor",
+    )
+
+
+def _observe_threadpool(options: CallbackOptions) -> Iterable[Observation]:
+    yield Observation(loop_stats.threadpool_in_use, {**ATTRIBUTES, "state": "in_use"})
+    yield Observation(loop_stats.threadpool_capacity, {**ATTRIBUTES, "state": "capacity"})
+    yield Observation(loop_stats.threadpool_waiting, {**ATTRIBUTES, "state": "waiting"})
+
+
+meter.create_observable_gauge(
+    name="app_runtime_threadpool_tokens",
+    description="Threads do threadpool do Starlette em uso, capacidade e tarefas aguardando",
+    unit="1",
+    callbacks=[_observe_threadpool],
+)
@@ -0,0 +1,169 @@
+# =============================================================================
+# MÓDULO DE AMOSTRAGEM - HEAD SAMPLING E TAIL SAMPLING LOCAL
+# =============================================================================
+# Head sampling: decide no início do trace se ele será gravado. Usamos
+# ParentBased(TraceIdRatioBased), que respeita a decisão do serviço anterior
+# (via traceparent) e aplica a razão configurada apenas nos traces novos.
+#
+# Tail sampling: decide depois que o trace local terminou. O
+# TailSamplingSpanProcessor guarda os spans de cada trace até o span raiz local
+# terminar e então:
+#   - mantém sempre traces com algum span em StatusCode.ERROR
+#   - mantém sempre traces cujo span raiz foi mais lento que o limite
+#   - mantém uma fração dos traces rápidos e bem-sucedidos
+# A fração é calculada a partir do trace_id, então todos os serviços da cadeia
+# tomam a mesma decisão para o mesmo trace.
+
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+from opentelemetry import metrics
+from opentelemetry.context import Context
+from opentelemetry.sdk.trace import ReadableSpan, Span, SpanProcessor
+from opentelemetry.sdk.trace.sampling import ParentBased, Sampler, TraceIdRatioBased
+from opentelemetry.trace import StatusCode
+
+import config
+
+_TRACE_ID_LOW_MASK = (1 << 64) - 1
+
+
+def build_sampler(ratio: float) -> Sampler:
+    """Sampler de head sampling: ParentBased com razão para traces novos."""
+    return ParentBased(root=TraceIdRatioBased(ratio))
+
+
+class ReconfigurableSampler(Sampler):
+    """
+    Sampler cuja razão pode ser trocada em runtime (ver admin.py). A troca
+    substitui o sampler interno inteiro, então cada decisão usa uma razão
+    consistente mesmo durante a alteração.
+    """
+
+    def __init__(self, ratio: float):
+        self.set_ratio(ratio)
+
+    @property
+    def ratio(self) -> float:
+        return self._ratio
+
+    def set_ratio(self, ratio: float) -> None:
+        self._delegate = build_sampler(ratio)
+        self._ratio = ratio
+
+    def should_sample(self, parent_context, trace_id, name, kind=None, attributes=None, links=None, trace_state=None):
+        return self._delegate.should_sample(
+            parent_context, trace_id, name, kind=kind, attributes=attributes, links=links, trace_state=trace_state,
+        )
+
+    def get_description(self) -> str:
+        return f"Reconfigurable{{{self._delegate.get_description()}}}"
+
+
+# Contador de decisões do tail sampling
+tail_sampling_counter = metrics.get_meter(config.APP_NAME).create_counter(
+    name="app_tail_sampling_traces_total",
+    description="Traces locais mantidos ou descartados pelo tail sampling",
+    unit="1",
+)
+
+
+class _TraceBuffer:
+    __slots__ = ("spans", "has_error")
+
+    def __init__(self):
+        self.spans = []
+        self.has_error = False
+
+
+class TailSamplingSpanProcessor(SpanProcessor):
+    """
+    Processador que bufferiza os spans de cada trace local e só repassa ao
+    processador seguinte (ex.: BatchSpanProcessor) os traces mantidos.
+    A memória é limitada por max_traces e max_spans_per_trace.
+    """
+
+    def __init__(
+        self,
+        next_processor: SpanProcessor,
+        latency_threshold_ms: float = 500,
+        success_ratio: float = 0.1,
+        max_traces: int = 1000,
+        max_spans_per_trace: int = 256,
+    ):
+        self._next = next_processor
+        self._latency_threshold_ns = int(latency_threshold_ms * 1_000_000)
+        self._success_bound = int(success_ratio * (1 << 64))
+        self._max_traces = max_traces
+        self._max_spans_per_trace = max_spans_per_trace
+        self._traces = OrderedDict()
+        self._lock = threading.Lock()
+
+    def on_start(self, span: Span, parent_context: Optional[Context] = None) -> None:
+        self._next.on_start(span, parent_context=parent_context)
+
+    def on_end(self, span: ReadableSpan) -> None:
+        trace_id = span.context.trace_id
+        evicted = None
+
+        with self._lock:
+            buffer = self._traces.get(trace_id)
+            if buffer is None:
+                buffer = self._traces[trace_id] = _TraceBuffer()
+                if len(self._traces) > self._max_traces:
+                    evicted = self._traces.popitem(last=False)[1]
+
+            if span.status.status_code is StatusCode.ERROR:
+                buffer.has_error = True
+            if len(buffer.spans) < self._max_spans_per_trace:
+                buffer.spans.append(span)
+
+            # O trace local termina quando o span raiz local termina
+            is_local_root = span.parent is None or span.parent.is_remote
+            if is_local_root:
+                del self._traces[trace_id]
+
+        if evicted is not None:
+            self._flush_partial(evicted, "evicted")
+
+        if is_local_root:
+            self._decide(trace_id, span, buffer)
+
+    def _decide(self, trace_id: int, root: ReadableSpan, buffer: _TraceBuffer) -> None:
+        if buffer.has_error:
+            reason = "error"
+        elif root.end_time - root.start_time >= self._latency_threshold_ns:
+            reason = "slow"
+        elif (trace_id & _TRACE_ID_LOW_MASK) < self._success_bound:
+            reason = "sampled"
+        else:
+            tail_sampling_counter.add(1, {"decision": "dropped", "reason": "fast_success"})
+            return
+
+        tail_sampling_counter.add(1, {"decision": "kept", "reason": reason})
+        for span in buffer.spans:
+            self._next.on_end(span)
+
+    def _flush_partial(self, buffer: _TraceBuffer, reason: str) -> None:
+        """Trace removido antes de terminar: mantém apenas se já tinha erro."""
+        if buffer.has_error:
+            tail_sampling_counter.add(1, {"decision": "kept", "reason": "error"})
+            for span in buffer.spans:
+                self._next.on_end(span)
+        else:
+            tail_sampling_counter.add(1, {"decision": "dropped", "reason": reason})
+
+    def _drain(self) -> None:
+        with self._lock:
+            pending = list(self._traces.values())
+            self._traces.clear()
+        for buffer in pending:
+            self._flush_partial(buffer, "shutdown")
+
+    def shutdown(self) -> None:
+        self._drain()
+        self._next.shutdown()
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        return self._next.force_flush(timeout_millis)
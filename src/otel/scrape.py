@@ -0,0 +1,90 @@
+# =============================================================================
+# MÓDULO DE SCRAPE - ENDPOINT /metrics COM CACHE
+# =============================================================================
+# Cada chamada a generate_latest() executa todos os callbacks observáveis e
+# serializa o registry inteiro. Com várias réplicas do Prometheus fazendo
+# scrape, isso vira um pico de CPU por scrape.
+#
+# MetricsScrapeCache mantém um snapshot por formato (Prometheus text ou
+# OpenMetrics) válido por METRICS_SCRAPE_CACHE_TTL_MS. Scrapes concorrentes
+# esperam a mesma coleta em um asyncio.Lock, sem ocupar threads do
+# threadpool; a coleta em si roda no threadpool para não bloquear o event loop.
+# A versão gzip do snapshot é gerada uma única vez, sob demanda.
+
+import asyncio
+import gzip
+import time
+
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import Response
+
+import config
+from otel.metrics import scrape_duration_histogram
+
+
+class _Snapshot:
+    __slots__ = ("body", "gzipped", "created")
+
+    def __init__(self, body, created):
+        self.body = body
+        self.gzipped = None
+        self.created = created
+
+
+class MetricsScrapeCache:
+    def __init__(self, registry=None, ttl_ms=None):
+        self._registry = registry
+        self._ttl_ms = ttl_ms
+        self._snapshots = {}
+        self._lock = None
+
+    @property
+    def registry(self):
+        # Com METRICS_MULTIPROC_DIR, o scrape usa o registry que agrega os
+        # workers; ele só existe depois de setup_telemetry()
+        from prometheus_client import REGISTRY
+        from otel import multiprocess
+
+        return self._registry or multiprocess.multiprocess_registry or REGISTRY
+
+    @property
+    def ttl(self):
+        ttl_ms = self._ttl_ms if self._ttl_ms is not None else config.METRICS_SCRAPE_CACHE_TTL_MS
+        return ttl_ms / 1000
+
+    async def render(self, accept, accept_encoding):
+        """Retorna a resposta do scrape, reaproveitando o snapshot se ainda válido."""
+        # prometheus_client só é importado no primeiro scrape (ou no setup das métricas)
+        from prometheus_client.exposition import choose_encoder, gzip_accepted
+
+        start = time.perf_counter()
+        encoder, content_type = choose_encoder(accept)
+
+        # O lock é criado no event loop em execução
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+
+        cache_status = "hit"
+        async with self._lock:
+            snapshot = self._snapshots.get(content_type)
+            if snapshot is None or time.monotonic() - snapshot.created >= self.ttl:
+                cache_status = "miss"
+                body = await run_in_threadpool(encoder, self.registry)
+                snapshot = self._snapshots[content_type] = _Snapshot(body, time.monotonic())
+
+        headers = {"Vary": "Accept, Accept-Encoding"}
+        body = snapshot.body
+        if gzip_accepted(accept_encoding):
+            if snapshot.gzipped is None:
+                snapshot.gzipped = gzip.compress(snapshot.body, compresslevel=config.METRICS_SCRAPE_GZIP_LEVEL)
+            body = snapshot.gzipped
+            headers["Content-Encoding"] = "gzip"
+
+        scrape_duration_histogram.record(
+            time.perf_counter() - start,
+            {"format": "openmetrics" if "openmetrics" in content_type else "prometheus", "cache": cache_status},
+        )
+        return Response(body, media_type=content_type, headers=headers)
+
+
+scrape_cache = MetricsScrapeCache()
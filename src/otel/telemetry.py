@@ -0,0 +1,98 @@
+# =============================================================================
+# MÓDULO DE TELEMETRIA - SETUP E SHUTDOWN
+# =============================================================================
+# Importar os módulos otel.* não cria providers, exportadores nem threads: os
+# instrumentos, o tracer e o logger usam os proxies da API do OpenTelemetry,
+# que passam a gravar assim que os providers do SDK são definidos aqui.
+#
+# setup_telemetry() é chamado no startup da aplicação (lifespan de
+# create_app, em app.py) e shutdown_telemetry() no encerramento, que exporta o
+# que ainda está nas filas antes de parar as threads. Os providers globais do
+# OpenTelemetry só podem ser definidos uma vez por processo: um novo setup
+# depois do shutdown não faz nada.
+#
+# Com pre-fork (launcher.py), o setup acontece em cada worker, depois do
+# fork(): cada um cria os próprios providers, exportadores e threads, com um
+# service.instance.id distinto (otel/resource.py). As threads de exportação
+# não sobrevivem ao fork(), então um filho de um processo que já configurou a
+# telemetria não exporta nada; fork_safe_check() impede esse caso no launcher.
+
+import atexit
+import os
+import threading
+import time
+
+import config
+from otel import logs, metrics, runtime, tracing
+
+_lock = threading.Lock()
+_state = "idle"  # idle -> running -> stopped
+
+
+def setup_telemetry() -> None:
+    """Cria os providers de métricas, traces e logs (uma vez por processo)."""
+    # multiprocess importa o prometheus_client; fica fora do import do módulo
+    from otel import multiprocess
+
+    global _state
+    with _lock:
+        if _state != "idle":
+            return
+        start = time.perf_counter()
+        metrics.setup_metrics()
+        tracing.setup_tracing()
+        logs.setup_logs()
+        runtime.install_gc_callback()
+        # Snapshots das métricas deste worker para o modo multiprocess
+        if multiprocess.multiprocess_store is not None:
+            multiprocess.multiprocess_store.start()
+        # Processos que não passam pelo lifespan (scripts, testes) também
+        # exportam o que ficou nas filas ao sair
+        atexit.register(shutdown_telemetry)
+        _state = "running"
+
+    logs.logger.info(
+        "Telemetria iniciada",
+        extra={
+            "service_name": config.APP_NAME,
+            "operation": "telemetry_setup",
+            "setup_duration_ms": (time.perf_counter() - start) * 1000,
+        },
+    )
+
+
+def shutdown_telemetry() -> None:
+    """Exporta o que está pendente e encerra providers e threads de exportação."""
+    from otel import multiprocess
+
+    global _state
+    with _lock:
+        if _state != "running":
+            return
+        _state = "stopped"
+
+        if multiprocess.multiprocess_store is not None:
+            multiprocess.multiprocess_store.stop()
+        runtime.uninstall_gc_callback()
+        # Logs por último: o encerramento dos demais ainda pode gerar registros
+        for provider in (tracing.provider, metrics.meter_provider, logs.logger_provider):
+            if provider is not None:
+                provider.shutdown()
+
+
+def fork_safe_check() -> None:
+    """Falha se a telemetria já foi configurada neste processo (chamar antes de fork())."""
+    if _state != "idle":
+        raise RuntimeError("a telemetria deve ser configurada nos workers, depois do fork()")
+
+
+def _after_fork_in_child() -> None:
+    # Os providers herdados apontam para threads que só existem no processo
+    # pai: o filho não tenta exportar nem encerrar o que não é seu
+    global _lock, _state
+    _lock = threading.Lock()
+    if _state == "running":
+        _state = "stopped"
+
+
+os.register_at_fork(after_in_child=_after_fork_in_child)
@@ -6,80 +6,137 @@
 # de diferentes serviços, identificando onde ocorrem gargalos e erros
 
 # Importações necessárias para trabalhar com tracing OpenTelemetry
+# Só a API é importada aqui: o SDK, os processadores e os exportadores são
+# criados em setup_tracing(), chamado no startup da aplicação
+# (otel/telemetry.py). Até lá o tracer global é um proxy que não grava nada.
 from opentelemetry import trace
-from opentelemetry.sdk.trace import TracerProvider
-from opentelemetry.sdk.resources import Resource
-from config import APP_NAME, OTLP_ENDPOINT
-from opentelemetry.semconv.attributes.service_attributes import (
-    SERVICE_NAME,
-    SERVICE_VERSION
-)
-from opentelemetry.sdk.trace.export import (
-    BatchSpanProcessor,
-    ConsoleSpanExporter,
-)
-
-from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+import hashlib
+import time
+import config
+from config import APP_NAME
 from opentelemetry.trace.propagation.tracecontext import TraceContextTextMapPropagator
+from otel import phases
 
 # =============================================================================
 # CONFIGURAÇÃO DO ENDPOINT OTLP
 # =============================================================================
 # OTLP (OpenTelemetry Protocol): Protocolo padrão para enviar telemetria
-# Este endpoint receberá os traces e os enviará para o sistema de observabilidade
-TRACE_OTLP_ENDPOINT = f"{OTLP_ENDPOINT}/v1/traces"
+# O exportador é criado por otel/exporters.py, que monta o endpoint dos traces
+# a partir de OTLP_ENDPOINT conforme o transporte (OTLP_PROTOCOL)
 
-# =============================================================================
-# RECURSO (RESOURCE) - METADADOS DO SERVIÇO
-# =============================================================================
-# Resource: Define informações sobre o serviço que está gerando os traces
-# Essas informações ajudam a identificar de qual serviço/versão vêm os dados
-resource = Resource.create({
-    SERVICE_NAME: APP_NAME,        # Nome do serviço
-    SERVICE_VERSION: "1.0.0"       # Versão do serviço
-})
+# Sampler e provider criados por setup_tracing()
+sampler = None
+provider = None
 
-# =============================================================================
-# TRACER PROVIDER - CONFIGURAÇÃO CENTRAL DO TRACING
-# =============================================================================
-# TracerProvider: É o ponto central de configuração para tracing
-# Define como os traces serão processados e exportados
-provider = TracerProvider(resource=resource)
 
-# =============================================================================
-# PROCESSADORES DE SPANS (SPAN PROCESSORS)
-# =============================================================================
-# Span Processor: Define como os spans (segmentos de trace) serão processados
-# BatchSpanProcessor: Agrupa spans em lotes para envio eficiente
+def setup_tracing():
+    """Cria o TracerProvider com seus processadores e o define como global."""
+    global sampler, provider
 
-# Processador para console - útil para desenvolvimento/debug
-# Envia os traces para o console (terminal) para visualização local
-processor_console = BatchSpanProcessor(ConsoleSpanExporter())
+    from opentelemetry.sdk.trace import SpanLimits, TracerProvider
+    from opentelemetry.sdk.trace.sampling import ALWAYS_OFF
+    from otel.resource import service_resource
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor
+    from otel.sampling import ReconfigurableSampler, TailSamplingSpanProcessor
 
-# Processador para OTLP - envia traces para sistema de observabilidade
-# Este é o processador usado em produção
-processor_otlp = BatchSpanProcessor(OTLPSpanExporter(endpoint=TRACE_OTLP_ENDPOINT))
+    # =========================================================================
+    # RECURSO (RESOURCE) - METADADOS DO SERVIÇO
+    # =========================================================================
+    # Resource: Define informações sobre o serviço que está gerando os traces
+    # Essas informações ajudam a identificar de qual serviço/versão vêm os dados
+    # e, com vários workers, de qual processo (service.instance.id)
+    resource = service_resource()
 
-# =============================================================================
-# CONFIGURAÇÃO DOS PROCESSADORES
-# =============================================================================
-# Comentado o processador de console para não poluir o terminal
-# provider.add_span_processor(processor_console)
+    # =========================================================================
+    # TRACER PROVIDER - CONFIGURAÇÃO CENTRAL DO TRACING
+    # =========================================================================
+    # TracerProvider: É o ponto central de configuração para tracing
+    # Define como os traces serão processados e exportados
+    # O sampler decide no início de cada trace se ele será gravado (head sampling).
+    # Com ParentBased, o serviço segue a decisão de quem o chamou (traceparent).
+    # SpanLimits: limita o tamanho de cada span (tamanho dos valores de atributo,
+    # quantidade de atributos e de eventos), protegendo CPU, memória da fila do
+    # BatchSpanProcessor e banda até o collector
+    # A razão do head sampling pode ser alterada em runtime (sampler.set_ratio)
+    # Com TELEMETRY_TRACES_ENABLED=false nenhum span é gravado (ALWAYS_OFF), mas o
+    # traceparent continua sendo propagado entre os serviços
+    # O encerramento é feito por shutdown_telemetry() (otel/telemetry.py)
+    sampler = ReconfigurableSampler(config.TRACE_SAMPLING_RATIO)
 
-# Adiciona o processador OTLP que enviará os traces para o sistema de observabilidade
-provider.add_span_processor(processor_otlp)
+    provider = TracerProvider(
+        resource=resource,
+        sampler=sampler if config.TELEMETRY_TRACES_ENABLED else ALWAYS_OFF,
+        span_limits=SpanLimits(
+            max_attribute_length=config.SPAN_MAX_ATTRIBUTE_LENGTH,
+            max_span_attributes=config.SPAN_MAX_ATTRIBUTES,
+            max_events=config.SPAN_MAX_EVENTS,
+            max_event_attributes=config.SPAN_MAX_ATTRIBUTES,
+        ),
+        shutdown_on_exit=False,
+    )
+
+    # =========================================================================
+    # PROCESSADORES DE SPANS (SPAN PROCESSORS)
+    # =========================================================================
+    # Span Processor: Define como os spans (segmentos de trace) serão processados
+    # BatchSpanProcessor: Agrupa spans em lotes para envio eficiente
+    # Para depurar localmente, um BatchSpanProcessor(ConsoleSpanExporter())
+    # envia os traces para o console; não é criado para não poluir o terminal
+    # nem manter uma thread de exportação ociosa
+    if not config.TELEMETRY_TRACES_ENABLED:
+        trace.set_tracer_provider(provider)
+        return provider
+
+    if config.EXPORT_QUEUE_DIR:
+        from otel.persistent_queue import create_persistent_exporter
+
+        exporter = create_persistent_exporter("traces")
+    else:
+        from otel.exporters import create_exporter
+
+        exporter = create_exporter("traces")
+
+    # Processador para OTLP - envia traces para sistema de observabilidade
+    # Este é o processador usado em produção; fila e lotes vêm de config.py
+    # Com EXPORT_QUEUE_DIR, os lotes passam pela fila persistente em disco
+    processor_otlp = BatchSpanProcessor(
+        exporter,
+        max_queue_size=config.SPAN_EXPORT_MAX_QUEUE_SIZE,
+        max_export_batch_size=config.SPAN_EXPORT_MAX_BATCH_SIZE,
+        schedule_delay_millis=config.SPAN_EXPORT_SCHEDULE_DELAY_MS,
+        export_timeout_millis=config.SPAN_EXPORT_TIMEOUT_MS,
+    )
+
+    # Adiciona o processador OTLP que enviará os traces para o sistema de observabilidade
+    # Com tail sampling habilitado, os spans passam antes pelo TailSamplingSpanProcessor,
+    # que só repassa ao BatchSpanProcessor os traces locais mantidos
+    if config.TAIL_SAMPLING_ENABLED:
+        provider.add_span_processor(
+            TailSamplingSpanProcessor(
+                processor_otlp,
+                latency_threshold_ms=config.TAIL_SAMPLING_LATENCY_MS,
+                success_ratio=config.TAIL_SAMPLING_SUCCESS_RATIO,
+                max_traces=config.TAIL_SAMPLING_MAX_TRACES,
+                max_spans_per_trace=config.TAIL_SAMPLING_MAX_SPANS_PER_TRACE,
+            )
+        )
+    else:
+        provider.add_span_processor(processor_otlp)
+
+    # =========================================================================
+    # CONFIGURAÇÃO GLOBAL DO TRACING
+    # =========================================================================
+    # Define o provider como global para toda a aplicação
+    trace.set_tracer_provider(provider)
+    return provider
 
-# =============================================================================
-# CONFIGURAÇÃO GLOBAL DO TRACING
-# =============================================================================
-# Define o provider como global para toda a aplicação
-trace.set_tracer_provider(provider)
 
 # =============================================================================
 # TRACER - INSTRUMENTO PRINCIPAL PARA CRIAR SPANS
 # =============================================================================
 # Tracer: É o instrumento principal para criar spans (segmentos de trace)
 # Cada serviço deve ter seu próprio tracer identificado pelo nome
+# Antes de setup_tracing() é um proxy; depois passa a usar o provider do SDK
 tracer = trace.get_tracer(APP_NAME)
 
 # =============================================================================
@@ -89,4 +146,44 @@ tracer = trace.get_tracer(APP_NAME)
 # entre diferentes serviços através de headers HTTP ou outros meios
 # Permite que uma requisição mantenha seu contexto de trace ao atravessar
 # múltiplos serviços (ex: API Gateway -> Serviço A -> Serviço B)
-propagator = TraceContextTextMapPropagator()
\ No newline at end of file
+propagator = TraceContextTextMapPropagator()
+
+# =============================================================================
+# ATRIBUTOS DE PAYLOAD
+# =============================================================================
+# O payload cresce um elemento por hop e não tem limite de tamanho. Em vez de
+# gravar str(payload) inteiro no span, SPAN_PAYLOAD_MODE define o formato:
+#   "summary" -> <prefixo>.length, <prefixo>.bytes e <prefixo>.hash (padrão)
+#   "full"    -> str() dos primeiros SPAN_PAYLOAD_MAX_ITEMS elementos
+def set_payload_attributes(span, prefix, payload):
+    """Grava um payload no span conforme SPAN_PAYLOAD_MODE."""
+    if not span.is_recording():
+        return
+
+    # Tempo na fase "telemetry" da requisição (otel/phases.py)
+    start = time.perf_counter_ns()
+    try:
+        _set_payload_attributes(span, prefix, payload)
+    finally:
+        phases.add_telemetry(start)
+
+
+def _set_payload_attributes(span, prefix, payload):
+    if config.SPAN_PAYLOAD_MODE == "full":
+        max_items = config.SPAN_PAYLOAD_MAX_ITEMS
+        span.set_attribute(prefix, str(payload[:max_items]))
+        if len(payload) > max_items:
+            span.set_attribute(f"{prefix}.truncated_items", len(payload) - max_items)
+        return
+
+    digest = hashlib.blake2b(digest_size=8)
+    size = 0
+    for item in payload:
+        encoded = str(item).encode()
+        size += len(encoded)
+        digest.update(encoded)
+        digest.update(b"\0")
+
+    span.set_attribute(f"{prefix}.length", len(payload))
+    span.set_attribute(f"{prefix}.bytes", size)
+    span.set_attribute(f"{prefix}.hash", digest.hexdigest())
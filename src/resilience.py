@@ -0,0 +1,356 @@
+# =============================================================================
+# RESILIÊNCIA DAS CHAMADAS DOWNSTREAM
+# =============================================================================
+# Envolve cada chamada de downstream.py com três mecanismos por destino:
+#
+#   - Circuit breaker: depois de BREAKER_FAILURE_THRESHOLD falhas seguidas
+#     (erro de conexão, timeout ou status 5xx) o destino fica "open" e as
+#     chamadas falham na hora, sem esperar o timeout. Após BREAKER_OPEN_MS
+#     passa a "half_open" e deixa BREAKER_HALF_OPEN_MAX_CALLS chamadas de
+#     teste passarem: sucesso fecha o circuito, falha o reabre.
+#
+#   - Retry com orçamento (token bucket): falhas transitórias (conexão,
+#     timeout, 502/503/504) são repetidas até RETRY_MAX_RETRIES vezes, com
+#     backoff exponencial e jitter. Cada chamada deposita RETRY_BUDGET_RATIO
+#     token e cada retry gasta um: com o destino fora do ar, os retries ficam
+#     limitados a ~10% (padrão) do tráfego em vez de multiplicá-lo.
+#
+#   - Hedging (HEDGE_ENABLED): se a resposta demora mais que o percentil
+#     HEDGE_PERCENTILE das latências observadas para o destino, uma segunda
+#     requisição é enviada e vale a primeira que responder com sucesso. O
+#     hedge também gasta um token do orçamento de retry.
+#
+# As latências de cada destino são agregadas nos mesmos buckets de
+# app_response_time_seconds (RESPONSE_TIME_BUCKETS); o percentil é o limite
+# superior do bucket que o contém, como no histogram_quantile do Prometheus.
+# A cada HEDGE_WINDOW amostras as contagens caem pela metade, para o limiar
+# acompanhar mudanças de latência.
+#
+# Estado do breaker, retries, hedges e rejeições viram métricas
+# (app_circuit_breaker_*, app_downstream_*) e atributos do span da chamada.
+# Tudo roda no event loop, então o estado não precisa de locks.
+
+import asyncio
+import random
+import time
+from typing import Awaitable, Callable, Dict, Iterable, Optional
+
+from opentelemetry.metrics import CallbackOptions, Observation
+
+import config
+from otel.metrics import RESPONSE_TIME_BUCKETS, limit_cardinality, meter
+
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+# Status que indicam falha transitória e podem ser repetidos
+RETRYABLE_STATUSES = {502, 503, 504}
+
+
+class CircuitOpenError(Exception):
+    """Chamada rejeitada sem ser enviada: circuito aberto para o destino."""
+
+    def __init__(self, destination: str):
+        super().__init__(f"circuit breaker aberto para {destination}")
+        self.destination = destination
+
+
+# =============================================================================
+# CIRCUIT BREAKER
+# =============================================================================
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int, open_ms: float, half_open_max_calls: int,
+                 on_transition: Optional[Callable[[str], None]] = None):
+        self.state = CLOSED
+        self._failure_threshold = failure_threshold
+        self._open_s = open_ms / 1000
+        self._half_open_max_calls = half_open_max_calls
+        self._on_transition = on_transition
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probes = 0
+
+    def _transition(self, state: str) -> None:
+        self.state = state
+        self._failures = 0
+        self._probes = 0
+        if state == OPEN:
+            self._opened_at = time.monotonic()
+        if self._on_transition is not None:
+            self._on_transition(state)
+
+    def allow(self) -> bool:
+        """Indica se uma chamada pode ser enviada agora."""
+        if self.state == OPEN:
+            if time.monotonic() - self._opened_at < self._open_s:
+                return False
+            self._transition(HALF_OPEN)
+        if self.state == HALF_OPEN:
+            if self._probes >= self._half_open_max_calls:
+                return False
+            self._probes += 1
+        return True
+
+    def record(self, success: bool) -> None:
+        if self.state == HALF_OPEN:
+            self._transition(CLOSED if success else OPEN)
+        elif success:
+            self._failures = 0
+        else:
+            self._failures += 1
+            if self._failures >= self._failure_threshold:
+                self._transition(OPEN)
+
+    def release(self) -> None:
+        """Libera a vaga de teste de uma chamada cancelada sem resultado."""
+        if self.state == HALF_OPEN and self._probes:
+            self._probes -= 1
+
+
+# =============================================================================
+# ORÇAMENTO DE RETRY (TOKEN BUCKET)
+# =============================================================================
+class RetryBudget:
+    def __init__(self, ratio: float, max_tokens: float):
+        self._ratio = ratio
+        self._max_tokens = max_tokens
+        self.tokens = max_tokens
+
+    def deposit(self) -> None:
+        self.tokens = min(self._max_tokens, self.tokens + self._ratio)
+
+    def withdraw(self) -> bool:
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+# =============================================================================
+# LATÊNCIA POR DESTINO
+# =============================================================================
+class LatencyBuckets:
+    """Contagens por bucket (RESPONSE_TIME_BUCKETS) com decaimento."""
+
+    def __init__(self, boundaries, window: int):
+        self._boundaries = list(boundaries)
+        self._counts = [0.0] * (len(self._boundaries) + 1)
+        self._window = window
+        self.total = 0.0
+
+    def observe(self, seconds: float) -> None:
+        index = 0
+        while index < len(self._boundaries) and seconds > self._boundaries[index]:
+            index += 1
+        self._counts[index] += 1
+        self.total += 1
+        if self.total >= self._window:
+            self._counts = [count / 2 for count in self._counts]
+            self.total /= 2
+
+    def percentile(self, quantile: float) -> Optional[float]:
+        """Limite superior do bucket do percentil; None acima do último bucket."""
+        target = quantile * self.total
+        cumulative = 0.0
+        for index, count in enumerate(self._counts):
+            cumulative += count
+            if cumulative >= target:
+                return self._boundaries[index] if index < len(self._boundaries) else None
+        return None
+
+
+# =============================================================================
+# MÉTRICAS
+# =============================================================================
+breaker_transitions_counter = limit_cardinality(
+    meter.create_counter,
+    name="app_circuit_breaker_transitions_total",
+    description="Mudanças de estado do circuit breaker por destino",
+    unit="1",
+)
+breaker_rejections_counter = limit_cardinality(
+    meter.create_counter,
+    name="app_circuit_breaker_rejections_total",
+    description="Chamadas rejeitadas pelo circuit breaker (circuito aberto)",
+    unit="1",
+)
+retries_counter = limit_cardinality(
+    meter.create_counter,
+    name="app_downstream_retries_total",
+    description="Retries de chamadas downstream por destino e motivo",
+    unit="1",
+)
+retry_budget_exhausted_counter = limit_cardinality(
+    meter.create_counter,
+    name="app_downstream_retry_budget_exhausted_total",
+    description="Retries ou hedges não enviados por falta de orçamento",
+    unit="1",
+)
+hedges_counter = limit_cardinality(
+    meter.create_counter,
+    name="app_downstream_hedges_total",
+    description="Requisições de hedge enviadas, por destino e vencedora (primary ou hedge)",
+    unit="1",
+)
+
+
+class DestinationState:
+    def __init__(self, destination: str):
+        self.destination = destination
+        self.attributes = {"app": config.APP_NAME, "destination": destination}
+        self.breaker = CircuitBreaker(
+            failure_threshold=config.BREAKER_FAILURE_THRESHOLD,
+            open_ms=config.BREAKER_OPEN_MS,
+            half_open_max_calls=config.BREAKER_HALF_OPEN_MAX_CALLS,
+            on_transition=lambda state: breaker_transitions_counter.add(1, {**self.attributes, "state": state}),
+        )
+        self.budget = RetryBudget(config.RETRY_BUDGET_RATIO, config.RETRY_BUDGET_MAX_TOKENS)
+        self.latency = LatencyBuckets(RESPONSE_TIME_BUCKETS, config.HEDGE_WINDOW)
+
+    def hedge_delay(self) -> Optional[float]:
+        if self.latency.total < config.HEDGE_MIN_SAMPLES:
+            return None
+        return self.latency.percentile(config.HEDGE_PERCENTILE)
+
+
+destinations: Dict[str, DestinationState] = {}
+
+
+def get_state(destination: str) -> DestinationState:
+    state = destinations.get(destination)
+    if state is None:
+        state = destinations[destination] = DestinationState(destination)
+    return state
+
+
+def _observe_breaker_state(options: CallbackOptions) -> Iterable[Observation]:
+    for state in list(destinations.values()):
+        yield Observation(_STATE_VALUES[state.breaker.state], state.attributes)
+
+
+def _observe_hedge_threshold(options: CallbackOptions) -> Iterable[Observation]:
+    for state in list(destinations.values()):
+        delay = state.hedge_delay()
+        if delay is not None:
+            yield Observation(delay, state.attributes)
+
+
+meter.create_observable_gauge(
+    name="app_circuit_breaker_state",
+    description="Estado do circuit breaker por destino (0 closed, 1 half_open, 2 open)",
+    unit="1",
+    callbacks=[_observe_breaker_state],
+)
+
+meter.create_observable_gauge(
+    name="app_downstream_hedge_threshold_seconds",
+    description="Latência a partir da qual um hedge é enviado, por destino",
+    unit="s",
+    callbacks=[_observe_hedge_threshold],
+)
+
+
+# =============================================================================
+# CHAMADA COM BREAKER, RETRY E HEDGING
+# =============================================================================
+def _failed(response, error) -> bool:
+    return error is not None or response.status_code >= 500
+
+
+async def _hedged(state: DestinationState, attempt: Callable[[], Awaitable], span):
+    """Envia a chamada e, se ela passar do limiar, um hedge; vale o primeiro sucesso."""
+    delay = state.hedge_delay()
+    if delay is None:
+        return await attempt()
+
+    primary = asyncio.ensure_future(attempt())
+    tasks = [primary]
+    try:
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        if done:
+            return primary.result()
+        if not state.budget.withdraw():
+            retry_budget_exhausted_counter.add(1, {**state.attributes, "kind": "hedge"})
+            return await primary
+
+        span.set_attribute("resilience.hedged", True)
+        hedge = asyncio.ensure_future(attempt())
+        tasks.append(hedge)
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None and not _failed(task.result(), None):
+                    winner = "hedge" if task is hedge else "primary"
+                    span.set_attribute("resilience.hedge_winner", winner)
+                    hedges_counter.add(1, {**state.attributes, "winner": winner})
+                    return task.result()
+        # As duas falharam: vale o resultado da chamada original
+        hedges_counter.add(1, {**state.attributes, "winner": "none"})
+        return primary.result()
+    finally:
+        # A perdedora (ou as duas, se a requisição foi cancelada) é cancelada
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+
+async def call(destination: str, attempt: Callable[[], Awaitable], span):
+    """
+    Executa attempt() (uma chamada httpx que retorna a resposta) com circuit
+    breaker, retries e hedging do destino. Levanta CircuitOpenError se o
+    circuito estiver aberto, ou a exceção do httpx da última tentativa.
+    """
+    import httpx
+
+    state = get_state(destination)
+    state.budget.deposit()
+    retries = 0
+
+    while True:
+        if config.BREAKER_ENABLED and not state.breaker.allow():
+            breaker_rejections_counter.add(1, state.attributes)
+            span.set_attribute("circuit_breaker.state", state.breaker.state)
+            span.set_attribute("resilience.retries", retries)
+            raise CircuitOpenError(destination)
+
+        response, error = None, None
+        start = time.perf_counter()
+        try:
+            if config.HEDGE_ENABLED:
+                response = await _hedged(state, attempt, span)
+            else:
+                response = await attempt()
+        except httpx.HTTPError as exc:
+            error = exc
+        except asyncio.CancelledError:
+            state.breaker.release()
+            raise
+
+        failed = _failed(response, error)
+        state.breaker.record(not failed)
+        if not failed:
+            state.latency.observe(time.perf_counter() - start)
+
+        retryable = error is not None or response.status_code in RETRYABLE_STATUSES
+        if not retryable or retries >= config.RETRY_MAX_RETRIES:
+            break
+        # Com o circuito aberto (ou em teste) a próxima tentativa seria
+        # rejeitada com CircuitOpenError e esconderia a falha real do destino
+        if config.BREAKER_ENABLED and state.breaker.state != CLOSED:
+            break
+        if not state.budget.withdraw():
+            retry_budget_exhausted_counter.add(1, {**state.attributes, "kind": "retry"})
+            break
+
+        retries += 1
+        reason = type(error).__name__ if error is not None else str(response.status_code)
+        retries_counter.add(1, {**state.attributes, "reason": reason})
+        # Backoff exponencial com jitter completo
+        await asyncio.sleep(random.uniform(0, config.RETRY_BACKOFF_MS * 2 ** (retries - 1)) / 1000)
+
+    span.set_attribute("circuit_breaker.state", state.breaker.state)
+    span.set_attribute("resilience.retries", retries)
+    if error is not None:
+        raise error
+    return response
@@ -0,0 +1,36 @@
+import pytest
+
+from batch import BatchParseError, ItemStreamParser
+
+
+def test_ndjson_items_before_malformed_line_are_kept():
+    parser = ItemStreamParser(ndjson=True, max_item_bytes=1024)
+
+    with pytest.raises(BatchParseError) as error:
+        parser.feed(b'["a"]\n["b"]\n{malformado\n["c"]\n')
+
+    assert error.value.items == [["a"], ["b"]]
+
+
+def test_ndjson_items_split_across_chunks():
+    parser = ItemStreamParser(ndjson=True, max_item_bytes=1024)
+
+    assert parser.feed(b'["a"]\n["b') == [["a"]]
+    assert parser.feed(b'"]\n') == [["b"]]
+    assert parser.close() == []
+
+
+def test_array_items_before_malformed_separator_are_kept():
+    parser = ItemStreamParser(ndjson=False, max_item_bytes=1024)
+
+    with pytest.raises(BatchParseError) as error:
+        parser.feed(b'[["a"], ["b"] ["c"]]')
+
+    assert error.value.items == [["a"], ["b"]]
+
+
+def test_item_size_limit_counts_bytes():
+    parser = ItemStreamParser(ndjson=False, max_item_bytes=100)
+
+    with pytest.raises(BatchParseError):
+        parser.feed(b'[["' + "é".encode() * 60)
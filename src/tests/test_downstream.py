@@ -0,0 +1,71 @@
+import asyncio
+
+import httpx
+import pytest
+
+import config
+import downstream
+import resilience
+
+
+class _Response:
+    status_code = 200
+
+    def __init__(self, text):
+        self.text = text
+
+
+class _Logger:
+    def debug(self, *args, **kwargs):
+        pass
+
+    def warning(self, *args, **kwargs):
+        pass
+
+
+def _send_batch(monkeypatch, text, size):
+    async def call(url, request, span):
+        return _Response(text)
+
+    monkeypatch.setattr(resilience, "call", call)
+    return asyncio.run(downstream.send_batch("http://destino", [{}] * size, _Logger()))
+
+
+def test_send_batch_treats_invalid_success_payload_as_bad_gateway(monkeypatch):
+    results = _send_batch(
+        monkeypatch,
+        '{"index":0,"status":200,"payload":["a"]}\n'
+        '{"index":1,"status":200}\n'
+        '{"index":2,"status":200,"payload":"a"}\n'
+        '{"index":3,"status":200,"payload":[1]}\n',
+        4,
+    )
+
+    assert [(result.status_code, result.payload) for result in results] == [
+        (200, ["a"]), (502, None), (502, None), (502, None),
+    ]
+
+
+def test_send_batch_ignores_truncated_and_out_of_range_lines(monkeypatch):
+    results = _send_batch(
+        monkeypatch,
+        '{"index":5,"status":200,"payload":["a"]}\n{"index":0,"sta',
+        1,
+    )
+
+    assert results[0].status_code == 502
+
+
+@pytest.mark.parametrize("fast_json", [False, True])
+@pytest.mark.parametrize("content", [b"<html>oops</html>", b'{"a": 1}', b"[1, 2]"])
+def test_send_turns_invalid_success_body_into_error(monkeypatch, fast_json, content):
+    async def call(url, request, span):
+        return httpx.Response(200, content=content)
+
+    monkeypatch.setattr(resilience, "call", call)
+    monkeypatch.setattr(config, "FAST_JSON_ENABLED", fast_json)
+
+    result = asyncio.run(downstream.send("http://destino", ["a"], _Logger()))
+
+    assert not result.ok
+    assert isinstance(result.error, ValueError)
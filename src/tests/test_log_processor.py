@@ -0,0 +1,75 @@
+import asyncio
+import threading
+import time
+
+from otel.log_processor import POLICY_BLOCK, BoundedBatchLogRecordProcessor
+
+
+class _SlowExporter:
+    def __init__(self, delay):
+        self.delay = delay
+        self.release = threading.Event()
+        self.exported = 0
+
+    def export(self, batch):
+        self.release.wait(self.delay)
+        self.exported += len(batch)
+
+    def shutdown(self):
+        self.release.set()
+
+
+def _full_processor(exporter, block_timeout_millis=200):
+    processor = BoundedBatchLogRecordProcessor(
+        exporter,
+        max_queue_size=2,
+        max_export_batch_size=1,
+        schedule_delay_millis=60000,
+        full_policy=POLICY_BLOCK,
+        block_timeout_millis=block_timeout_millis,
+    )
+    # Ocupa a thread de exportação com um lote e enche a fila
+    processor.emit("a")
+    time.sleep(0.05)
+    processor.emit("b")
+    processor.emit("c")
+    return processor
+
+
+def test_block_policy_does_not_wait_on_event_loop_thread():
+    exporter = _SlowExporter(delay=5)
+    processor = _full_processor(exporter)
+
+    async def emit():
+        start = time.monotonic()
+        processor.emit("d")
+        return time.monotonic() - start
+
+    assert asyncio.run(emit()) < 0.05
+    assert processor.dropped == 1
+    exporter.release.set()
+    processor.shutdown()
+
+
+def test_block_policy_waits_off_loop():
+    exporter = _SlowExporter(delay=5)
+    processor = _full_processor(exporter, block_timeout_millis=100)
+
+    start = time.monotonic()
+    processor.emit("d")
+
+    assert time.monotonic() - start >= 0.1
+    assert processor.dropped == 1
+    exporter.release.set()
+    processor.shutdown()
+
+
+def test_force_flush_honors_timeout():
+    exporter = _SlowExporter(delay=5)
+    processor = _full_processor(exporter)
+
+    start = time.monotonic()
+    assert processor.force_flush(timeout_millis=100) is False
+    assert time.monotonic() - start < 1
+    exporter.release.set()
+    processor.shutdown()
@@ -0,0 +1,68 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from otel.multiprocess import MultiprocessMetricsStore, _process_key
+
+
+class _EmptyCollector:
+    def collect(self):
+        return []
+
+
+def _family(name, metric_type, value, labels=None):
+    return {
+        "name": name,
+        "documentation": "",
+        "type": metric_type,
+        "unit": "",
+        "samples": [[name, labels or {}, value]],
+    }
+
+
+def _write(directory, key, families):
+    with open(os.path.join(directory, f"worker-{key}.json"), "w") as file:
+        json.dump(families, file)
+
+
+@pytest.fixture
+def other_worker():
+    # Um segundo processo vivo, para simular outro worker
+    process = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(30)"])
+    yield process.pid
+    process.kill()
+    process.wait()
+
+
+def test_gauge_modes_and_dead_workers(tmp_path, other_worker):
+    directory = str(tmp_path)
+    store = MultiprocessMetricsStore(directory, _EmptyCollector(), 1000)
+
+    def worker(active, lag, breaker, instance):
+        return [
+            _family("app_requests_total", "counter", 1),
+            _family("app_active_requests", "gauge", active),
+            _family("app_export_queue_replay_lag_seconds", "gauge", lag),
+            _family("app_circuit_breaker_state", "gauge", breaker),
+            _family("target_info", "info", 1, {"service_instance_id": instance}),
+        ]
+
+    _write(directory, _process_key(other_worker), worker(2, 4, 2, "vivo"))
+    _write(directory, "999999999-1", worker(7, 9, 1, "morto"))
+
+    samples = {
+        (sample.name, tuple(sorted(sample.labels.items()))): sample.value
+        for metric in store.collect()
+        for sample in metric.samples
+    }
+
+    # Counters incluem o worker morto; gauges e info dele ficam de fora
+    assert samples[("app_requests_total", ())] == 2
+    assert samples[("app_active_requests", ())] == 2
+    assert samples[("app_export_queue_replay_lag_seconds", ())] == 4
+    assert samples[("app_circuit_breaker_state", (("pid", str(other_worker)),))] == 2
+    assert ("target_info", (("service_instance_id", "morto"),)) not in samples
+    assert ("target_info", (("service_instance_id", "vivo"),)) in samples
@@ -0,0 +1,33 @@
+import asyncio
+
+import httpx
+import pytest
+from opentelemetry import trace
+
+import config
+import resilience
+
+
+@pytest.fixture
+def destination(monkeypatch):
+    monkeypatch.setattr(config, "BREAKER_ENABLED", True)
+    monkeypatch.setattr(config, "BREAKER_FAILURE_THRESHOLD", 1)
+    monkeypatch.setattr(config, "HEDGE_ENABLED", False)
+    monkeypatch.setattr(config, "RETRY_MAX_RETRIES", 3)
+    monkeypatch.setattr(config, "RETRY_BACKOFF_MS", 1)
+    return "http://destino-breaker"
+
+
+def test_failure_that_opens_the_circuit_raises_the_original_error(destination):
+    calls = []
+
+    async def attempt():
+        calls.append(1)
+        raise httpx.ConnectError("recusada")
+
+    with pytest.raises(httpx.ConnectError):
+        asyncio.run(resilience.call(destination, attempt, trace.INVALID_SPAN))
+
+    # A primeira falha abriu o circuito: sem retries rejeitados pelo breaker
+    assert len(calls) == 1
+    assert resilience.get_state(destination).breaker.state == resilience.OPEN